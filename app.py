@@ -2,24 +2,40 @@ import os
 from flask import Flask, render_template, request, jsonify, send_file, redirect, url_for, session, flash, abort, Response
 from werkzeug.utils import secure_filename
 import tempfile
+import shutil
+import uuid
 import logging
 import json
 import time
 from datetime import datetime
+import openai
 from functools import wraps
 from dotenv import load_dotenv
 from posthog import PosthogSti
 from utils import (
     process_document, process_pdf, is_allowed_file, create_pdf_with_text, create_pdf_with_formatting, 
-    create_pdf_with_text_basic, create_docx_with_text, create_html_with_text
+    create_pdf_with_text_basic, create_docx_with_text, create_html_with_text, get_deepl_translator_pool_stats,
+    get_deepl_usage, analyze_complexity_batch, DeepLQuotaError, DEFAULT_COMPLEXITY_THRESHOLD, DEEPL_FORMALITY_OPTIONS,
+    SEGMENT_LEVELS
 )
-from auth import login_required, get_current_user, get_user_id, sign_up, sign_in, sign_out, reset_password
+from local_cache import get_local_cache_stats
+from jobs import enqueue_job, get_job, open_job_event_stream, job_idempotency_key, register_job_handler, get_job_queue_stats, JobCheckpoint, JobDeferred, JobError
+from glossary_engine import glossary_cache
+from glossary_export import GLOSSARY_EXPORT_FORMATS, iter_glossary_csv, iter_glossary_tbx, iter_gzip, iter_encoded
+from deepl_glossary import delete_deepl_glossaries, get_deepl_glossary_sync_stats
+from review_engine import (
+    review_pages, submit_batch_review, get_batch_review, iter_batch_review_results, batch_review_contexts,
+    get_review_stats, ReviewError, BATCH_FINAL_STATUSES
+)
+from translation_memory import find_fuzzy_matches, get_translation_memory_index_stats, TM_FUZZY_MIN_SCORE, TM_FUZZY_AUTO_ACCEPT_SCORE
+from auth import login_required, get_current_user, get_user_id, is_admin, sign_up, sign_in, sign_out, reset_password
 from supabase_config import (
     get_user_data, save_user_data, get_user_translations, save_translation,
     get_full_translation, delete_translation, get_user_settings, save_user_settings,
     get_user_assistants, get_assistant, save_assistant, delete_assistant,
     get_user_glossaries, get_glossary, create_glossary, update_glossary, delete_glossary,
-    get_glossary_entries, create_glossary_entry, update_glossary_entry, delete_glossary_entry,
+    iter_glossary_entries, get_glossary_entries_page, count_glossary_entries,
+    create_glossary_entry, bulk_upsert_glossary_entries, update_glossary_entry, delete_glossary_entry, touch_glossary,
     get_user_folders, get_folder, create_folder, update_folder, delete_folder,
     get_user_documents, get_document, create_document, update_document, delete_document,
     get_document_versions, get_document_content, save_document_content, fix_document_content,
@@ -225,6 +241,17 @@ UPLOAD_FOLDER = tempfile.gettempdir()
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
+# Uploaded files wait here, one directory per job, until their translation job has run
+JOB_UPLOAD_FOLDER = os.path.join(UPLOAD_FOLDER, 'translation_jobs')
+os.makedirs(JOB_UPLOAD_FOLDER, exist_ok=True)
+
+# How often a batch review job checks whether OpenAI has finished its batch
+BATCH_REVIEW_POLL_SECONDS = int(os.environ.get('BATCH_REVIEW_POLL_SECONDS', '60'))
+
+# Page sizes for the glossary entries API
+GLOSSARY_ENTRIES_API_PAGE_SIZE = 200
+GLOSSARY_ENTRIES_API_MAX_PAGE_SIZE = 1000
+
 # This section has been moved above to initialize variables before they are used
 
 # Initialize PostHog if API key is available
@@ -874,6 +901,65 @@ def edit_translation_page(document_id, page_id):
         flash(f'Ett fel uppstod: {str(e)}', 'danger')
         return redirect(url_for('view_translation', id=document_id))
 
+@app.route('/view-translation/<document_id>/ai-review', methods=['POST'])
+@login_required
+def batch_ai_review(document_id):
+    """Queue an AI review of the selected pages of a document.
+    
+    Pages are reviewed right away by a 'review_document' job, or with review_mode=batch
+    by a 'review_document_batch' job through the cheaper but slower OpenAI Batch API.
+    With smart_review=yes, pages too simple to need a review are left out (see review_gate).
+    """
+    user_id = get_user_id()
+    is_ajax = request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+    
+    def fail(message, status=400):
+        if is_ajax:
+            return json_error(message, status)
+        flash(message, 'danger')
+        return redirect(url_for('translation_workspace', id=document_id))
+    
+    document = get_document(user_id, document_id)
+    if not document:
+        return fail('Dokumentet kunde inte hittas', 404)
+    
+    page_ids = request.form.getlist('selected_pages')
+    assistant_id = (request.form.get('assistant_id') or '').strip()
+    if not page_ids:
+        return fail('Välj minst en sida att granska')
+    if not assistant_id:
+        return fail('Välj en assistent för granskningen')
+    
+    user_settings = get_user_settings(user_id) or {}
+    if not user_settings.get('api_keys', DEFAULT_API_KEYS).get('openai_api_key'):
+        return fail('OpenAI API nyckel saknas. Lägg till en på API-nyckelsidan.')
+    
+    settings = {
+        'document_id': document_id,
+        'page_ids': page_ids,
+        'assistant_id': assistant_id,
+        'instructions': request.form.get('ai_instructions') or None,
+        # With smart review, pages scoring below the assistant's threshold are not sent
+        'complexity_threshold': (_assistant_complexity_threshold(user_settings, assistant_id)
+                                 if request.form.get('smart_review') == 'yes' else None)
+    }
+    kind = 'review_document_batch' if request.form.get('review_mode') == 'batch' else 'review_document'
+    job_id, _ = enqueue_job(kind, settings, user_id=user_id,
+                            idempotency_key=job_idempotency_key(kind, user_id, settings))
+    
+    if is_ajax:
+        return json_response({
+            'success': True,
+            'job_id': job_id,
+            'status_url': url_for('job_status', job_id=job_id),
+            'events_url': url_for('job_events', job_id=job_id)
+        }, 202)
+    if kind == 'review_document_batch':
+        flash(f'{len(page_ids)} sidor har skickats för AI-granskning i batchläge. Resultatet sparas inom 24 timmar.', 'success')
+    else:
+        flash(f'AI-granskning av {len(page_ids)} sidor har startats. Ladda om sidan för att se resultatet.', 'success')
+    return redirect(url_for('translation_workspace', id=document_id))
+
 @app.route('/download-translation/<id>')
 @login_required
 def download_translation(id):
@@ -1034,7 +1120,8 @@ def index():
                           glossaries=glossaries, 
                           folders=folders,
                           documents=documents,
-                          translation_memory_stats=translation_memory_stats)
+                          translation_memory_stats=translation_memory_stats,
+                          tm_fuzzy_auto_accept_score=TM_FUZZY_AUTO_ACCEPT_SCORE)
 
 @app.route('/assistant-config', methods=['GET'])
 @login_required
@@ -1065,6 +1152,7 @@ def assistant_config():
     
     return render_template('assistant_config.html', 
                          assistants=assistants,
+                         default_complexity_threshold=DEFAULT_COMPLEXITY_THRESHOLD,
                          export_format=settings['export_format'],
                          page_size=settings['page_size'],
                          orientation=settings['orientation'],
@@ -1093,6 +1181,17 @@ def save_assistant_route():
         assistant_genre = request.form.get('genre')
         assistant_id_param = request.form.get('id')  # Local ID, will be None for new assistants
         
+        # Smart review threshold; left empty, the default threshold applies
+        complexity_threshold = (request.form.get('complexity_threshold') or '').strip()
+        if complexity_threshold:
+            try:
+                complexity_threshold = min(100, max(0, int(complexity_threshold)))
+            except ValueError:
+                flash('Komplexitetströskeln måste vara ett heltal mellan 0 och 100', 'danger')
+                return redirect(url_for('assistant_config'))
+        else:
+            complexity_threshold = None
+        
         # Get user's OpenAI key from settings
         user_settings = get_user_settings(user_id) or {}
         user_api_keys = user_settings.get('api_keys', {})
@@ -1108,7 +1207,8 @@ def save_assistant_route():
             'name': assistant_name,
             'author': assistant_author,
             'genre': assistant_genre,
-            'instructions': assistant_instructions
+            'instructions': assistant_instructions,
+            'complexity_threshold': complexity_threshold
         }
         
         # For a new assistant
@@ -1262,8 +1362,11 @@ def api_keys_settings():
         # Get the submitted API keys
         api_keys = {
             'deepl_api_key': request.form.get('deepl_api_key', '').strip(),
-            'openai_api_key': request.form.get('openai_api_key', '').strip()
+            'openai_api_key': request.form.get('openai_api_key', '').strip(),
             # 'openai_assistant_id' removed as it's now handled in the assistants page
+            # Rate limits of the OpenAI account, used to pace batch AI reviews
+            'openai_requests_per_minute': request.form.get('openai_requests_per_minute', type=int),
+            'openai_tokens_per_minute': request.form.get('openai_tokens_per_minute', type=int)
         }
         
         # Save to user settings
@@ -1278,7 +1381,12 @@ def api_keys_settings():
     user_settings = get_user_settings(user_id) or {}
     current_api_keys = user_settings.get('api_keys', DEFAULT_API_KEYS)
     
-    return render_template('api_keys.html', current_api_keys=current_api_keys)
+    # Cached per key, so this only calls DeepL every few minutes
+    deepl_usage = None
+    if current_api_keys.get('deepl_api_key'):
+        deepl_usage = get_deepl_usage(current_api_keys.get('deepl_api_key'))
+    
+    return render_template('api_keys.html', current_api_keys=current_api_keys, deepl_usage=deepl_usage)
 
 @app.route('/save-assistant-config', methods=['POST'])
 @login_required
@@ -1352,6 +1460,12 @@ def save_export_settings():
 @app.route('/upload', methods=['POST'])
 @login_required
 def upload_file():
+    """Validate an upload and queue it for translation.
+    
+    The files are translated by a background job (see run_upload_job), so the request
+    returns at once with the job ID; the client follows the job's progress at events_url
+    (server-sent events) or by polling status_url.
+    """
     if request.headers.get('X-Requested-With') != 'XMLHttpRequest':
         return redirect(url_for('index'))
 
@@ -1394,20 +1508,8 @@ def upload_file():
             )
         return json_error(f'Invalid file type(s): {", ".join(invalid_files)}. Please upload PDF, Word (DOCX/DOC), text (TXT), RTF, or ODT files only.')
 
+    job_dir = None
     try:
-        # We'll process each file and collect their translations
-        all_translations = []
-        filepaths = []
-        
-        # Save all files
-        for file in files:
-            filename = secure_filename(file.filename)
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(filepath)
-            filepaths.append(filepath)
-        
-        logger.info(f"Processing {len(filepaths)} files in batch mode")
-        
         # Check if OpenAI review should be skipped
         skip_openai = request.form.get('skipOpenAI') == 'true'
         logger.info(f"Skip OpenAI review: {skip_openai}")
@@ -1452,12 +1554,7 @@ def upload_file():
             else:
                 openai_assistant_id = OPENAI_ASSISTANT_ID
         else:
-            openai_api_key = None
             openai_assistant_id = None
-            
-        logger.info(f"Using {'user' if user_api_keys.get('deepl_api_key') else 'system'} DeepL API key")
-        if not skip_openai:
-            logger.info(f"Using {'user' if user_api_keys.get('openai_api_key') else 'system'} OpenAI API key")
 
         # Get custom instructions if using a specific assistant
         custom_instructions = None
@@ -1481,36 +1578,135 @@ def upload_file():
                     custom_instructions = assistant_data.get('instructions')
                     logger.info(f"Using custom instructions for assistant from DB: {assistant_data.get('name')}")
         
-        # Process each document and collect translations
+        # Store project title and description in session for later use
+        project_title = request.form.get('projectTitle', '')
+        project_description = request.form.get('projectDescription', '')
+        if project_title and (len(files) == 1 or 'last_project_title' not in session):
+            session['last_project_title'] = project_title
+            session.modified = True
+        if project_description and (len(files) == 1 or 'last_project_description' not in session):
+            session['last_project_description'] = project_description
+            session.modified = True
+        
+        # Keep the files in a directory of their own until the job has run
+        job_id = str(uuid.uuid4())
+        job_dir = os.path.join(JOB_UPLOAD_FOLDER, job_id)
+        os.makedirs(job_dir)
+        filepaths = []
+        for file in files:
+            filepath = os.path.join(job_dir, secure_filename(file.filename))
+            file.save(filepath)
+            filepaths.append(filepath)
+        
+        settings = {
+            'source_language': source_language,
+            'target_language': target_language,
+            'skip_openai': skip_openai,
+            'openai_assistant_id': openai_assistant_id,
+            'custom_instructions': custom_instructions,
+            'use_cache': request.form.get('useCache') != 'false',  # Default to True
+            'smart_review': request.form.get('smartReview') != 'false',  # Default to True
+            'complexity_threshold': _assistant_complexity_threshold(user_settings, openai_assistant_id),
+            'glossary_id': request.form.get('glossaryId') or None,
+            'folder_id': request.form.get('folderId') or None,
+            'formality': request.form.get('formality') if request.form.get('formality') in DEEPL_FORMALITY_OPTIONS else None,
+            'segment_level': request.form.get('segmentLevel') if request.form.get('segmentLevel') in SEGMENT_LEVELS else None,
+            'fuzzy_matches': request.form.get('fuzzyMatches') == 'true',
+            'project_title': project_title,
+            'project_description': project_description,
+            'export_settings': session.get('export_settings', DEFAULT_EXPORT_SETTINGS)
+        }
+        
+        # Submitting the same files with the same settings again follows the job already
+        # queued for them, or resumes it if it failed
+        idempotency_key = job_idempotency_key('translate_upload', user_id, settings, filepaths)
+        queued_job_id, created = enqueue_job(
+            'translate_upload', dict(settings, filepaths=filepaths, job_dir=job_dir),
+            user_id=user_id, job_id=job_id, idempotency_key=idempotency_key
+        )
+        if not created:
+            shutil.rmtree(job_dir, ignore_errors=True)
+        job_id = queued_job_id
+        logger.info(f"Queued translation job {job_id} for {len(filepaths)} file(s)")
+        
+        return json_response({
+            'success': True,
+            'job_id': job_id,
+            'status_url': url_for('job_status', job_id=job_id),
+            'events_url': url_for('job_events', job_id=job_id)
+        }, 202)
+
+    except Exception as e:
+        logger.error(f"Error processing file: {str(e)}")
+        if job_dir:
+            shutil.rmtree(job_dir, ignore_errors=True)
+        return json_error(str(e), 500)
+
+def run_upload_job(job, report_progress):
+    """Translate the files of an upload and save them as documents (job kind 'translate_upload')"""
+    payload = job['payload']
+    user_id = job['user_id']
+    filepaths = payload['filepaths']
+    source_language = payload['source_language']
+    target_language = payload['target_language']
+    use_cache = payload['use_cache']
+    smart_review = payload['smart_review']
+    folder_id = payload['folder_id']
+    project_title = payload['project_title']
+    project_description = payload['project_description']
+    export_settings = payload['export_settings']
+    
+    try:
+        # API keys are read when the job runs rather than stored with it
+        user_settings = get_user_settings(user_id) or {}
+        user_api_keys = user_settings.get('api_keys', DEFAULT_API_KEYS)
+        deepl_api_key = user_api_keys.get('deepl_api_key')
+        if not deepl_api_key:
+            raise JobError('DeepL API-nyckel saknas. Lägg till en på API-nyckelsidan.')
+        openai_api_key = None if payload['skip_openai'] else user_api_keys.get('openai_api_key')
+        
+        logger.info(f"Processing {len(filepaths)} files in batch mode")
+        
+        # DeepL translations are checkpointed, so a job that is run again after being
+        # interrupted doesn't pay for them twice
+        checkpoint = JobCheckpoint(job['id'])
+        
+        # We'll process each file and collect their translations
+        all_translations = []
         original_filenames = []
         total_sections = 0
         
         for i, filepath in enumerate(filepaths):
+            file_progress = {'files_total': len(filepaths), 'files_done': i, 'current_file': os.path.basename(filepath)}
+            report_progress(dict(file_progress, stage='translating'))
+            
+            def report_document_progress(document_progress, file_progress=file_progress):
+                # Per-section progress of the current file, under the file-level fields
+                report_progress(dict(document_progress, **file_progress))
+            
             try:
                 logger.info(f"Processing file {i+1}/{len(filepaths)}: {os.path.basename(filepath)}")
                 
-                # Get processing options from form
-                use_cache = request.form.get('useCache') != 'false'  # Default to True
-                smart_review = request.form.get('smartReview') != 'false'  # Default to True
-                glossary_id = request.form.get('glossaryId')  # Will be None if not provided
-                
-                # Get folder selection
-                folder_id = request.form.get('folderId')
-                
                 # Process this document
-                file_translations = process_document(
+                file_translations, file_stats = process_document(
                     filepath,
                     deepl_api_key,
                     openai_api_key,
-                    openai_assistant_id,
+                    payload['openai_assistant_id'],
                     source_language=source_language,
                     target_language=target_language,
-                    custom_instructions=custom_instructions,
+                    custom_instructions=payload['custom_instructions'],
                     return_segments=True,
                     use_cache=use_cache,
                     smart_review=smart_review,
-                    complexity_threshold=40,  # Default threshold, could be made configurable
-                    glossary_id=glossary_id
+                    complexity_threshold=payload.get('complexity_threshold'),
+                    glossary_id=payload['glossary_id'],
+                    user_id=user_id,
+                    formality=payload['formality'],
+                    segment_level=payload['segment_level'],
+                    fuzzy_matches=payload['fuzzy_matches'],
+                    progress_callback=report_document_progress,
+                    checkpoint=checkpoint
                 )
                 
                 # Store original filename in each translation item for multi-file identification
@@ -1523,13 +1719,23 @@ def upload_file():
                 total_sections += len(file_translations)
                 
                 logger.info(f"Successfully processed file {i+1}: {len(file_translations)} sections")
+            except DeepLQuotaError as quota_error:
+                logger.warning(f"Stopped processing at file {i+1}: {str(quota_error)}")
+                if not all_translations:
+                    raise JobError('DeepL-kvoten räcker inte för det här dokumentet. Kontrollera din förbrukning på API-nyckelsidan.')
+                # Keep the files that were already translated
+                break
             except Exception as e:
                 logger.error(f"Error processing file {i+1}: {str(e)}")
                 # Continue with other files even if one fails
+        
+        if not original_filenames:
+            raise JobError('Inga filer kunde översättas.')
+        
+        report_progress({'stage': 'saving', 'files_total': len(filepaths), 'files_done': len(original_filenames)})
 
         # Generate a unique ID for this translation session
         translation_id = str(int(time.time()))
-        session['translation_id'] = translation_id
 
         # Store all translations in file
         translation_file = os.path.join(TRANSLATIONS_DIR, f"{translation_id}.json")
@@ -1537,20 +1743,8 @@ def upload_file():
             json.dump(all_translations, f)
             
         # Save as a document for document management
+        doc_result = None
         if len(filepaths) == 1:
-            # Use project title from form if provided, otherwise use filename
-            project_title = request.form.get('projectTitle', '')
-            project_description = request.form.get('projectDescription', '')
-            
-            # Store project title and description in session for later use
-            if project_title:
-                session['last_project_title'] = project_title
-                session.modified = True
-            
-            if project_description:
-                session['last_project_description'] = project_description
-                session.modified = True
-            
             original_filename = os.path.basename(filepaths[0])
             title = project_title if project_title else os.path.splitext(original_filename)[0]
             
@@ -1569,7 +1763,7 @@ def upload_file():
                 'word_count': len(translated_text.split()),
                 'status': 'in_progress',  # Changed from 'completed' to 'in_progress'
                 'settings': {
-                    'export_settings': session.get('export_settings', DEFAULT_EXPORT_SETTINGS),
+                    'export_settings': export_settings,
                     'project_info': f"Project settings: {project_description}",
                     'total_pages': len(source_text.split('\n\n'))
                 },
@@ -1605,19 +1799,6 @@ def upload_file():
                     # Create document - for multi-file mode, use chapter naming
                     original_filename = os.path.basename(filepath)
                     
-                    # Use project title if provided, otherwise use filename
-                    project_title = request.form.get('projectTitle', '')
-                    project_description = request.form.get('projectDescription', '')
-                    
-                    # Store project title and description in session for later use if not already stored
-                    if project_title and 'last_project_title' not in session:
-                        session['last_project_title'] = project_title
-                        session.modified = True
-                    
-                    if project_description and 'last_project_description' not in session:
-                        session['last_project_description'] = project_description
-                        session.modified = True
-                    
                     # For batch chapters, name them as chapters
                     file_number = i + 1
                     chapter_title = f"{project_title} - Chapter {file_number}" if project_title else os.path.splitext(original_filename)[0]
@@ -1632,7 +1813,7 @@ def upload_file():
                         'word_count': len(translated_text.split()),
                         'status': 'in_progress',
                         'settings': {
-                            'export_settings': session.get('export_settings', DEFAULT_EXPORT_SETTINGS),
+                            'export_settings': export_settings,
                             'project_info': f"Project settings: {project_description}",
                             'total_pages': len(source_text.split('\n\n'))
                         },
@@ -1647,41 +1828,47 @@ def upload_file():
                 except Exception as doc_error:
                     logger.error(f"Error saving document {i+1}: {str(doc_error)}")
                     continue
-            
-        # Store filenames for later - joined with comma for multiple files
-        session['original_filename'] = ", ".join(original_filenames) if len(original_filenames) > 1 else original_filenames[0]
-        session['file_count'] = len(original_filenames)
 
         # Gather cache and smart review stats
         cache_hits = 0
         cache_ratio = 0
         smart_review_savings = 0
         smart_review_ratio = 0
+        smart_review_characters_saved = 0
+        
+        # Only sections that would otherwise be sent to the reviewer count towards the savings
+        reviewable_sections = 0
         
         for t in all_translations:
-            # Check if translation contains cache metadata
-            if t.get('cache_metadata') and t.get('cache_metadata').get('source_hash'):
+            # Check if the translation was served from the translation cache
+            if t.get('from_cache'):
                 cache_hits += 1
+            
+            if openai_api_key and t['status'] == 'success':
+                reviewable_sections += 1
                 
             # Check if review was skipped due to smart review
             if t.get('review_skipped_reason') == 'low_complexity':
                 smart_review_savings += 1
+                smart_review_characters_saved += len(t['translated_text'])
         
         if total_sections > 0:
             cache_ratio = (cache_hits / total_sections) * 100
-            smart_review_ratio = (smart_review_savings / total_sections) * 100
             logger.info(f"Cache statistics: {cache_hits}/{total_sections} segments from cache ({cache_ratio:.1f}%)")
-            logger.info(f"Smart review savings: {smart_review_savings}/{total_sections} segments skipped ({smart_review_ratio:.1f}%)")
+        if reviewable_sections > 0:
+            smart_review_ratio = (smart_review_savings / reviewable_sections) * 100
+            logger.info(f"Smart review savings: {smart_review_savings}/{reviewable_sections} segments skipped ({smart_review_ratio:.1f}%), "
+                        f"{smart_review_characters_saved} characters not sent for review")
         
         # Track successful file upload and translation
         if posthog:
             posthog.capture(
-                distinct_id=get_user_id(),
+                distinct_id=user_id,
                 event='files_translated',
                 properties={
                     'filenames': original_filenames,
                     'file_count': len(original_filenames),
-                    'skip_openai_review': skip_openai,
+                    'skip_openai_review': payload['skip_openai'],
                     'total_sections': total_sections,
                     'translation_id': translation_id,
                     'cache_enabled': use_cache,
@@ -1689,43 +1876,299 @@ def upload_file():
                     'cache_ratio': round(cache_ratio, 1),
                     'smart_review_enabled': smart_review,
                     'smart_review_savings': smart_review_savings,
-                    'smart_review_ratio': round(smart_review_ratio, 1)
+                    'smart_review_ratio': round(smart_review_ratio, 1),
+                    'smart_review_characters_saved': smart_review_characters_saved
                 }
             )
 
-        # Store the created document ID for later reference
-        created_doc_id = None
-        if 'doc_result' in locals() and doc_result and 'id' in doc_result:
-            created_doc_id = doc_result['id']
-        
-        # After successful upload, redirect directly to the workspace
-        # for the newly created project instead of the review screen
-        if created_doc_id:
-            return json_response({
-                'success': True,
-                'redirect': url_for('translation_workspace', id=created_doc_id)
-            })
+        # A single document opens in the workspace; batches go to the documents page
+        return {
+            'translation_id': translation_id,
+            'document_id': doc_result['id'] if doc_result and len(filepaths) == 1 and 'id' in doc_result else None,
+            'original_filenames': original_filenames,
+            'total_sections': total_sections,
+            'cache_hits': cache_hits,
+            'smart_review_savings': smart_review_savings
+        }
+
+    finally:
+        # Cleanup temporary files
+        shutil.rmtree(payload['job_dir'], ignore_errors=True)
+        logger.debug(f"Removed temporary files of job {job['id']}")
+
+register_job_handler('translate_upload', run_upload_job)
+
+def run_review_job(job, report_progress):
+    """Review the selected pages of a document with OpenAI (job kind 'review_document').
+    
+    Pages are reviewed concurrently within the user's OpenAI rate limits, and each page is
+    saved as soon as its review finishes, so a restarted job only reviews the rest. With a
+    complexity_threshold (smart review), pages scoring below it are skipped.
+    """
+    payload = job['payload']
+    user_id = job['user_id']
+    document_id = payload['document_id']
+    
+    user_settings = get_user_settings(user_id) or {}
+    user_api_keys = user_settings.get('api_keys', DEFAULT_API_KEYS)
+    openai_api_key = user_api_keys.get('openai_api_key')
+    if not openai_api_key:
+        raise JobError('OpenAI API nyckel saknas. Lägg till en på API-nyckelsidan.')
+    
+    checkpoint = JobCheckpoint(job['id'])
+    reviewed_page_ids = set(checkpoint.load())
+    pages, skipped_pages = _pages_to_review(user_id, document_id, payload['page_ids'], reviewed_page_ids,
+                                            complexity_threshold=payload.get('complexity_threshold'))
+    
+    progress = {'stage': 'reviewing', 'pages_total': len(pages) + len(reviewed_page_ids),
+                'pages_done': len(reviewed_page_ids), 'pages_failed': 0,
+                'pages_skipped': len(skipped_pages),
+                'characters_saved': sum(len(text) for _, text in skipped_pages)}
+    report_progress(progress)
+    
+    for page_id, reviewed_text, error in review_pages(
+        pages, openai_api_key, payload['assistant_id'],
+        instructions=payload['instructions'],
+        requests_per_minute=user_api_keys.get('openai_requests_per_minute'),
+        tokens_per_minute=user_api_keys.get('openai_tokens_per_minute')
+    ):
+        if reviewed_text is not None and update_document_page(user_id, page_id, {
+            'translated_content': reviewed_text,
+            'reviewed_by_ai': True
+        }):
+            checkpoint.save({page_id: True})
+            progress['pages_done'] += 1
         else:
-            # Fallback to documents page if we couldn't get a specific document ID
-            return json_response({
-                'success': True,
-                'redirect': url_for('documents')
+            logger.warning(f"AI review of page {page_id} failed: {error or 'could not save page'}")
+            progress['pages_failed'] += 1
+        report_progress(progress)
+    
+    if progress['pages_total'] and not progress['pages_done']:
+        raise JobError('Ingen sida kunde granskas.')
+    
+    _update_ai_review_count(user_id, document_id)
+    return {'document_id': document_id, 'pages_reviewed': progress['pages_done'], 'pages_failed': progress['pages_failed'],
+            'pages_skipped': progress['pages_skipped'], 'characters_saved': progress['characters_saved']}
+
+def run_batch_review_job(job, report_progress):
+    """Review the selected pages of a document with the OpenAI Batch API (job kind
+    'review_document_batch').
+    
+    The first run submits all pages as one batch and stores the batch ID as a checkpoint;
+    the job is then deferred and run again every BATCH_REVIEW_POLL_SECONDS to check on the
+    batch, until it has finished and its results are saved to the pages. Pages left out by
+    smart review are never submitted.
+    """
+    payload = job['payload']
+    user_id = job['user_id']
+    document_id = payload['document_id']
+    
+    user_settings = get_user_settings(user_id) or {}
+    openai_api_key = user_settings.get('api_keys', DEFAULT_API_KEYS).get('openai_api_key')
+    if not openai_api_key:
+        raise JobError('OpenAI API nyckel saknas. Lägg till en på API-nyckelsidan.')
+    
+    checkpoint = JobCheckpoint(job['id'])
+    saved = checkpoint.load()
+    batch_id = saved.get('batch_id')
+    smart_review = saved.get('smart_review') or {'pages_skipped': 0, 'characters_saved': 0}
+    
+    if not batch_id:
+        pages, skipped_pages = _pages_to_review(user_id, document_id, payload['page_ids'],
+                                                complexity_threshold=payload.get('complexity_threshold'))
+        smart_review = {'pages_skipped': len(skipped_pages),
+                        'characters_saved': sum(len(text) for _, text in skipped_pages)}
+        if not pages and skipped_pages:
+            _update_ai_review_count(user_id, document_id)
+            return dict(smart_review, document_id=document_id, batch_id=None, pages_reviewed=0, pages_failed=0)
+        if not pages:
+            raise JobError('Inga sidor med översättning att granska.')
+        try:
+            batch_id = submit_batch_review(openai_api_key, payload['assistant_id'], pages,
+                                           instructions=payload['instructions'],
+                                           metadata={'document_id': str(document_id), 'job_id': job['id']})
+        except (ReviewError, openai.OpenAIError) as e:
+            raise JobError(f'Kunde inte skicka granskningen till OpenAI: {str(e)}')
+        # Context sent with the chunks of long pages, to strip from the replies if repeated
+        contexts = batch_review_contexts(pages)
+        checkpoint.save({'batch_id': batch_id, 'smart_review': smart_review, 'batch_contexts': contexts,
+                         'pages_total': len(pages)})
+        report_progress(dict(smart_review, stage='submitted', batch_id=batch_id, pages_total=len(pages), pages_done=0))
+        raise JobDeferred(BATCH_REVIEW_POLL_SECONDS, f"submitted batch {batch_id}")
+    
+    try:
+        batch = get_batch_review(openai_api_key, batch_id)
+    except openai.OpenAIError as e:
+        logger.warning(f"Could not check batch review {batch_id}: {str(e)}")
+        raise JobDeferred(BATCH_REVIEW_POLL_SECONDS, f"batch {batch_id} could not be checked")
+    
+    # Long pages are sent as several requests, so the batch's counts are of requests, not pages
+    progress = dict(smart_review, stage='waiting', batch_id=batch_id, batch_status=batch['status'],
+                    pages_total=saved.get('pages_total'), pages_done=0, pages_failed=0,
+                    requests_total=batch['total'], requests_done=batch['completed'], requests_failed=batch['failed'])
+    if batch['status'] not in BATCH_FINAL_STATUSES:
+        report_progress(progress)
+        raise JobDeferred(BATCH_REVIEW_POLL_SECONDS, f"batch {batch_id} is {batch['status']}")
+    
+    # Expired batches still have results for the requests that finished in time
+    if not batch['output_file_id']:
+        # A failed job with the same selection is requeued with its checkpoints, so let it
+        # submit a new batch instead of polling this one again
+        checkpoint.discard('batch_id', 'smart_review', 'batch_contexts', 'pages_total')
+        raise JobError(f"OpenAI-granskningen avslutades utan resultat ({batch['status']}).")
+    
+    progress.update(stage='saving', pages_done=0, pages_failed=0)
+    report_progress(progress)
+    results = iter_batch_review_results(openai_api_key, batch['output_file_id'], contexts=saved.get('batch_contexts'))
+    for page_id, reviewed_text, error in results:
+        if saved.get(page_id):
+            progress['pages_done'] += 1
+        elif reviewed_text is not None and update_document_page(user_id, page_id, {
+            'translated_content': reviewed_text,
+            'reviewed_by_ai': True
+        }):
+            checkpoint.save({page_id: True})
+            progress['pages_done'] += 1
+        else:
+            logger.warning(f"Batch review of page {page_id} failed: {error or 'could not save page'}")
+            progress['pages_failed'] += 1
+    report_progress(progress)
+    
+    if not progress['pages_done']:
+        checkpoint.discard('batch_id', 'smart_review', 'batch_contexts', 'pages_total')
+        raise JobError('Ingen sida kunde granskas.')
+    
+    _update_ai_review_count(user_id, document_id)
+    return dict(smart_review, document_id=document_id, batch_id=batch_id, batch_status=batch['status'],
+                pages_reviewed=progress['pages_done'], pages_failed=progress['pages_failed'])
+
+def _pages_to_review(user_id, document_id, page_ids, skip_page_ids=(), complexity_threshold=None):
+    """Return (pages to review, pages skipped by smart review) among the given pages.
+    
+    Both are lists of (page ID, translated text) of pages that have a translation. With a
+    complexity_threshold, each page's source text is scored with analyze_complexity and the
+    score and review_skipped_reason are stored on the page; pages below it are skipped.
+    """
+    pages_by_id = {page['id']: page for page in get_document_pages(user_id, document_id)}
+    candidates = [
+        pages_by_id[page_id] for page_id in page_ids
+        if page_id in pages_by_id and page_id not in skip_page_ids
+        and (pages_by_id[page_id].get('translated_content') or '').strip()
+    ]
+    if complexity_threshold is None:
+        return [(page['id'], page['translated_content']) for page in candidates], []
+    
+    # Score the whole selection at once
+    scores = analyze_complexity_batch([page.get('source_content') or page['translated_content'] for page in candidates])
+    pages = []
+    skipped_pages = []
+    for page, (complexity_score, _) in zip(candidates, scores):
+        page_id = page['id']
+        review_skipped_reason = 'low_complexity' if complexity_score < complexity_threshold else None
+        if (page.get('complexity_score'), page.get('review_skipped_reason')) != (complexity_score, review_skipped_reason):
+            update_document_page(user_id, page_id, {
+                'complexity_score': complexity_score,
+                'review_skipped_reason': review_skipped_reason
             })
+        if review_skipped_reason:
+            skipped_pages.append((page_id, page['translated_content']))
+        else:
+            pages.append((page_id, page['translated_content']))
+    
+    if skipped_pages:
+        logger.info(f"Smart review skips {len(skipped_pages)}/{len(pages) + len(skipped_pages)} pages "
+                    f"of document {document_id} below complexity {complexity_threshold}")
+    return pages, skipped_pages
 
-    except Exception as e:
-        logger.error(f"Error processing file: {str(e)}")
-        return json_error(str(e), 500)
+def _assistant_complexity_threshold(user_settings, openai_assistant_id):
+    """Return the smart review threshold of the user's assistant with the given OpenAI ID"""
+    for assistant in user_settings.get('assistants') or []:
+        if assistant.get('assistant_id') == openai_assistant_id and assistant.get('complexity_threshold') is not None:
+            return assistant['complexity_threshold']
+    return DEFAULT_COMPLEXITY_THRESHOLD
 
-    finally:
-        # Cleanup temporary files
-        if 'filepaths' in locals():
-            for filepath in filepaths:
-                try:
-                    os.remove(filepath)
-                    logger.debug(f"Removed temporary file: {filepath}")
-                except Exception as e:
-                    logger.error(f"Failed to remove temporary file {filepath}: {str(e)}")
-                    pass
+def _update_ai_review_count(user_id, document_id):
+    """Keep the review counts shown in the workspace up to date"""
+    document = get_document(user_id, document_id)
+    if document:
+        pages = get_document_pages(user_id, document_id)
+        ai_review_count = sum(1 for page in pages if page.get('reviewed_by_ai'))
+        ai_review_skipped_count = sum(1 for page in pages if not page.get('reviewed_by_ai')
+                                      and page.get('review_skipped_reason') == 'low_complexity')
+        update_document(user_id, document_id, {'settings': dict(document.get('settings') or {},
+                                                                 ai_review_count=ai_review_count,
+                                                                 ai_review_skipped_count=ai_review_skipped_count)})
+
+register_job_handler('review_document', run_review_job)
+register_job_handler('review_document_batch', run_batch_review_job)
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+@login_required
+def job_status(job_id):
+    """Return the status and progress of a background job.
+    
+    When a translation job has completed, the session is pointed at its results like
+    the synchronous upload used to do, and the response includes the page to open.
+    """
+    user_id = get_user_id()
+    job = get_job(job_id)
+    if not job or job['user_id'] != user_id:
+        return json_error('Job not found', 404)
+    
+    response = {
+        'success': True,
+        'job_id': job['id'],
+        'status': job['status'],
+        'progress': job['progress'] or {},
+        'error': job['error'],
+        'created_at': job['created_at'],
+        'started_at': job['started_at'],
+        'finished_at': job['finished_at']
+    }
+    
+    if job['status'] == 'completed' and job['kind'] == 'translate_upload':
+        result = job['result'] or {}
+        original_filenames = result.get('original_filenames') or []
+        session['translation_id'] = result.get('translation_id')
+        session['original_filename'] = ", ".join(original_filenames)
+        session['file_count'] = len(original_filenames)
+        session.modified = True
+        
+        if result.get('document_id'):
+            response['redirect'] = url_for('translation_workspace', id=result['document_id'])
+        else:
+            # Fallback to documents page if we couldn't get a specific document ID
+            response['redirect'] = url_for('documents')
+    elif job['status'] == 'completed' and job['kind'] in ('review_document', 'review_document_batch'):
+        response['redirect'] = url_for('translation_workspace', id=job['result']['document_id'])
+    
+    return json_response(response)
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+@login_required
+def job_events(job_id):
+    """Stream the progress of a background job as server-sent events (see iter_job_events).
+    
+    Sessions can't be changed from a stream, so clients fetch the job's status_url once
+    it has completed. When this process already serves JOB_EVENTS_MAX_STREAMS streams the
+    request is refused with 503, and clients poll the status_url instead.
+    """
+    job = get_job(job_id)
+    if not job or job['user_id'] != get_user_id():
+        return json_error('Job not found', 404)
+    
+    events = open_job_event_stream(job_id, last_event_id=request.headers.get('Last-Event-ID'))
+    if events is None:
+        return jsonify({'error': 'Too many progress streams, poll the job status instead'}), 503, {'Retry-After': '5'}
+    
+    return Response(
+        events,
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # Keep proxies like nginx from buffering the stream
+        }
+    )
 
 @app.route('/review')
 @login_required
@@ -2060,8 +2503,7 @@ def glossary_list():
             # Enrich glossaries with entry counts
             for glossary in glossaries:
                 try:
-                    entries = get_glossary_entries(glossary['id'])
-                    glossary['entries_count'] = len(entries)
+                    glossary['entries_count'] = count_glossary_entries(glossary['id'])
                 except Exception as entry_error:
                     logger.error(f"Error getting entries for glossary {glossary['id']}: {str(entry_error)}")
                     glossary['entries_count'] = 0
@@ -2239,6 +2681,12 @@ def delete_glossary_by_id(glossary_id):
     result = delete_glossary(user_id, glossary_id)
     if not result:
         return json_error('Failed to delete glossary', 500)
+    glossary_cache.invalidate(glossary_id)
+    
+    # Remove the copies of the glossary kept on DeepL
+    deepl_api_key = ((get_user_settings(user_id) or {}).get('api_keys') or {}).get('deepl_api_key')
+    if deepl_api_key:
+        delete_deepl_glossaries(deepl_api_key, glossary_id)
     
     # Track in analytics
     if posthog:
@@ -2272,13 +2720,28 @@ def get_glossary_entries_list(glossary_id):
     if not glossary:
         return json_error('Glossary not found', 404)
         
-    # Get entries
-    entries = get_glossary_entries(glossary_id)
+    # Get one page of entries; large glossaries are loaded incrementally by the UI
+    try:
+        limit = min(max(int(request.args.get('limit', GLOSSARY_ENTRIES_API_PAGE_SIZE)), 1), GLOSSARY_ENTRIES_API_MAX_PAGE_SIZE)
+    except ValueError:
+        limit = GLOSSARY_ENTRIES_API_PAGE_SIZE
+    try:
+        entries, next_cursor = get_glossary_entries_page(glossary_id, limit=limit, cursor=request.args.get('cursor'))
+    except ValueError:
+        # Starting over at the first page would add its entries to the list a second time
+        return json_error('Invalid cursor', 400)
     
-    return json_response({
+    response = {
         'success': True,
-        'entries': entries
-    })
+        'entries': entries,
+        'next_cursor': next_cursor,
+        'has_more': next_cursor is not None
+    }
+    # The total is only needed when the first page is shown
+    if not request.args.get('cursor'):
+        response['total'] = count_glossary_entries(glossary_id)
+    
+    return json_response(response)
 
 @app.route('/glossary/<glossary_id>/entries', methods=['POST'])
 @login_required
@@ -2302,6 +2765,7 @@ def create_new_entry(glossary_id):
     result = create_glossary_entry(glossary_id, data)
     if not result:
         return json_error('Failed to create glossary entry', 500)
+    touch_glossary(glossary_id)
     
     return json_response({
         'success': True,
@@ -2331,6 +2795,7 @@ def update_entry(glossary_id, entry_id):
     result = update_glossary_entry(entry_id, data)
     if not result:
         return json_error('Failed to update glossary entry', 500)
+    touch_glossary(glossary_id)
     
     return json_response({
         'success': True,
@@ -2355,6 +2820,7 @@ def delete_entry(glossary_id, entry_id):
     result = delete_glossary_entry(entry_id)
     if not result:
         return json_error('Failed to delete glossary entry', 500)
+    touch_glossary(glossary_id)
     
     return json_response({
         'success': True,
@@ -2386,47 +2852,34 @@ def import_glossary_entries(glossary_id):
     has_header = request.form.get('has_header', 'false').lower() == 'true'
     try:
         import csv
+        import codecs
         
-        # Save the file to a temporary location
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.csv')
-        file.save(temp_file.name)
-        temp_file.close()
-        
-        # Read the CSV file
-        entries = []
-        with open(temp_file.name, 'r', encoding='utf-8') as csvfile:
-            reader = csv.reader(csvfile)
-            
+        def read_entries(reader):
             # Skip header row if needed
             if has_header:
                 next(reader, None)
                 
+            # Rows without a target term are passed on too, so they are counted as invalid
             for row in reader:
-                if len(row) >= 2:
-                    entry_data = {
-                        'source_term': row[0].strip(),
-                        'target_term': row[1].strip()
-                    }
-                    
-                    # Add optional fields if available
-                    if len(row) >= 3:
-                        entry_data['context'] = row[2].strip()
-                    if len(row) >= 4:
-                        entry_data['notes'] = row[3].strip()
-                        
-                    # Only add if source and target terms are not empty
-                    if entry_data['source_term'] and entry_data['target_term']:
-                        entries.append(entry_data)
+                yield {
+                    'source_term': row[0] if row else '',
+                    'target_term': row[1] if len(row) >= 2 else '',
+                    'context': row[2] if len(row) >= 3 else '',
+                    'notes': row[3] if len(row) >= 4 else ''
+                }
         
-        # Clean up temporary file
-        os.unlink(temp_file.name)
+        # Parse the upload as it is read and write the entries in batches
+        csvfile = codecs.getreader('utf-8-sig')(file.stream)
+        try:
+            import_stats = bulk_upsert_glossary_entries(glossary_id, read_entries(csv.reader(csvfile)))
+        except Exception:
+            # Batches written before the failure are kept
+            touch_glossary(glossary_id)
+            raise
         
-        # Process each entry
-        success_count = 0
-        for entry_data in entries:
-            result = create_glossary_entry(glossary_id, entry_data)
-            if result:
-                success_count += 1
+        success_count = import_stats['inserted'] + import_stats['updated']
+        if import_stats['written']:
+            touch_glossary(glossary_id)
         
         # Track in analytics
         if posthog:
@@ -2438,7 +2891,7 @@ def import_glossary_entries(glossary_id):
                         'glossary_id': glossary_id,
                         'glossary_name': glossary.get('name', 'unknown'),
                         'count': success_count,
-                        'total_entries': len(entries)
+                        'total_entries': import_stats['processed']
                     }
                 )
             except Exception as e:
@@ -2447,7 +2900,8 @@ def import_glossary_entries(glossary_id):
         return json_response({
             'success': True,
             'message': f'Successfully imported {success_count} terms',
-            'count': success_count
+            'count': success_count,
+            'stats': import_stats
         })
     except Exception as e:
         logger.error(f"Error importing glossary entries: {str(e)}")
@@ -2456,7 +2910,12 @@ def import_glossary_entries(glossary_id):
 @app.route('/glossary/<glossary_id>/export', methods=['GET'])
 @login_required
 def export_glossary_entries(glossary_id):
-    """Export glossary entries to CSV file"""
+    """Export glossary entries as a streamed CSV or TBX file.
+    
+    Query parameters: format ('csv' or 'tbx', default csv) and gzip ('true' to compress).
+    Entries are fetched page by page while the response is sent, so memory use doesn't
+    grow with the size of the glossary.
+    """
     user_id = get_user_id()
     if not user_id:
         return redirect(url_for('login'))
@@ -2466,33 +2925,33 @@ def export_glossary_entries(glossary_id):
     if not glossary:
         flash('Glossary not found', 'danger')
         return redirect(url_for('glossary_list'))
-        
-    # Get entries
-    entries = get_glossary_entries(glossary_id)
     
-    # Create CSV file
-    try:
-        import csv
-        from io import StringIO
-        
-        # Create in-memory CSV file
-        output = StringIO()
-        writer = csv.writer(output)
-        
-        # Write header
-        writer.writerow(['source_term', 'target_term', 'context', 'notes'])
-        
-        # Write entries
-        for entry in entries:
-            writer.writerow([
-                entry.get('source_term', ''),
-                entry.get('target_term', ''),
-                entry.get('context', ''),
-                entry.get('notes', '')
-            ])
-        
-        # Prepare response
-        output.seek(0)
+    export_format = request.args.get('format', 'csv').lower()
+    if export_format not in GLOSSARY_EXPORT_FORMATS:
+        flash(f'Unsupported export format: {export_format}', 'danger')
+        return redirect(url_for('glossary_list'))
+    compress = request.args.get('gzip', 'false').lower() == 'true'
+    
+    # Create a safe filename from the glossary name
+    safe_name = ''.join(c for c in glossary.get('name', 'glossary') if c.isalnum() or c in ' _-').strip()
+    safe_name = safe_name.replace(' ', '_')
+    
+    filename = f"{safe_name}_glossary.{GLOSSARY_EXPORT_FORMATS[export_format]['extension']}"
+    if compress:
+        filename += '.gz'
+    
+    exported = {'count': 0}
+    
+    def entries():
+        try:
+            for entry in iter_glossary_entries(glossary_id):
+                exported['count'] += 1
+                yield entry
+        except Exception as e:
+            # Headers are already sent; re-raising aborts the chunked response, so the client
+            # sees a broken download rather than a complete-looking file missing entries
+            logger.error(f"Error exporting glossary entries after {exported['count']} entries: {str(e)}")
+            raise
         
         # Track in analytics
         if posthog:
@@ -2503,27 +2962,30 @@ def export_glossary_entries(glossary_id):
                     properties={
                         'glossary_id': glossary_id,
                         'glossary_name': glossary.get('name', 'unknown'),
-                        'count': len(entries)
+                        'count': exported['count'],
+                        'format': export_format,
+                        'gzip': compress
                     }
                 )
             except Exception as e:
                 logger.error(f"Error tracking glossary export: {str(e)}")
-        
-        # Create a safe filename from the glossary name
-        safe_name = ''.join(c for c in glossary.get('name', 'glossary') if c.isalnum() or c in ' _-').strip()
-        safe_name = safe_name.replace(' ', '_')
-        
-        filename = f"{safe_name}_glossary.csv"
-        
+    
+    if export_format == 'tbx':
+        chunks = iter_glossary_tbx(entries(), glossary.get('source_language'), glossary.get('target_language'), glossary.get('name'))
+    else:
+        chunks = iter_glossary_csv(entries())
+    
+    if compress:
         return Response(
-            output.getvalue(),
-            mimetype="text/csv",
+            iter_gzip(chunks),
+            mimetype='application/gzip',
             headers={"Content-Disposition": f"attachment;filename={filename}"}
         )
-    except Exception as e:
-        logger.error(f"Error exporting glossary entries: {str(e)}")
-        flash(f'Error exporting glossary: {str(e)}', 'danger')
-        return redirect(url_for('glossary_list'))
+    return Response(
+        iter_encoded(chunks),
+        mimetype=GLOSSARY_EXPORT_FORMATS[export_format]['mimetype'],
+        headers={"Content-Disposition": f"attachment;filename={filename}"}
+    )
 
 # Translation Memory Management Routes
 
@@ -2574,6 +3036,33 @@ def translation_memory():
         stats=stats
     )
 
+@app.route('/translation-memory/fuzzy', methods=['POST'])
+@login_required
+def translation_memory_fuzzy_matches():
+    """Find translation memory entries similar to a text"""
+    user_id = get_user_id()
+    if not user_id:
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+        
+    data = request.json or {}
+    text = data.get('text', '')
+    target_language = data.get('target_language', '')
+    if not text.strip() or not target_language:
+        return jsonify({'success': False, 'error': 'text and target_language are required'}), 400
+    
+    try:
+        min_score = max(1, min(100, int(data.get('min_score', TM_FUZZY_MIN_SCORE))))
+        limit = max(1, min(20, int(data.get('limit', 5))))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'min_score and limit must be numbers'}), 400
+        
+    # Identical texts are served by the translation cache, so only near matches are returned
+    matches = find_fuzzy_matches(user_id, text, target_language, min_score=min_score, limit=limit, exclude_exact=True)
+    return jsonify({
+        'success': True,
+        'matches': matches
+    })
+
 @app.route('/translation-memory/<entry_id>', methods=['GET'])
 @login_required
 def view_translation_memory_entry(entry_id):
@@ -3651,6 +4140,49 @@ def setup_database():
         flash(f"Error reading setup script: {str(e)}", "danger")
         return render_template('setup_database.html', error=str(e))
 
+# Admin Route for performance monitoring
+@app.route('/admin/performance-stats')
+@login_required
+def performance_stats():
+    """Return runtime statistics for this worker process as JSON.
+    
+    The stats cover every user's work (the translator pool lists DeepL key prefixes), so
+    only ADMIN_USERS may see them.
+    """
+    if not is_admin():
+        return json_error("You don't have permission to access this page", 403)
+    
+    return json_response({
+        'success': True,
+        'pid': os.getpid(),
+        'deepl_translator_pool': get_deepl_translator_pool_stats(),
+        'translation_cache': get_local_cache_stats(),
+        'translation_memory_indexes': get_translation_memory_index_stats(),
+        'glossary_cache': glossary_cache.stats(),
+        'deepl_glossaries': get_deepl_glossary_sync_stats(),
+        'job_queue': get_job_queue_stats(),
+        'reviews': get_review_stats()
+    })
+
+# Admin Route for rehashing translation cache rows created with an older key scheme
+@app.route('/admin/migrate-translation-cache', methods=['POST'])
+@login_required
+def migrate_translation_cache():
+    """Rehash legacy translation_cache keys to the current versioned scheme.
+    
+    The translation_cache table is shared by all users, so only ADMIN_USERS may run this.
+    """
+    if not is_admin():
+        return json_error("You don't have permission to access this page", 403)
+    
+    try:
+        from supabase_config import migrate_translation_cache_keys
+        result = migrate_translation_cache_keys()
+        return json_response({'success': True, **result})
+    except Exception as e:
+        logger.error(f"Error migrating translation cache keys: {str(e)}")
+        return json_error(f"Error migrating translation cache: {str(e)}", 500)
+
 @app.errorhandler(500)
 def internal_server_error(e):
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
@@ -1,7 +1,11 @@
+import os
 from functools import wraps
 from flask import session, redirect, url_for, flash, request
 from supabase_config import supabase
 
+# User IDs or email addresses, comma separated, allowed to use the /admin maintenance routes
+ADMIN_USERS = {user.strip().lower() for user in os.environ.get('ADMIN_USERS', '').split(',') if user.strip()}
+
 def login_required(f):
     """Decorator to require login for a route"""
     @wraps(f)
@@ -21,6 +25,13 @@ def get_user_id():
     user = get_current_user()
     return user.get('id') if user else None
 
+def is_admin():
+    """Whether the logged-in user is listed in ADMIN_USERS"""
+    user = get_current_user()
+    if not user:
+        return False
+    return bool({str(user.get('id') or '').lower(), (user.get('email') or '').lower()} & ADMIN_USERS)
+
 def sign_up(email, password, metadata=None):
     """Register a new user"""
     try:
@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+"""
+Local stand-in for the parts of the OpenAI API that batch reviews use.
+
+Serves /v1/assistants/<id>, /v1/files, /v1/files/<id>/content, /v1/batches and
+/v1/batches/<id> from memory, so a batch review can run without an OpenAI account. Each
+batch completes after a few status checks, with every request answered by a reviewer
+function. Point the app at it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1.
+
+    python batch_review_stub.py [port]    serve until interrupted (default port 8765)
+    python batch_review_stub.py --check   run a batch review job through the stub
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import tempfile
+import threading
+import logging
+from email.parser import BytesParser
+from email.policy import default as default_policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# Separator lines around the text and context in build_review_messages' user message
+_SECTION_RE = re.compile(r'\n\s*---\s*\n')
+
+def parse_review_message(content):
+    """Return (text, context) of a user message from review_engine.build_review_messages"""
+    parts = [part.strip() for part in _SECTION_RE.split(content)]
+    if len(parts) >= 4:
+        return parts[-2], parts[-3]
+    return parts[-2] if len(parts) >= 2 else content.strip(), None
+
+def unchanged_review(text, context):
+    """Default reviewer: return the text as it is, as the model does when it can't improve it"""
+    return text
+
+class BatchReviewStub:
+    """In-memory OpenAI stand-in served on a background thread.
+
+    reviewer is called as reviewer(text, context) for each request of a batch and returns
+    the reply; a batch is completed at the status check number polls_until_complete.
+    """
+
+    def __init__(self, port=0, reviewer=unchanged_review, polls_until_complete=2, model='gpt-4o'):
+        self.reviewer = reviewer
+        self.polls_until_complete = polls_until_complete
+        self.model = model
+        self.files = {}  # file ID -> {'content': bytes, 'filename', 'purpose'}
+        self.batches = {}  # batch ID -> batch dict, plus 'polls'
+        self._lock = threading.RLock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), self._handler_class())
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='batch-review-stub', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def requests(self, batch_id):
+        """Return the request lines of a batch's input file"""
+        content = self.files[self.batches[batch_id]['input_file_id']]['content']
+        return [json.loads(line) for line in content.decode('utf-8').splitlines() if line.strip()]
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+            def do_GET(self):
+                stub._route(self, 'GET')
+
+            def do_POST(self):
+                stub._route(self, 'POST')
+
+        return Handler
+
+    def _route(self, handler, method):
+        path = handler.path.split('?')[0]
+        body = handler.rfile.read(int(handler.headers.get('Content-Length') or 0))
+        try:
+            if method == 'GET' and path.startswith('/v1/assistants/'):
+                result = self._assistant(path.rsplit('/', 1)[1])
+            elif method == 'POST' and path == '/v1/files':
+                result = self._create_file(handler.headers.get('Content-Type', ''), body)
+            elif method == 'GET' and path.startswith('/v1/files/') and path.endswith('/content'):
+                file_id = path[len('/v1/files/'):-len('/content')]
+                return self._send(handler, 200, self.files[file_id]['content'], 'application/octet-stream')
+            elif method == 'POST' and path == '/v1/batches':
+                result = self._create_batch(json.loads(body or b'{}'))
+            elif method == 'GET' and path.startswith('/v1/batches/'):
+                result = self._check_batch(path.rsplit('/', 1)[1])
+            else:
+                return self._send_json(handler, 404, {'error': {'message': f"No route for {method} {path}"}})
+        except KeyError as e:
+            return self._send_json(handler, 404, {'error': {'message': f"Not found: {e}"}})
+        self._send_json(handler, 200, result)
+
+    def _send_json(self, handler, status, data):
+        self._send(handler, status, json.dumps(data).encode('utf-8'), 'application/json')
+
+    def _send(self, handler, status, content, content_type):
+        handler.send_response(status)
+        handler.send_header('Content-Type', content_type)
+        handler.send_header('Content-Length', str(len(content)))
+        handler.end_headers()
+        handler.wfile.write(content)
+
+    def _assistant(self, assistant_id):
+        return {'id': assistant_id, 'object': 'assistant', 'created_at': int(time.time()), 'name': 'Stub reviewer',
+                'description': None, 'model': self.model, 'instructions': 'Review translations.', 'tools': [],
+                'metadata': {}, 'temperature': None, 'top_p': None}
+
+    def _create_file(self, content_type, body):
+        message = BytesParser(policy=default_policy).parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode('latin-1') + body)
+        fields = {part.get_param('name', header='content-disposition'): part for part in message.iter_parts()}
+        upload = fields['file']
+        return self._store_file(upload.get_payload(decode=True), upload.get_filename() or 'upload.jsonl',
+                                fields['purpose'].get_content().strip())
+
+    def _store_file(self, content, filename, purpose):
+        file_id = f"file-{uuid.uuid4().hex[:24]}"
+        with self._lock:
+            self.files[file_id] = {'content': content, 'filename': filename, 'purpose': purpose}
+        return {'id': file_id, 'object': 'file', 'bytes': len(content), 'created_at': int(time.time()),
+                'filename': filename, 'purpose': purpose, 'status': 'processed'}
+
+    def _create_batch(self, data):
+        batch_id = f"batch_{uuid.uuid4().hex[:24]}"
+        batch = {
+            'id': batch_id, 'object': 'batch', 'endpoint': data.get('endpoint'), 'errors': None,
+            'input_file_id': data['input_file_id'], 'completion_window': data.get('completion_window'),
+            'status': 'validating', 'output_file_id': None, 'error_file_id': None,
+            'created_at': int(time.time()), 'metadata': data.get('metadata'),
+            'request_counts': {'total': 0, 'completed': 0, 'failed': 0}, 'polls': 0
+        }
+        with self._lock:
+            self.batches[batch_id] = batch
+            batch['request_counts']['total'] = len(self.requests(batch_id))
+        return self._public(batch)
+
+    def _check_batch(self, batch_id):
+        with self._lock:
+            batch = self.batches[batch_id]
+            batch['polls'] += 1
+            if batch['status'] != 'completed':
+                if batch['polls'] < self.polls_until_complete:
+                    batch['status'] = 'in_progress'
+                else:
+                    self._complete(batch)
+            return self._public(batch)
+
+    def _complete(self, batch):
+        """Answer every request of a batch and store the results as its output file"""
+        lines = []
+        for request in self.requests(batch['id']):
+            text, context = parse_review_message(request['body']['messages'][-1]['content'])
+            lines.append(json.dumps({
+                'id': f"batch_req_{uuid.uuid4().hex[:24]}",
+                'custom_id': request['custom_id'],
+                'response': {'status_code': 200, 'request_id': uuid.uuid4().hex, 'body': {
+                    'id': f"chatcmpl-{uuid.uuid4().hex[:24]}", 'object': 'chat.completion',
+                    'created': int(time.time()), 'model': request['body'].get('model'),
+                    'choices': [{'index': 0, 'finish_reason': 'stop',
+                                 'message': {'role': 'assistant', 'content': self.reviewer(text, context)}}]
+                }},
+                'error': None
+            }, ensure_ascii=False))
+        output = self._store_file(('\n'.join(lines) + '\n').encode('utf-8'), 'batch_output.jsonl', 'batch_output')
+        batch.update(status='completed', output_file_id=output['id'],
+                     request_counts={'total': len(lines), 'completed': len(lines), 'failed': 0})
+
+    @staticmethod
+    def _public(batch):
+        return {key: value for key, value in batch.items() if key != 'polls'}
+
+def check_batch_review_job():
+    """Run a batch review job through the stub, from submission to saved pages.
+
+    The reviewer upper-cases each text and repeats its context in front of it, as models
+    sometimes do, so the saved pages must equal the upper-cased originals: the chunks of
+    long pages joined back at paragraph, sentence and word boundaries, without the context.
+    Database access is replaced with in-memory pages. Raises AssertionError on a mismatch.
+    """
+    from unittest import mock
+
+    os.environ.setdefault('JOB_QUEUE_PATH', os.path.join(tempfile.mkdtemp(), 'jobs.sqlite3'))
+    import app
+    import review_engine
+    from jobs import JobDeferred
+
+    def reviewer(text, context):
+        return f"{context}\n\n{text.upper()}" if context else text.upper()
+
+    paragraph = ' '.join(f"Mening {index} i ett stycke om boken." for index in range(12))
+    pages = {
+        'page-short': 'En kort sida.',
+        'page-paragraphs': '\n\n'.join([paragraph] * 4),
+        'page-words': 'lång' * 150 + ' slut.'
+    }
+    saved = {}
+    progress = []
+    job = {'id': f"check-{uuid.uuid4().hex}", 'user_id': 'check-user', 'payload': {
+        'document_id': 'check-document', 'page_ids': list(pages), 'assistant_id': 'asst_stub',
+        'instructions': None, 'complexity_threshold': None
+    }}
+
+    with BatchReviewStub(reviewer=reviewer) as stub, \
+            mock.patch.object(review_engine, 'OPENAI_BASE_URL', stub.base_url), \
+            mock.patch.object(review_engine, '_clients', {}), \
+            mock.patch.object(review_engine, 'REVIEW_CHUNK_CHARS', 200), \
+            mock.patch.object(app, 'get_user_settings', lambda user_id: {'api_keys': {'openai_api_key': 'sk-stub'}}), \
+            mock.patch.object(app, '_pages_to_review', lambda *args, **kwargs: (list(pages.items()), [])), \
+            mock.patch.object(app, 'update_document_page', lambda user_id, page_id, data: saved.update({page_id: data}) or True), \
+            mock.patch.object(app, '_update_ai_review_count', lambda *args: None):
+        for _ in range(stub.polls_until_complete + 2):
+            try:
+                result = app.run_batch_review_job(job, progress.append)
+                break
+            except JobDeferred:
+                continue
+        else:
+            raise AssertionError('The batch review job did not finish')
+
+        custom_ids = [request['custom_id'] for batch_id in stub.batches for request in stub.requests(batch_id)]
+
+    assert len(stub.batches) == 1, f"{len(stub.batches)} batches were submitted"
+    assert {re.sub(r'#.*', '', custom_id) for custom_id in custom_ids} == set(pages), custom_ids
+    assert any(custom_id.endswith('s') for custom_id in custom_ids), 'no page was split within a paragraph'
+    assert any(custom_id.endswith('w') for custom_id in custom_ids), 'no page was split within a word'
+    for page_id, text in pages.items():
+        assert saved[page_id]['translated_content'] == text.upper(), f"page {page_id} was not joined correctly"
+    assert all(entry['pages_total'] == len(pages) for entry in progress), progress
+    assert result['pages_reviewed'] == len(pages) and not result['pages_failed'], result
+    return {'requests': len(custom_ids), 'pages': len(pages), 'result': result}
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    if '--check' in sys.argv[1:]:
+        print(f"Batch review check passed: {check_batch_review_job()}")
+        sys.exit(0)
+
+    stub = BatchReviewStub(port=int(sys.argv[1]) if len(sys.argv) > 1 else 8765).start()
+    print(f"Serving the OpenAI batch review stub at {stub.base_url}")
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        stub.stop()
@@ -0,0 +1,238 @@
+# Mirrors local glossaries to DeepL so terms are applied while translating
+
+import os
+import time
+import hashlib
+import threading
+import logging
+
+import deepl
+
+logger = logging.getLogger(__name__)
+
+# Set DEEPL_GLOSSARY_SYNC=0 to always apply glossaries locally after translation
+DEEPL_GLOSSARY_SYNC = os.environ.get('DEEPL_GLOSSARY_SYNC', '1').lower() not in ('0', 'false', 'no', '')
+# How often a synced glossary's version is checked against the database
+DEEPL_GLOSSARY_REVALIDATE_SECONDS = int(os.environ.get('DEEPL_GLOSSARY_REVALIDATE_SECONDS', '30'))
+# How long the language pairs DeepL supports for glossaries are cached
+DEEPL_GLOSSARY_LANGUAGES_TTL = 24 * 3600
+# Names of glossaries created on DeepL start with this prefix
+DEEPL_GLOSSARY_NAME_PREFIX = 'btp'
+
+_synced = {}  # (key fingerprint, glossary_id, source, target) -> {'result', 'version', 'checked_at'}
+_languages = {}  # key fingerprint -> {'pairs': set of (source, target), 'loaded_at': float}
+_lock = threading.Lock()
+_build_locks = {}  # cache key -> [lock, number of threads using it]
+_stats = {'hits': 0, 'syncs': 0, 'created': 0, 'reused': 0, 'deleted': 0, 'errors': 0}
+
+def _key_fingerprint(deepl_api_key):
+    """Identify an API key without keeping the key itself in the cache"""
+    return hashlib.sha256(deepl_api_key.encode('utf-8')).hexdigest()[:16]
+
+def _name_prefix(glossary_id, source_language=None, target_language=None):
+    prefix = f"{DEEPL_GLOSSARY_NAME_PREFIX}-{glossary_id}-"
+    if source_language and target_language:
+        prefix += f"{source_language.lower()}-{target_language.lower()}-"
+    return prefix
+
+def deepl_glossary_name(glossary_id, version, source_language, target_language):
+    """Name of the DeepL glossary for a glossary version and language pair.
+
+    DeepL glossaries can't be edited, so every version gets its own glossary. The name is
+    deterministic so that all workers find and reuse the same one.
+    """
+    digest = hashlib.blake2b(str(version).encode('utf-8'), digest_size=6).hexdigest()
+    return _name_prefix(glossary_id, source_language, target_language) + digest
+
+def build_deepl_glossary_entries(entries):
+    """Convert glossary entries into the source term -> target term dict DeepL accepts.
+
+    DeepL rejects duplicate source terms and terms containing tabs or line breaks, so those
+    entries are skipped; as in CompiledGlossary, the first of duplicate source terms wins.
+    """
+    result = {}
+    for entry in entries:
+        source_term = (entry.get('source_term') or '').strip()
+        target_term = (entry.get('target_term') or '').strip()
+        if not source_term or not target_term or source_term in result:
+            continue
+        if any(char in source_term or char in target_term for char in '\t\n\r'):
+            continue
+        result[source_term] = target_term
+    return result
+
+def _supports_pair(translator, fingerprint, source_language, target_language):
+    """Check whether DeepL supports glossaries for a language pair"""
+    with _lock:
+        cached = _languages.get(fingerprint)
+    if not cached or time.time() - cached['loaded_at'] > DEEPL_GLOSSARY_LANGUAGES_TTL:
+        pairs = {
+            (pair.source_lang.upper(), pair.target_lang.upper())
+            for pair in translator.get_glossary_languages()
+        }
+        cached = {'pairs': pairs, 'loaded_at': time.time()}
+        with _lock:
+            _languages[fingerprint] = cached
+    # Glossary language pairs don't distinguish variants such as EN-GB
+    return (source_language, target_language.split('-')[0]) in cached['pairs']
+
+def _sync(translator, glossary_id, version, source_language, target_language):
+    """Find or create the DeepL glossary for a glossary version and delete outdated ones.
+
+    Returns the DeepL glossary ID, or None if the glossary has no entries DeepL accepts.
+    """
+    from supabase_config import get_all_glossary_entries
+
+    name = deepl_glossary_name(glossary_id, version, source_language, target_language)
+    prefix = _name_prefix(glossary_id, source_language, target_language)
+    existing = [info for info in translator.list_glossaries() if info.name.startswith(prefix)]
+
+    current = next((info for info in existing if info.name == name), None)
+    if current:
+        with _lock:
+            _stats['reused'] += 1
+    else:
+        entries = build_deepl_glossary_entries(get_all_glossary_entries(glossary_id))
+        if not entries:
+            return None
+        current = translator.create_glossary(name, source_language, target_language.split('-')[0], entries)
+        logger.info(f"Created DeepL glossary {current.glossary_id} for glossary {glossary_id} "
+                    f"({source_language}->{target_language}, {len(entries)} entries)")
+        with _lock:
+            _stats['created'] += 1
+
+    # Glossaries of older versions are no longer used by any worker once they revalidate
+    for info in existing:
+        if info.name != name:
+            try:
+                translator.delete_glossary(info)
+                with _lock:
+                    _stats['deleted'] += 1
+            except deepl.exceptions.DeepLException as e:
+                logger.warning(f"Could not delete outdated DeepL glossary {info.glossary_id}: {str(e)}")
+
+    return current.glossary_id
+
+def get_deepl_glossary(deepl_api_key, glossary_id, source_language, target_language):
+    """Get the DeepL glossary mirroring a local glossary, creating it if needed.
+
+    Language codes must be normalized DeepL codes. DeepL glossaries need a source language
+    and only match words of that language, so the glossary is only mirrored when its source
+    language is the one the text is translated from; with source_language 'AUTO' the text
+    may be in any language, so it is applied locally.
+
+    Returns a dict with deepl_glossary_id, source_language (to send to DeepL) and
+    cache_version (for translation cache keys), or None if the glossary should be applied
+    locally instead: sync disabled, automatic or different source language, unsupported
+    language pair, no usable entries, or DeepL/database errors.
+    """
+    if not DEEPL_GLOSSARY_SYNC or not glossary_id or not deepl_api_key:
+        return None
+    if not source_language or source_language == 'AUTO' or source_language == target_language:
+        return None
+
+    from supabase_config import get_glossary_metadata
+    from utils import get_deepl_translator
+
+    fingerprint = _key_fingerprint(deepl_api_key)
+    cache_key = (fingerprint, glossary_id, source_language, target_language)
+
+    def fresh(cached):
+        return cached and time.time() - cached['checked_at'] < DEEPL_GLOSSARY_REVALIDATE_SECONDS
+
+    with _lock:
+        cached = _synced.get(cache_key)
+        if fresh(cached):
+            _stats['hits'] += 1
+            return cached['result']
+        build_lock = _build_locks.setdefault(cache_key, [threading.Lock(), 0])
+        build_lock[1] += 1
+
+    # Only one thread syncs a given glossary; the others wait for it and reuse the result
+    try:
+        with build_lock[0]:
+            with _lock:
+                cached = _synced.get(cache_key)
+                if fresh(cached):
+                    _stats['hits'] += 1
+                    return cached['result']
+
+            metadata = get_glossary_metadata(glossary_id)
+            if metadata is None:
+                # Keep using the last known state while the database can't be read
+                return cached['result'] if cached else None
+
+            version = metadata.get('updated_at')
+            if cached and cached['version'] == version:
+                with _lock:
+                    cached['checked_at'] = time.time()
+                return cached['result']
+
+            glossary_source = (metadata.get('source_language') or '').upper()
+
+            result = None
+            if glossary_source != source_language:
+                logger.info(f"Glossary {glossary_id} is for {glossary_source or 'no'} source language, not "
+                            f"{source_language}, applying it locally")
+            else:
+                try:
+                    translator = get_deepl_translator(deepl_api_key)
+                    if _supports_pair(translator, fingerprint, source_language, target_language):
+                        deepl_glossary_id = _sync(translator, glossary_id, version, source_language, target_language)
+                        if deepl_glossary_id:
+                            result = {
+                                'deepl_glossary_id': deepl_glossary_id,
+                                'source_language': source_language,
+                                'cache_version': f"{glossary_id}@{version}"
+                            }
+                    else:
+                        logger.info(f"DeepL has no glossary support for {source_language}->{target_language}, applying glossary locally")
+                except Exception as e:
+                    logger.warning(f"Could not sync glossary {glossary_id} to DeepL, applying it locally: {str(e)}")
+                    with _lock:
+                        _stats['errors'] += 1
+                    # Don't record the version, so the sync is retried at the next revalidation
+                    version = None
+
+            with _lock:
+                _stats['syncs'] += 1
+                _synced[cache_key] = {'result': result, 'version': version, 'checked_at': time.time()}
+            return result
+    finally:
+        # Drop the lock once no thread uses it, so keys of old glossaries don't pile up
+        with _lock:
+            build_lock[1] -= 1
+            if not build_lock[1]:
+                del _build_locks[cache_key]
+
+def forget_deepl_glossary(deepl_glossary_id):
+    """Drop cached references to a DeepL glossary, e.g. after DeepL reported it missing"""
+    with _lock:
+        for cache_key in [key for key, cached in _synced.items()
+                          if cached['result'] and cached['result']['deepl_glossary_id'] == deepl_glossary_id]:
+            del _synced[cache_key]
+
+def delete_deepl_glossaries(deepl_api_key, glossary_id):
+    """Delete every DeepL glossary created for a local glossary"""
+    from utils import get_deepl_translator
+
+    fingerprint = _key_fingerprint(deepl_api_key)
+    with _lock:
+        for cache_key in [key for key in _synced if key[0] == fingerprint and key[1] == glossary_id]:
+            del _synced[cache_key]
+
+    try:
+        translator = get_deepl_translator(deepl_api_key)
+        prefix = _name_prefix(glossary_id)
+        for info in translator.list_glossaries():
+            if info.name.startswith(prefix):
+                translator.delete_glossary(info)
+                with _lock:
+                    _stats['deleted'] += 1
+    except Exception as e:
+        logger.warning(f"Could not delete DeepL glossaries for glossary {glossary_id}: {str(e)}")
+
+def get_deepl_glossary_sync_stats():
+    """Return counters for DeepL glossary synchronization"""
+    with _lock:
+        return dict(_stats, synced=sum(1 for cached in _synced.values() if cached['result']))
@@ -0,0 +1,225 @@
+# Compiled glossary matching: one linear pass per text for any number of terms
+
+import os
+import re
+import sys
+import time
+import threading
+import logging
+from collections import OrderedDict, defaultdict
+
+logger = logging.getLogger(__name__)
+
+# Memory budget for compiled glossaries kept per worker
+GLOSSARY_CACHE_MAX_BYTES = int(os.environ.get('GLOSSARY_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+# How often a cached glossary's version is checked against the database
+GLOSSARY_CACHE_REVALIDATE_SECONDS = int(os.environ.get('GLOSSARY_CACHE_REVALIDATE_SECONDS', '30'))
+
+_WORD_CHAR_RE = re.compile(r'\w')
+
+def _is_word_char(char):
+    return bool(_WORD_CHAR_RE.match(char))
+
+def _trie_pattern(node):
+    """Render a trie node as a regex where longer continuations are tried before shorter ones"""
+    alternatives = []
+    for char in sorted(node['children']):
+        alternatives.append(re.escape(char) + _trie_pattern(node['children'][char]))
+
+    if node['end']:
+        # Only require a word boundary after terms that end in a word character,
+        # so terms like "C++" or "e.g." still match before punctuation or spaces
+        alternatives.append(r'(?!\w)' if node['word_end'] else '')
+
+    if len(alternatives) == 1:
+        return alternatives[0]
+    return '(?:' + '|'.join(alternatives) + ')'
+
+class CompiledGlossary:
+    """A glossary compiled into a single trie-structured regex.
+
+    Terms are matched case-sensitively, leftmost-longest, in a single pass, so a
+    replacement is never matched again by another term. Terms starting or ending with a
+    word character only match at Unicode word boundaries on that side.
+    """
+
+    def __init__(self, entries):
+        self.replacements = {}  # source_term -> (target_term, entry_id)
+        for entry in entries:
+            source_term = (entry.get('source_term') or '').strip()
+            target_term = entry.get('target_term')
+            if source_term and target_term and source_term not in self.replacements:
+                self.replacements[source_term] = (target_term, entry.get('id', source_term))
+
+        self.pattern = self._compile(self.replacements) if self.replacements else None
+
+    @staticmethod
+    def _compile(terms):
+        # Separate tries for terms that need a word boundary before them and terms that don't
+        tries = {True: {'children': {}, 'end': False}, False: {'children': {}, 'end': False}}
+        for term in terms:
+            node = tries[_is_word_char(term[0])]
+            for char in term:
+                node = node['children'].setdefault(char, {'children': {}, 'end': False})
+            node['end'] = True
+            node['word_end'] = _is_word_char(term[-1])
+
+        parts = []
+        if tries[True]['children']:
+            parts.append(r'(?<!\w)' + _trie_pattern(tries[True]))
+        if tries[False]['children']:
+            parts.append(_trie_pattern(tries[False]))
+        return re.compile('|'.join(parts))
+
+    def __len__(self):
+        return len(self.replacements)
+
+    @property
+    def approx_bytes(self):
+        """Rough memory footprint of the terms and compiled pattern"""
+        size = sys.getsizeof(self.replacements)
+        for source_term, (target_term, _) in self.replacements.items():
+            size += sys.getsizeof(source_term) + sys.getsizeof(target_term) + 64
+        if self.pattern is not None:
+            # The compiled program is a few times larger than the pattern source
+            size += len(self.pattern.pattern) * 4
+        return size
+
+    def apply(self, text):
+        """Replace glossary terms in text.
+
+        Returns (text, entry_hits) where entry_hits maps entry id to its number of replacements.
+        """
+        entry_hits = {}
+        if not text or self.pattern is None:
+            return text, entry_hits
+
+        replacements = self.replacements
+
+        def replace(match):
+            target_term, entry_id = replacements[match.group(0)]
+            entry_hits[entry_id] = entry_hits.get(entry_id, 0) + 1
+            return target_term
+
+        return self.pattern.sub(replace, text), entry_hits
+
+def compile_glossary(entries):
+    """Compile glossary entries (dicts with id, source_term and target_term)"""
+    return CompiledGlossary(entries)
+
+class CompiledGlossaryCache:
+    """Per-worker LRU of compiled glossaries keyed by glossary ID and version.
+
+    A cached glossary is used without any database access for revalidate_seconds; after
+    that its version (the glossary's updated_at) is checked and it is only recompiled if
+    the version changed. Routes that change entries call invalidate() to drop it at once
+    in this worker. Entries are evicted least recently used first to stay within max_bytes.
+    """
+
+    def __init__(self, max_bytes=GLOSSARY_CACHE_MAX_BYTES, revalidate_seconds=GLOSSARY_CACHE_REVALIDATE_SECONDS):
+        self.max_bytes = max_bytes
+        self.revalidate_seconds = revalidate_seconds
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()  # glossary_id -> {'glossary', 'version', 'checked_at', 'size'}
+        self._lock = threading.Lock()
+        self._build_locks = defaultdict(threading.Lock)
+
+    def _fresh(self, glossary_id, get_version):
+        """Return the cached glossary if it is still valid, else None"""
+        with self._lock:
+            cached = self._entries.get(glossary_id)
+            if not cached:
+                return None
+            if time.time() - cached['checked_at'] < self.revalidate_seconds:
+                self._entries.move_to_end(glossary_id)
+                self.hits += 1
+                return cached['glossary']
+
+        version = get_version(glossary_id)
+        with self._lock:
+            cached = self._entries.get(glossary_id)
+            if not cached:
+                return None
+            # An unknown version (lookup failed) keeps the cached glossary
+            if version is None or version == cached['version']:
+                cached['checked_at'] = time.time()
+                self._entries.move_to_end(glossary_id)
+                self.hits += 1
+                self.revalidations += 1
+                return cached['glossary']
+            return None
+
+    def get(self, glossary_id, get_version, load_entries):
+        """Get the compiled glossary, loading and compiling it if needed.
+
+        Args:
+            glossary_id: The glossary ID
+            get_version: Function returning the current version of a glossary
+            load_entries: Function returning all entries of a glossary
+        """
+        glossary = self._fresh(glossary_id, get_version)
+        if glossary is not None:
+            return glossary
+
+        # Only one thread compiles a given glossary; the others wait and reuse it
+        with self._build_locks[glossary_id]:
+            glossary = self._fresh(glossary_id, get_version)
+            if glossary is not None:
+                return glossary
+
+            version = get_version(glossary_id)
+            started = time.time()
+            glossary = compile_glossary(load_entries(glossary_id))
+            logger.info(f"Compiled glossary {glossary_id} with {len(glossary)} terms in {time.time() - started:.2f}s")
+            self._store(glossary_id, glossary, version)
+            return glossary
+
+    def _store(self, glossary_id, glossary, version):
+        size = glossary.approx_bytes
+        with self._lock:
+            self.misses += 1
+            old = self._entries.pop(glossary_id, None)
+            if old:
+                self.current_bytes -= old['size']
+            if size > self.max_bytes:
+                logger.warning(f"Compiled glossary {glossary_id} ({size} bytes) exceeds the cache limit, not caching it")
+                return
+
+            self._entries[glossary_id] = {'glossary': glossary, 'version': version, 'checked_at': time.time(), 'size': size}
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= evicted['size']
+                self.evictions += 1
+
+    def invalidate(self, glossary_id):
+        """Drop a glossary from the cache"""
+        with self._lock:
+            old = self._entries.pop(glossary_id, None)
+            if old:
+                self.current_bytes -= old['size']
+                self.invalidations += 1
+
+    def stats(self):
+        """Return size and hit/miss/eviction counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'glossaries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'revalidate_seconds': self.revalidate_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'revalidations': self.revalidations,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
+
+glossary_cache = CompiledGlossaryCache()
@@ -0,0 +1,120 @@
+# Streaming glossary export (CSV and TBX) with optional gzip compression
+
+import io
+import re
+import csv
+import zlib
+import logging
+from xml.sax.saxutils import escape, quoteattr
+
+logger = logging.getLogger(__name__)
+
+# Text is yielded in chunks of about this many characters
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+GLOSSARY_EXPORT_FORMATS = {
+    'csv': {'mimetype': 'text/csv', 'extension': 'csv'},
+    'tbx': {'mimetype': 'application/x-tbx+xml', 'extension': 'tbx'}
+}
+
+# Control characters that are not allowed in XML 1.0
+_XML_INVALID_CHARS_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+def _xml_text(value):
+    return escape(_XML_INVALID_CHARS_RE.sub('', value or ''))
+
+def iter_glossary_csv(entries, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield a CSV export of glossary entries as text chunks.
+
+    The header row is yielded on its own first, so a response starts before any entries
+    have been fetched.
+    """
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(['source_term', 'target_term', 'context', 'notes'])
+    yield output.getvalue()
+    output.seek(0)
+    output.truncate()
+
+    for entry in entries:
+        writer.writerow([
+            entry.get('source_term') or '',
+            entry.get('target_term') or '',
+            entry.get('context') or '',
+            entry.get('notes') or ''
+        ])
+        if output.tell() >= chunk_size:
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate()
+
+    if output.tell():
+        yield output.getvalue()
+
+def iter_glossary_tbx(entries, source_language=None, target_language=None, title=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield a TBX-Basic (ISO 30042) export of glossary entries as text chunks.
+
+    Each entry becomes a conceptEntry with a source and a target langSec; context is kept
+    as a descrip on the target term and notes as a note on the concept.
+    """
+    source_lang = quoteattr((source_language or 'und').lower())
+    target_lang = quoteattr((target_language or 'und').lower())
+
+    yield (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        f'<tbx type="TBX-Basic" style="dca" xml:lang={source_lang} xmlns="urn:iso:std:iso:30042:ed-2">\n'
+        '  <tbxHeader>\n'
+        '    <fileDesc>\n'
+        f'      <sourceDesc><p>{_xml_text(title or "Glossary")}</p></sourceDesc>\n'
+        '    </fileDesc>\n'
+        '  </tbxHeader>\n'
+        '  <text>\n'
+        '    <body>\n'
+    )
+
+    parts = []
+    size = 0
+    for number, entry in enumerate(entries, 1):
+        context = entry.get('context')
+        notes = entry.get('notes')
+        part = (
+            f'      <conceptEntry id="c{number}">\n'
+            + (f'        <note>{_xml_text(notes)}</note>\n' if notes else '')
+            + f'        <langSec xml:lang={source_lang}>\n'
+            f'          <termSec><term>{_xml_text(entry.get("source_term"))}</term></termSec>\n'
+            '        </langSec>\n'
+            f'        <langSec xml:lang={target_lang}>\n'
+            f'          <termSec><term>{_xml_text(entry.get("target_term"))}</term>'
+            + (f'<descrip type="context">{_xml_text(context)}</descrip>' if context else '')
+            + '</termSec>\n'
+            '        </langSec>\n'
+            '      </conceptEntry>\n'
+        )
+        parts.append(part)
+        size += len(part)
+        if size >= chunk_size:
+            yield ''.join(parts)
+            parts = []
+            size = 0
+
+    parts.append('    </body>\n  </text>\n</tbx>\n')
+    yield ''.join(parts)
+
+def iter_gzip(chunks, encoding='utf-8'):
+    """Encode text chunks and compress them into a gzip stream, yielding bytes as they are ready"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 writes the gzip container
+    first = True
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode(encoding))
+        if first:
+            # Send the first chunk right away instead of waiting for the compressor to fill up
+            data += compressor.flush(zlib.Z_SYNC_FLUSH)
+            first = False
+        if data:
+            yield data
+    yield compressor.flush()
+
+def iter_encoded(chunks, encoding='utf-8'):
+    """Encode text chunks to bytes"""
+    for chunk in chunks:
+        yield chunk.encode(encoding)
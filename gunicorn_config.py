@@ -1,4 +1,5 @@
 # Gunicorn configuration file
+import os
 import multiprocessing
 import logging
 
@@ -9,9 +10,15 @@ reuse_port = True
 
 # Worker processes
 workers = multiprocessing.cpu_count() * 2 + 1
-worker_class = 'sync'
+# Threaded workers, so long-lived progress streams (/jobs/<id>/events) don't tie up a whole process.
+# Thread budget per worker: each open progress stream holds one thread for up to
+# JOB_EVENTS_MAX_SECONDS (60), and at most JOB_EVENTS_MAX_STREAMS (4) streams are served at a
+# time, so the other threads stay free for normal requests. Raise both together.
+# Background jobs (JOB_WORKER_THREADS) run on threads of their own, outside this budget.
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', '8'))
 worker_connections = 1000
-timeout = 300  # Increase timeout to 5 minutes
+timeout = 300  # Increase timeout to 5 minutes (translations run as background jobs, see jobs.py)
 keepalive = 2
 
 # Logging
@@ -41,5 +48,10 @@ certfile = None
 def on_starting(server):
     logger = logging.getLogger('gunicorn.error')
     logger.info(f'Starting with timeout set to {timeout} seconds')
-    logger.info(f'Worker class: {worker_class}')
-    logger.info(f'Number of workers: {workers}')
\ No newline at end of file
+    logger.info(f'Worker class: {worker_class} ({threads} threads)')
+    logger.info(f'Number of workers: {workers}')
+
+# Start the background job worker threads in each worker process after it is forked
+def post_fork(server, worker):
+    from jobs import start_job_workers
+    start_job_workers()
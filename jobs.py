@@ -0,0 +1,568 @@
+# Background job queue backed by a local SQLite database, so no external broker is needed
+
+import os
+import json
+import time
+import uuid
+import hashlib
+import socket
+import sqlite3
+import tempfile
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Queue database shared by all processes on the machine
+JOB_QUEUE_PATH = os.environ.get('JOB_QUEUE_PATH', os.path.join(tempfile.gettempdir(), 'translation_jobs.sqlite3'))
+# Worker threads started in each web process; set to 0 to only run jobs with `python jobs.py`
+JOB_WORKER_THREADS = int(os.environ.get('JOB_WORKER_THREADS', '2'))
+# How often idle workers look for jobs queued by other processes
+JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', '1.0'))
+# Finished jobs are deleted after this many seconds
+JOB_RETENTION_SECONDS = int(os.environ.get('JOB_RETENTION_SECONDS', str(7 * 24 * 3600)))
+# Running jobs record a heartbeat this often; a job without one for JOB_STALE_SECONDS is
+# assumed to have lost its worker and is queued again, up to JOB_MAX_ATTEMPTS runs in total
+JOB_HEARTBEAT_SECONDS = float(os.environ.get('JOB_HEARTBEAT_SECONDS', '15'))
+JOB_STALE_SECONDS = float(os.environ.get('JOB_STALE_SECONDS', '120'))
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', '3'))
+
+JOB_STATUSES = ('queued', 'running', 'completed', 'failed')
+
+# Server-sent event streams of job progress: how often the job is checked, how often a
+# heartbeat comment keeps idle connections open, and how long a stream lasts before the
+# client is asked to reconnect (so a worker thread isn't held by one client indefinitely)
+JOB_EVENTS_POLL_INTERVAL = float(os.environ.get('JOB_EVENTS_POLL_INTERVAL', '0.5'))
+JOB_EVENTS_HEARTBEAT_SECONDS = float(os.environ.get('JOB_EVENTS_HEARTBEAT_SECONDS', '15'))
+JOB_EVENTS_MAX_SECONDS = float(os.environ.get('JOB_EVENTS_MAX_SECONDS', '60'))
+JOB_EVENTS_RETRY_MS = 2000
+# Streams one process serves at the same time; each holds a server thread, so keep this well
+# below the gunicorn thread count (see gunicorn_config.py). Clients beyond it poll instead.
+JOB_EVENTS_MAX_STREAMS = int(os.environ.get('JOB_EVENTS_MAX_STREAMS', '4'))
+
+class JobError(Exception):
+    """Raised by job handlers for failures whose message can be shown to the user"""
+
+class JobDeferred(Exception):
+    """Raised by job handlers waiting on something external, to be run again after delay seconds"""
+
+    def __init__(self, delay, message=None):
+        super().__init__(message or f"Deferred for {delay} seconds")
+        self.delay = delay
+
+class JobQueue:
+    """Persistent job queue in a SQLite database that several processes can share.
+
+    Jobs are claimed atomically with an IMMEDIATE transaction, so each job is run by
+    exactly one worker even when workers in different processes poll the same database.
+    Payload, progress and result are stored as JSON. Jobs can keep checkpoints (key ->
+    JSON value) while they run, which survive a restart of the job and are deleted once
+    it completes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        """Get this thread's connection, creating the database on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                'id TEXT PRIMARY KEY, kind TEXT NOT NULL, user_id TEXT, status TEXT NOT NULL, '
+                'payload TEXT, progress TEXT, result TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0, '
+                'worker TEXT, created_at REAL NOT NULL, started_at REAL, finished_at REAL, updated_at REAL NOT NULL)'
+            )
+            # Columns added after the table was first created
+            columns = {row['name'] for row in conn.execute('PRAGMA table_info(jobs)')}
+            for column, definition in (('idempotency_key', 'TEXT'), ('heartbeat_at', 'REAL'), ('run_after', 'REAL')):
+                if column not in columns:
+                    conn.execute(f'ALTER TABLE jobs ADD COLUMN {column} {definition}')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status_created_at ON jobs(status, created_at)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_user_id ON jobs(user_id)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_idempotency_key ON jobs(idempotency_key)')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS job_checkpoints ('
+                'job_id TEXT NOT NULL, key TEXT NOT NULL, value TEXT, PRIMARY KEY (job_id, key))'
+            )
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _row_to_job(row):
+        if row is None:
+            return None
+        job = dict(row)
+        for field in ('payload', 'progress', 'result'):
+            job[field] = json.loads(job[field]) if job[field] else None
+        return job
+
+    def enqueue(self, kind, payload, user_id=None, job_id=None, idempotency_key=None):
+        """Add a job and return (job ID, whether a new job was queued).
+
+        With idempotency_key, a queued or running job with the same key is returned instead
+        of adding another one, and a failed one is queued again with the new payload, keeping
+        its checkpoints. Completed jobs are never reused.
+        """
+        job_id = job_id or str(uuid.uuid4())
+        now = time.time()
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if idempotency_key:
+                row = conn.execute(
+                    "SELECT id, status FROM jobs WHERE idempotency_key = ? AND status != 'completed' "
+                    "ORDER BY created_at DESC LIMIT 1",
+                    (idempotency_key,)
+                ).fetchone()
+                if row and row['status'] in ('queued', 'running'):
+                    conn.execute('COMMIT')
+                    return row['id'], False
+                if row:
+                    conn.execute(
+                        "UPDATE jobs SET status = 'queued', payload = ?, progress = ?, error = NULL, attempts = 0, "
+                        "worker = NULL, started_at = NULL, finished_at = NULL, heartbeat_at = NULL, run_after = NULL, updated_at = ? "
+                        "WHERE id = ?",
+                        (json.dumps(payload), json.dumps({}), now, row['id'])
+                    )
+                    conn.execute('COMMIT')
+                    return row['id'], True
+            conn.execute(
+                'INSERT INTO jobs (id, kind, user_id, status, payload, progress, idempotency_key, created_at, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (job_id, kind, user_id, 'queued', json.dumps(payload), json.dumps({}), idempotency_key, now, now)
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return job_id, True
+
+    def get(self, job_id):
+        """Return a job as a dict, or None"""
+        row = self._connection().execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return self._row_to_job(row)
+
+    def claim(self, worker):
+        """Mark the oldest queued job that is due as running by worker and return it, or None"""
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            now = time.time()
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' AND (run_after IS NULL OR run_after <= ?) "
+                "ORDER BY created_at LIMIT 1",
+                (now,)
+            ).fetchone()
+            if row is None:
+                conn.execute('COMMIT')
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, attempts = attempts + 1, "
+                "started_at = ?, heartbeat_at = ?, updated_at = ? WHERE id = ?",
+                (worker, now, now, now, row['id'])
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return self.get(row['id'])
+
+    def update_progress(self, job_id, progress):
+        """Replace a job's progress dict"""
+        self._connection().execute(
+            'UPDATE jobs SET progress = ?, updated_at = ? WHERE id = ?',
+            (json.dumps(progress), time.time(), job_id)
+        )
+
+    def defer(self, job_id, delay):
+        """Queue a running job again to be run after delay seconds.
+
+        The run doesn't count as an attempt, so jobs that wait a long time aren't failed
+        as interrupted too often.
+        """
+        now = time.time()
+        self._connection().execute(
+            "UPDATE jobs SET status = 'queued', worker = NULL, run_after = ?, attempts = MAX(attempts - 1, 0), "
+            "updated_at = ? WHERE id = ?",
+            (now + delay, now, job_id)
+        )
+
+    def heartbeat(self, job_ids):
+        """Record that the worker running these jobs is still alive"""
+        self._connection().executemany(
+            "UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND status = 'running'",
+            [(time.time(), job_id) for job_id in job_ids]
+        )
+
+    def requeue_stale(self, stale_seconds=JOB_STALE_SECONDS, max_attempts=JOB_MAX_ATTEMPTS):
+        """Queue running jobs whose worker stopped sending heartbeats again, or fail them
+        once they have been attempted max_attempts times. Returns the number of jobs requeued.
+        """
+        now = time.time()
+        cutoff = now - stale_seconds
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, finished_at = ?, updated_at = ? "
+                "WHERE status = 'running' AND heartbeat_at < ? AND attempts >= ?",
+                ('The job was interrupted too many times', now, now, cutoff, max_attempts)
+            )
+            requeued = conn.execute(
+                "UPDATE jobs SET status = 'queued', worker = NULL, updated_at = ? "
+                "WHERE status = 'running' AND heartbeat_at < ?",
+                (now, cutoff)
+            ).rowcount
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return requeued
+
+    def load_checkpoints(self, job_id):
+        """Return a job's checkpoints as a key -> value dict"""
+        rows = self._connection().execute('SELECT key, value FROM job_checkpoints WHERE job_id = ?', (job_id,)).fetchall()
+        return {row['key']: json.loads(row['value']) for row in rows}
+
+    def save_checkpoints(self, job_id, values):
+        """Store checkpoints from a key -> value dict, replacing existing keys"""
+        self._connection().executemany(
+            'INSERT OR REPLACE INTO job_checkpoints (job_id, key, value) VALUES (?, ?, ?)',
+            [(job_id, key, json.dumps(value)) for key, value in values.items()]
+        )
+
+    def delete_checkpoints(self, job_id, keys):
+        """Delete some of a job's checkpoints"""
+        self._connection().executemany(
+            'DELETE FROM job_checkpoints WHERE job_id = ? AND key = ?',
+            [(job_id, key) for key in keys]
+        )
+
+    def complete(self, job_id, result):
+        now = time.time()
+        conn = self._connection()
+        conn.execute(
+            "UPDATE jobs SET status = 'completed', result = ?, error = NULL, finished_at = ?, updated_at = ? WHERE id = ?",
+            (json.dumps(result), now, now, job_id)
+        )
+        conn.execute('DELETE FROM job_checkpoints WHERE job_id = ?', (job_id,))
+
+    def fail(self, job_id, error):
+        now = time.time()
+        self._connection().execute(
+            "UPDATE jobs SET status = 'failed', error = ?, finished_at = ?, updated_at = ? WHERE id = ?",
+            (error, now, now, job_id)
+        )
+
+    def prune(self, retention_seconds=JOB_RETENTION_SECONDS):
+        """Delete finished jobs older than retention_seconds, with their checkpoints"""
+        conn = self._connection()
+        conn.execute(
+            "DELETE FROM jobs WHERE status IN ('completed', 'failed') AND finished_at < ?",
+            (time.time() - retention_seconds,)
+        )
+        conn.execute('DELETE FROM job_checkpoints WHERE job_id NOT IN (SELECT id FROM jobs)')
+
+    def stats(self):
+        """Return the number of jobs per status"""
+        rows = self._connection().execute('SELECT status, COUNT(*) AS count FROM jobs GROUP BY status').fetchall()
+        counts = {status: 0 for status in JOB_STATUSES}
+        counts.update({row['status']: row['count'] for row in rows})
+        return counts
+
+job_queue = JobQueue(JOB_QUEUE_PATH)
+
+_handlers = {}
+_wakeup = threading.Event()
+_workers_lock = threading.Lock()
+_workers_pid = None
+_running = set()  # IDs of the jobs this process's workers are running
+_running_lock = threading.Lock()
+_event_stream_slots = threading.BoundedSemaphore(max(1, JOB_EVENTS_MAX_STREAMS))
+
+class _JobEventStream:
+    """A job's event stream that gives its slot back when the server closes the response"""
+
+    def __init__(self, events):
+        self._events = events
+        self._released = False
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._events)
+
+    def close(self):
+        self._events.close()
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        _event_stream_slots.release()
+
+class JobCheckpoint:
+    """Checkpoints of one job, for handlers to persist partial results as they go.
+
+    load() returns everything saved by earlier runs of the job, so a job that was
+    interrupted and queued again can skip work it already did.
+    """
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+
+    def load(self):
+        try:
+            return job_queue.load_checkpoints(self.job_id)
+        except sqlite3.Error as e:
+            logger.warning(f"Could not load checkpoints of job {self.job_id}: {str(e)}")
+            return {}
+
+    def save(self, values):
+        if not values:
+            return
+        try:
+            job_queue.save_checkpoints(self.job_id, values)
+        except sqlite3.Error as e:
+            logger.warning(f"Could not save checkpoints of job {self.job_id}: {str(e)}")
+
+    def discard(self, *keys):
+        try:
+            job_queue.delete_checkpoints(self.job_id, keys)
+        except sqlite3.Error as e:
+            logger.warning(f"Could not discard checkpoints of job {self.job_id}: {str(e)}")
+
+def register_job_handler(kind, handler):
+    """Register the function that runs jobs of a kind.
+
+    The handler is called as handler(job, report_progress) and returns a JSON-serializable
+    result; report_progress(dict) replaces the job's stored progress. Raise JobError for
+    failures whose message should be shown to the user, and JobDeferred to be run again
+    later. A job can be run again after its worker died or it was deferred, so handlers
+    should use JobCheckpoint(job['id']) to keep expensive work.
+    """
+    _handlers[kind] = handler
+
+def job_idempotency_key(kind, user_id, settings, filepaths=()):
+    """Key identifying a submission by its user, settings and file contents, for enqueue_job.
+
+    Settings must be JSON-serializable. Files are hashed in chunks, so large uploads aren't
+    read into memory; their names are left out, so a renamed copy is still a duplicate.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([kind, user_id, settings], sort_keys=True, default=str).encode('utf-8'))
+    for filepath in filepaths:
+        file_digest = hashlib.sha256()
+        with open(filepath, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                file_digest.update(chunk)
+        digest.update(file_digest.digest())
+    return f"{kind}:{digest.hexdigest()}"
+
+def enqueue_job(kind, payload, user_id=None, job_id=None, idempotency_key=None):
+    """Queue a job, making sure this process has workers to run it.
+
+    Returns (job ID, whether a new job was queued); see JobQueue.enqueue for idempotency_key.
+    """
+    job_id, created = job_queue.enqueue(kind, payload, user_id=user_id, job_id=job_id, idempotency_key=idempotency_key)
+    if created:
+        logger.info(f"Queued {kind} job {job_id}")
+    else:
+        logger.info(f"Reusing {kind} job {job_id} with the same idempotency key")
+    start_job_workers()
+    _wakeup.set()
+    return job_id, created
+
+def get_job(job_id):
+    """Return a job as a dict, or None"""
+    return job_queue.get(job_id)
+
+def format_sse_event(event, data, event_id=None):
+    """Format a server-sent event with compact JSON data"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return '\n'.join(lines) + '\n\n'
+
+def iter_job_events(job_id, last_event_id=None, poll_interval=None, heartbeat_seconds=None, max_seconds=None):
+    """Yield a job's progress as server-sent events until it finishes.
+    
+    A 'progress' event is sent whenever the job's progress changes, followed by a single
+    'completed' or 'failed' event when it finishes (a 'failed' event is also sent if the job
+    disappears). Event IDs are the job's update time, so a client reconnecting with
+    Last-Event-ID doesn't get the progress it already has again. Idle streams get a
+    heartbeat comment, and the stream ends after max_seconds for the client to reconnect.
+    """
+    poll_interval = JOB_EVENTS_POLL_INTERVAL if poll_interval is None else poll_interval
+    heartbeat_seconds = JOB_EVENTS_HEARTBEAT_SECONDS if heartbeat_seconds is None else heartbeat_seconds
+    max_seconds = JOB_EVENTS_MAX_SECONDS if max_seconds is None else max_seconds
+    
+    started = time.time()
+    last_sent = started
+    last_update = str(last_event_id) if last_event_id else None
+    yield f"retry: {JOB_EVENTS_RETRY_MS}\n\n"
+    
+    while True:
+        try:
+            job = job_queue.get(job_id)
+        except sqlite3.Error as e:
+            logger.warning(f"Could not read job {job_id} for its event stream: {str(e)}")
+            job = False
+        
+        if job is None:
+            yield format_sse_event('failed', {'status': 'failed', 'error': 'Job not found'})
+            return
+        
+        if job:
+            update = repr(job['updated_at'])
+            data = {'status': job['status'], 'progress': job['progress'] or {}}
+            # Finished jobs are always reported, even to a client that saw their last update
+            if job['status'] == 'completed':
+                yield format_sse_event('completed', dict(data, result=job['result']), update)
+                return
+            if job['status'] == 'failed':
+                yield format_sse_event('failed', dict(data, error=job['error']), update)
+                return
+            if update != last_update:
+                last_update = update
+                last_sent = time.time()
+                yield format_sse_event('progress', data, update)
+        
+        if time.time() - last_sent >= heartbeat_seconds:
+            last_sent = time.time()
+            yield ': heartbeat\n\n'
+        
+        if time.time() - started >= max_seconds:
+            return
+        time.sleep(poll_interval)
+
+def open_job_event_stream(job_id, last_event_id=None):
+    """Return iter_job_events for a job, or None if this process is already serving
+    JOB_EVENTS_MAX_STREAMS streams.
+
+    The returned iterable holds a stream slot until it is closed, which WSGI servers do
+    when the response ends or the client goes away.
+    """
+    if not _event_stream_slots.acquire(blocking=False):
+        return None
+    return _JobEventStream(iter_job_events(job_id, last_event_id=last_event_id))
+
+def run_job(job):
+    """Run a claimed job with its handler and store the result or error"""
+    handler = _handlers.get(job['kind'])
+    if handler is None:
+        job_queue.fail(job['id'], f"No handler for job kind {job['kind']}")
+        logger.error(f"No handler registered for {job['kind']} job {job['id']}")
+        return
+
+    def report_progress(progress):
+        try:
+            job_queue.update_progress(job['id'], progress)
+        except sqlite3.Error as e:
+            logger.warning(f"Could not store progress of job {job['id']}: {str(e)}")
+
+    started = time.time()
+    try:
+        result = handler(job, report_progress)
+        job_queue.complete(job['id'], result)
+        logger.info(f"Completed {job['kind']} job {job['id']} in {time.time() - started:.1f}s")
+    except JobDeferred as e:
+        job_queue.defer(job['id'], e.delay)
+        logger.info(f"{job['kind']} job {job['id']} deferred: {str(e)}")
+    except JobError as e:
+        job_queue.fail(job['id'], str(e))
+        logger.warning(f"{job['kind']} job {job['id']} failed: {str(e)}")
+    except Exception as e:
+        job_queue.fail(job['id'], f"Unexpected error: {str(e)}")
+        logger.exception(f"{job['kind']} job {job['id']} failed after {time.time() - started:.1f}s")
+
+def _worker_loop(worker):
+    last_prune = 0
+    while True:
+        try:
+            job = job_queue.claim(worker)
+        except sqlite3.Error as e:
+            logger.error(f"Job worker {worker} could not claim a job: {str(e)}")
+            job = None
+
+        if job is None:
+            if time.time() - last_prune > 3600:
+                last_prune = time.time()
+                try:
+                    job_queue.prune()
+                except sqlite3.Error as e:
+                    logger.warning(f"Could not prune finished jobs: {str(e)}")
+            _wakeup.wait(JOB_POLL_INTERVAL)
+            _wakeup.clear()
+            continue
+
+        with _running_lock:
+            _running.add(job['id'])
+        try:
+            run_job(job)
+        finally:
+            with _running_lock:
+                _running.discard(job['id'])
+
+def _heartbeat_loop():
+    """Keep this process's running jobs alive and requeue jobs whose worker died"""
+    while True:
+        time.sleep(JOB_HEARTBEAT_SECONDS)
+        with _running_lock:
+            running = list(_running)
+        try:
+            if running:
+                job_queue.heartbeat(running)
+            requeued = job_queue.requeue_stale()
+            if requeued:
+                logger.warning(f"Queued {requeued} interrupted job(s) again")
+                _wakeup.set()
+        except sqlite3.Error as e:
+            logger.warning(f"Job heartbeat failed: {str(e)}")
+
+def start_job_workers(threads=None):
+    """Start this process's worker threads if they aren't running yet.
+
+    Safe to call on every request: threads are started once per process, and again in a
+    process forked after they were started (e.g. gunicorn workers with preload_app).
+    """
+    global _workers_pid
+    threads = JOB_WORKER_THREADS if threads is None else threads
+    if threads <= 0 or _workers_pid == os.getpid():
+        return
+
+    with _workers_lock:
+        if _workers_pid == os.getpid():
+            return
+        _workers_pid = os.getpid()
+        for number in range(threads):
+            worker = f"{socket.gethostname()}:{os.getpid()}:{number}"
+            threading.Thread(target=_worker_loop, args=(worker,), name=f'job-worker-{number}', daemon=True).start()
+        threading.Thread(target=_heartbeat_loop, name='job-heartbeat', daemon=True).start()
+        logger.info(f"Started {threads} job worker thread(s) in process {os.getpid()}")
+
+def get_job_queue_stats():
+    """Return job counts per status and this process's worker settings"""
+    return {
+        'path': JOB_QUEUE_PATH,
+        'worker_threads': JOB_WORKER_THREADS if _workers_pid == os.getpid() else 0,
+        'jobs': job_queue.stats()
+    }
+
+if __name__ == '__main__':
+    # Standalone worker process. Importing the app registers the job handlers on the
+    # `jobs` module, which is a different module object from this __main__ script.
+    import app  # noqa: F401
+    import jobs
+    jobs.start_job_workers(max(1, JOB_WORKER_THREADS))
+    while True:
+        time.sleep(60)
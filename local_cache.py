@@ -0,0 +1,288 @@
+# Local translation cache tiers in front of the Supabase translation_cache table
+
+import os
+import sys
+import time
+import sqlite3
+import tempfile
+import threading
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Per-worker in-memory tier
+TRANSLATION_CACHE_MEMORY_BYTES = int(os.environ.get('TRANSLATION_CACHE_MEMORY_BYTES', str(64 * 1024 * 1024)))
+TRANSLATION_CACHE_TTL = int(os.environ.get('TRANSLATION_CACHE_TTL', '86400'))
+
+# On-disk tier shared by all workers on the machine. Set TRANSLATION_CACHE_DISK_PATH to an
+# empty string to disable it.
+TRANSLATION_CACHE_DISK_PATH = os.environ.get(
+    'TRANSLATION_CACHE_DISK_PATH', os.path.join(tempfile.gettempdir(), 'translation_cache.sqlite3')
+)
+TRANSLATION_CACHE_DISK_MAX_ROWS = int(os.environ.get('TRANSLATION_CACHE_DISK_MAX_ROWS', '200000'))
+
+class TranslationLRU:
+    """Thread-safe LRU cache bounded by the memory used by its keys and values"""
+
+    def __init__(self, max_bytes=TRANSLATION_CACHE_MEMORY_BYTES, ttl=TRANSLATION_CACHE_TTL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._entries = OrderedDict()  # key -> (value, expires_at, size)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value for key, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, expires_at, size = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                self.current_bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        """Store a value, evicting least recently used entries to stay within max_bytes"""
+        size = sys.getsizeof(key) + sys.getsizeof(value)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            old_entry = self._entries.pop(key, None)
+            if old_entry:
+                self.current_bytes -= old_entry[2]
+
+            self._entries[key] = (value, time.time() + self.ttl, size)
+            self.current_bytes += size
+
+            while self.current_bytes > self.max_bytes:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+
+    def invalidate(self, keys):
+        """Remove the entries for keys, e.g. after their translation was edited or deleted"""
+        with self._lock:
+            for key in keys:
+                entry = self._entries.pop(key, None)
+                if entry:
+                    self.current_bytes -= entry[2]
+
+    def clear(self):
+        """Remove all entries"""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        """Return size and hit/miss/eviction counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+
+class DiskTranslationCache:
+    """SQLite key/value store with TTL that can be shared by several processes"""
+
+    PRUNE_EVERY_WRITES = 1000
+
+    def __init__(self, path, ttl=TRANSLATION_CACHE_TTL, max_rows=TRANSLATION_CACHE_DISK_MAX_ROWS):
+        self.path = path
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._writes = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        """Get this thread's connection, creating the database on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS translations '
+                '(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_translations_expires_at ON translations(expires_at)')
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, keys):
+        """Return a dict of the unexpired values found for keys"""
+        if not keys:
+            return {}
+
+        found = {}
+        try:
+            conn = self._connection()
+            now = time.time()
+            keys = list(keys)
+            # Stay below SQLite's host parameter limit
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                rows = conn.execute(
+                    f'SELECT key, value FROM translations WHERE expires_at > ? AND key IN ({placeholders})',
+                    [now] + chunk
+                ).fetchall()
+                found.update(rows)
+        except sqlite3.Error as e:
+            logger.warning(f"Error reading local translation cache: {str(e)}")
+            with self._lock:
+                self.errors += 1
+            return {}
+
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def set_many(self, items):
+        """Store a dict of key -> value"""
+        if not items:
+            return
+
+        try:
+            conn = self._connection()
+            expires_at = time.time() + self.ttl
+            with conn:
+                conn.executemany(
+                    'INSERT OR REPLACE INTO translations (key, value, expires_at) VALUES (?, ?, ?)',
+                    [(key, value, expires_at) for key, value in items.items()]
+                )
+
+            with self._lock:
+                self._writes += len(items)
+                prune = self._writes >= self.PRUNE_EVERY_WRITES
+                if prune:
+                    self._writes = 0
+            if prune:
+                self.prune()
+        except sqlite3.Error as e:
+            logger.warning(f"Error writing local translation cache: {str(e)}")
+            with self._lock:
+                self.errors += 1
+
+    def invalidate(self, keys):
+        """Delete the rows for keys, so no worker promotes them to its memory tier again"""
+        keys = list(keys)
+        if not keys:
+            return
+
+        try:
+            conn = self._connection()
+            with conn:
+                for start in range(0, len(keys), 500):
+                    chunk = keys[start:start + 500]
+                    conn.execute(f"DELETE FROM translations WHERE key IN ({','.join('?' * len(chunk))})", chunk)
+        except sqlite3.Error as e:
+            logger.warning(f"Error invalidating local translation cache: {str(e)}")
+            with self._lock:
+                self.errors += 1
+
+    def prune(self):
+        """Delete expired rows and the oldest rows above max_rows"""
+        conn = self._connection()
+        with conn:
+            conn.execute('DELETE FROM translations WHERE expires_at <= ?', (time.time(),))
+            conn.execute(
+                'DELETE FROM translations WHERE key IN '
+                '(SELECT key FROM translations ORDER BY expires_at DESC LIMIT -1 OFFSET ?)',
+                (self.max_rows,)
+            )
+
+    def stats(self):
+        """Return hit/miss/error counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'path': self.path,
+                'ttl': self.ttl,
+                'max_rows': self.max_rows,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'errors': self.errors
+            }
+
+memory_cache = TranslationLRU()
+disk_cache = DiskTranslationCache(TRANSLATION_CACHE_DISK_PATH) if TRANSLATION_CACHE_DISK_PATH else None
+
+def get_cached_translations(keys):
+    """Look up cache keys in the memory tier, then the disk tier.
+
+    Returns a dict of key -> translation for the keys found. Disk hits are promoted
+    to the memory tier.
+    """
+    found = {}
+    missing = []
+    for key in keys:
+        value = memory_cache.get(key)
+        if value is not None:
+            found[key] = value
+        else:
+            missing.append(key)
+
+    if missing and disk_cache:
+        disk_found = disk_cache.get_many(missing)
+        for key, value in disk_found.items():
+            memory_cache.set(key, value)
+        found.update(disk_found)
+
+    return found
+
+def store_translations(items):
+    """Write a dict of cache key -> translation through to both local tiers"""
+    items = {key: value for key, value in items.items() if key and value}
+    for key, value in items.items():
+        memory_cache.set(key, value)
+    if disk_cache:
+        disk_cache.set_many(items)
+
+def invalidate_translations(keys):
+    """Remove cache keys from both local tiers.
+
+    The memory tier of other worker processes isn't reached, but without the disk rows
+    they only keep a stale translation until its TTL and can't share it again.
+    """
+    keys = [key for key in keys if key]
+    memory_cache.invalidate(keys)
+    if disk_cache:
+        disk_cache.invalidate(keys)
+
+def get_local_cache_stats():
+    """Return statistics for the local cache tiers"""
+    return {
+        'memory': memory_cache.stats(),
+        'disk': disk_cache.stats() if disk_cache else None
+    }
@@ -0,0 +1,649 @@
+# Translation review with streaming chat completions, using the settings of an OpenAI assistant
+
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+import logging
+from contextlib import nullcontext
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import openai
+from openai import OpenAI
+
+logger = logging.getLogger(__name__)
+
+# How long an assistant's instructions and model are cached before being fetched again
+REVIEW_ASSISTANT_CACHE_SECONDS = int(os.environ.get('REVIEW_ASSISTANT_CACHE_SECONDS', '3600'))
+# Base URL of the OpenAI API, e.g. to use a local stand-in for the API in tests
+OPENAI_BASE_URL = os.environ.get('OPENAI_BASE_URL') or None
+# Model used when the assistant doesn't name one
+DEFAULT_REVIEW_MODEL = os.environ.get('DEFAULT_REVIEW_MODEL', 'gpt-4o')
+# Texts longer than this are split into chunks at paragraph or sentence boundaries that are
+# reviewed concurrently, so long chapters are reviewed in full and replies stay well within
+# the model's output limit
+REVIEW_CHUNK_CHARS = int(os.environ.get('REVIEW_CHUNK_CHARS', '12000'))
+# Characters of the preceding text sent along with a chunk as context, but not reviewed
+REVIEW_CHUNK_CONTEXT_CHARS = int(os.environ.get('REVIEW_CHUNK_CONTEXT_CHARS', '1000'))
+MAX_INSTRUCTIONS_CHARS = 5000
+
+DEFAULT_REVIEW_INSTRUCTIONS = """Granska och förbättra denna svenska översättning.
+                Texten ska vara tydlig, naturlig och bevara den ursprungliga betydelsen.
+                Om du inte kan förbättra texten, returnera den som den är."""
+
+# Replies starting with this mean the model found the text too confused to review
+TRANSLATION_ERROR_PREFIX = 'TRANSLATION_ERROR:'
+
+# OpenAI rate limits assumed for users who haven't entered their own (tier 1 limits for gpt-4o)
+REVIEW_DEFAULT_RPM = int(os.environ.get('REVIEW_DEFAULT_RPM', '500'))
+REVIEW_DEFAULT_TPM = int(os.environ.get('REVIEW_DEFAULT_TPM', '30000'))
+# Requests review_pages has in flight at the same time, counting the chunks of long pages,
+# and chunks of one long text review_text reviews at the same time
+REVIEW_MAX_CONCURRENCY = int(os.environ.get('REVIEW_MAX_CONCURRENCY', '4'))
+# Wait after a rate limit error that doesn't say how long to wait, doubled on each retry
+REVIEW_RATE_LIMIT_BACKOFF = 2.0
+
+# Batch API reviews: completion window, and the states in which a batch will not change anymore
+BATCH_REVIEW_COMPLETION_WINDOW = '24h'
+BATCH_FINAL_STATUSES = ('completed', 'failed', 'expired', 'cancelled')
+
+# custom_id of the request for one chunk of a long text in a Batch API review, ending in
+# how the chunk joins the one before it: at a paragraph break, a space or within a word
+_BATCH_CHUNK_ID_RE = re.compile(r'^(.*)#(\d+)/(\d+)([psw])$')
+_BATCH_CHUNK_JOINS = {'p': '\n\n', 's': ' ', 'w': ''}
+
+_clients = {}  # key fingerprint -> OpenAI client
+_assistants = {}  # (key fingerprint, assistant_id) -> {'settings': dict, 'loaded_at': float}
+_rate_limiters = {}  # key fingerprint -> RateLimiter
+_lock = threading.Lock()
+_stats = {'reviews': 0, 'failed': 0, 'assistant_hits': 0, 'assistant_loads': 0, 'retries': 0, 'rate_limited': 0,
+          'chunked_reviews': 0, 'chunks': 0}
+
+class ReviewError(Exception):
+    """Raised when a text could not be reviewed; the caller keeps the original text"""
+
+class RateLimiter:
+    """Token buckets for an OpenAI requests-per-minute and tokens-per-minute budget.
+
+    Both buckets start full and refill continuously. acquire() blocks until a request and
+    its estimated tokens fit the budget; settle() corrects the estimate with the usage
+    OpenAI reported; pause() stops all requests for a while after a rate limit error.
+    """
+
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self._lock = threading.Lock()
+        self.set_limits(requests_per_minute, tokens_per_minute)
+        self.requests = float(self.requests_per_minute)
+        self.tokens = float(self.tokens_per_minute)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def set_limits(self, requests_per_minute, tokens_per_minute):
+        with self._lock:
+            self.requests_per_minute = max(1, int(requests_per_minute))
+            self.tokens_per_minute = max(1, int(tokens_per_minute))
+
+    def _refill(self, now):
+        elapsed = now - self.updated
+        self.updated = now
+        self.requests = min(self.requests_per_minute, self.requests + elapsed * self.requests_per_minute / 60)
+        self.tokens = min(self.tokens_per_minute, self.tokens + elapsed * self.tokens_per_minute / 60)
+
+    def acquire(self, tokens):
+        """Wait until a request using about this many tokens may be sent, and return the
+        number of tokens taken from the budget (capped at the per-minute budget)"""
+        tokens = min(max(1, int(tokens)), self.tokens_per_minute)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                elif self.requests >= 1 and self.tokens >= tokens:
+                    self.requests -= 1
+                    self.tokens -= tokens
+                    return tokens
+                else:
+                    wait = max((1 - self.requests) * 60 / self.requests_per_minute,
+                               (tokens - self.tokens) * 60 / self.tokens_per_minute)
+            time.sleep(min(max(wait, 0.01), 5))
+
+    def settle(self, estimated_tokens, used_tokens):
+        """Return over-estimated tokens to the budget, or take under-estimated ones"""
+        with self._lock:
+            self.tokens = min(self.tokens_per_minute, self.tokens + estimated_tokens - used_tokens)
+
+    def pause(self, seconds):
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+def get_rate_limiter(openai_api_key, requests_per_minute=None, tokens_per_minute=None):
+    """Get the rate limiter shared by all reviews using an API key, applying the given budget"""
+    requests_per_minute = requests_per_minute or REVIEW_DEFAULT_RPM
+    tokens_per_minute = tokens_per_minute or REVIEW_DEFAULT_TPM
+    fingerprint = _key_fingerprint(openai_api_key)
+    with _lock:
+        limiter = _rate_limiters.get(fingerprint)
+        if limiter is None:
+            limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+            _rate_limiters[fingerprint] = limiter
+            return limiter
+    limiter.set_limits(requests_per_minute, tokens_per_minute)
+    return limiter
+
+def estimate_tokens(text):
+    """Rough token count of a text, about four characters per token"""
+    return len(text or '') // 4 + 1
+
+def _retry_after_seconds(error):
+    """Seconds to wait according to the headers of a rate limit error, or None"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000
+        retry_after = headers.get('retry-after')
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except (TypeError, ValueError):
+        pass
+    return None
+
+def _key_fingerprint(openai_api_key):
+    """Identify an API key without keeping the key itself in the cache"""
+    return hashlib.sha256(openai_api_key.encode('utf-8')).hexdigest()[:16]
+
+def get_openai_client(openai_api_key):
+    """Get a shared OpenAI client for an API key, so HTTP connections are reused.
+
+    Retries are left to review_text, which knows whether any output was streamed yet.
+    """
+    fingerprint = _key_fingerprint(openai_api_key)
+    with _lock:
+        client = _clients.get(fingerprint)
+        if client is None:
+            client = OpenAI(api_key=openai_api_key, base_url=OPENAI_BASE_URL, max_retries=0)
+            _clients[fingerprint] = client
+        return client
+
+def get_review_assistant(openai_api_key, assistant_id):
+    """Return the instructions, model and sampling settings of an OpenAI assistant.
+
+    Settings are cached for REVIEW_ASSISTANT_CACHE_SECONDS, so reviews don't retrieve the
+    assistant every time. Raises ReviewError if the assistant can't be retrieved.
+    """
+    cache_key = (_key_fingerprint(openai_api_key), assistant_id)
+    with _lock:
+        cached = _assistants.get(cache_key)
+        if cached and time.time() - cached['loaded_at'] < REVIEW_ASSISTANT_CACHE_SECONDS:
+            _stats['assistant_hits'] += 1
+            return cached['settings']
+
+    try:
+        assistant = get_openai_client(openai_api_key).beta.assistants.retrieve(assistant_id)
+    except Exception as e:
+        raise ReviewError(f"Could not retrieve assistant with ID {assistant_id}: {str(e)}")
+
+    settings = {
+        'name': assistant.name,
+        'instructions': assistant.instructions or '',
+        'model': assistant.model or DEFAULT_REVIEW_MODEL,
+        'temperature': getattr(assistant, 'temperature', None),
+        'top_p': getattr(assistant, 'top_p', None)
+    }
+    with _lock:
+        _assistants[cache_key] = {'settings': settings, 'loaded_at': time.time()}
+        _stats['assistant_loads'] += 1
+    logger.info(f"Loaded review assistant: {settings['name']} (model: {settings['model']})")
+    return settings
+
+def forget_review_assistant(assistant_id):
+    """Drop cached settings of an assistant, e.g. after it was updated or deleted"""
+    with _lock:
+        for cache_key in [key for key in _assistants if key[1] == assistant_id]:
+            del _assistants[cache_key]
+
+def build_review_messages(text, assistant_settings, instructions=None, context=None):
+    """Build the chat messages for reviewing a text.
+
+    The assistant's stored instructions become the system message; custom instructions
+    (or the default review instructions) go in front of the text, as they did in the
+    message sent to an Assistants thread. context is text preceding a chunk of a longer
+    text, which is shown to the model but not to be reviewed or returned.
+    """
+    instructions = instructions or DEFAULT_REVIEW_INSTRUCTIONS
+    if len(instructions) > MAX_INSTRUCTIONS_CHARS:
+        logger.warning(f"Instructions too long ({len(instructions)} chars). Truncating.")
+        instructions = instructions[:MAX_INSTRUCTIONS_CHARS]
+
+    messages = []
+    if assistant_settings.get('instructions'):
+        messages.append({'role': 'system', 'content': assistant_settings['instructions']})
+    if context:
+        instructions = f"""{instructions}
+
+                The text continues from the passage below. It is only given for context: do not
+                review it or include it in your answer.
+
+                ---
+
+                {context}"""
+    messages.append({'role': 'user', 'content': f"""{instructions}
+
+                ---
+
+                {text}
+
+                ---
+
+                If the text seems confused or unclear, return an error message starting with '{TRANSLATION_ERROR_PREFIX}'.
+                """})
+    return messages
+
+def _completion_options(settings, messages):
+    options = {'model': settings['model'], 'messages': messages}
+    if settings.get('temperature') is not None:
+        options['temperature'] = settings['temperature']
+    if settings.get('top_p') is not None:
+        options['top_p'] = settings['top_p']
+    return options
+
+def stream_review(text, openai_api_key, assistant_id, instructions=None, timeout=300, usage=None, messages=None):
+    """Review a text with one streaming chat completion, yielding text deltas as they arrive.
+
+    If usage is a dict, the token usage OpenAI reports at the end of the stream is stored
+    in it. messages can be given if they were already built with build_review_messages.
+
+    Raises ReviewError if the assistant can't be retrieved, and the OpenAI client's
+    exceptions for API errors.
+    """
+    settings = get_review_assistant(openai_api_key, assistant_id)
+    options = _completion_options(settings, messages or build_review_messages(text, settings, instructions))
+    options.update(stream=True, stream_options={'include_usage': True}, timeout=timeout)
+
+    stream = get_openai_client(openai_api_key).chat.completions.create(**options)
+    try:
+        for chunk in stream:
+            if usage is not None and getattr(chunk, 'usage', None):
+                usage['total_tokens'] = chunk.usage.total_tokens
+            if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    finally:
+        close = getattr(stream, 'close', None)
+        if close:
+            close()
+
+def review_text(text, openai_api_key, assistant_id, instructions=None, max_retries=3, timeout=300, on_token=None, rate_limiter=None, slots=None):
+    """Review a text and return the reviewed version.
+
+    on_token, if given, is called with each piece of text as it is generated. Transient
+    errors (rate limits, timeouts, connection errors) are retried with backoff as long as
+    nothing has been streamed yet. Rate limit errors wait as long as OpenAI's retry-after
+    headers say. With a rate_limiter (see get_rate_limiter), each attempt first waits for
+    room in the budget, and a rate limit error pauses every review sharing the limiter.
+
+    Texts longer than REVIEW_CHUNK_CHARS are split with split_review_chunks and the chunks
+    reviewed concurrently, each with the end of the text before it as context; the reviewed
+    chunks are joined with the original whitespace between them. The first chunk streams
+    to on_token as it is generated, the others follow in order as they finish. slots, if
+    given, is a semaphore shared with other reviews that each request holds while it runs,
+    so reviews of many long texts together stay within its bound.
+
+    Raises ReviewError if the text (or any of its chunks) could not be reviewed, or if the
+    model reported it as too confused to review.
+    """
+    chunks, separators = _chunks_and_separators(split_review_chunks(text))
+    if len(chunks) <= 1:
+        response = _review_chunk(text, openai_api_key, assistant_id, instructions, max_retries, timeout, on_token,
+                                 rate_limiter, slots=slots)
+        with _lock:
+            _stats['reviews'] += 1
+        return response
+
+    started = time.time()
+    contexts = [None] + [_chunk_context(chunk) for chunk in chunks[:-1]]
+    max_workers = max(1, min(REVIEW_MAX_CONCURRENCY - 1, len(chunks) - 1))
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='review-chunk') as executor:
+        # The first chunk is reviewed in the calling thread, so on_token is only called there
+        futures = [
+            executor.submit(_review_chunk, chunk, openai_api_key, assistant_id, instructions,
+                            max_retries, timeout, None, rate_limiter, context, slots)
+            for chunk, context in zip(chunks[1:], contexts[1:])
+        ]
+        try:
+            reviewed_chunks = [_review_chunk(chunks[0], openai_api_key, assistant_id, instructions,
+                                             max_retries, timeout, on_token, rate_limiter, slots=slots)]
+            for future, context in zip(futures, contexts[1:]):
+                reviewed_chunks.append(_strip_echoed_context(future.result(), context))
+                if on_token:
+                    on_token(separators[len(reviewed_chunks) - 1] + reviewed_chunks[-1])
+        except ReviewError as e:
+            for future in futures:
+                future.cancel()
+            raise ReviewError(f"Review of a chunk of a {len(text)} character text failed: {str(e)}")
+
+    with _lock:
+        _stats['reviews'] += 1
+        _stats['chunked_reviews'] += 1
+        _stats['chunks'] += len(chunks)
+    logger.info(f"Reviewed {len(text)} characters in {len(chunks)} chunks in {time.time() - started:.1f}s")
+    return ''.join(separator + reviewed for separator, reviewed in zip(separators, reviewed_chunks)).strip()
+
+def split_review_chunks(text, max_chars=None):
+    """Split a text into chunks of at most max_chars (default: REVIEW_CHUNK_CHARS) for review.
+
+    Returns a list of (is_chunk, text) pieces whose concatenation is exactly the input, like
+    utils.segment_text. Chunks end at paragraph breaks where possible, else at sentence ends,
+    and a sentence longer than max_chars on its own is split between words. The whitespace
+    between two chunks is a piece of its own, so reviewed chunks can be joined with it.
+    """
+    max_chars = max(1, int(max_chars or REVIEW_CHUNK_CHARS))
+    if len(text) <= max_chars:
+        return [(True, text)]
+
+    pieces = []
+    current = []
+    current_length = 0
+    pending_space = ''
+    for piece in _review_units(text, max_chars):
+        if not piece.strip():
+            if current:
+                pending_space += piece
+            else:
+                pieces.append((False, piece))
+            continue
+        if current and current_length + len(pending_space) + len(piece) > max_chars:
+            pieces.append((True, ''.join(current)))
+            if pending_space:
+                pieces.append((False, pending_space))
+            current = [piece]
+            current_length = len(piece)
+        else:
+            current += [pending_space, piece]
+            current_length += len(pending_space) + len(piece)
+        pending_space = ''
+    if current:
+        pieces.append((True, ''.join(current)))
+    if pending_space:
+        pieces.append((False, pending_space))
+    return pieces
+
+def _review_units(text, max_chars, level='paragraph'):
+    """Yield the paragraphs of a text and the whitespace between them, breaking paragraphs
+    longer than max_chars into sentences, and sentences that are still too long into words"""
+    from utils import segment_text
+
+    for _, piece in segment_text(text, level):
+        if len(piece) <= max_chars or not piece.strip():
+            yield piece
+        elif level == 'paragraph':
+            yield from _review_units(piece, max_chars, 'sentence')
+        else:
+            for word in re.split(r'(\s+)', piece):
+                for start in range(0, len(word), max_chars):
+                    yield word[start:start + max_chars]
+
+def _chunk_context(chunk):
+    """The end of a chunk, from the start of a word, as context for the chunk after it"""
+    if len(chunk) <= REVIEW_CHUNK_CONTEXT_CHARS:
+        return chunk.strip()
+    context = chunk[-REVIEW_CHUNK_CONTEXT_CHARS:]
+    first_space = re.search(r'\s', context)
+    return (context[first_space.start():] if first_space else context).strip()
+
+def _strip_echoed_context(reviewed, context):
+    """Drop the context from the start of a reviewed chunk, if the model repeated it"""
+    if context and reviewed.startswith(context):
+        return reviewed[len(context):].lstrip()
+    return reviewed
+
+def _chunks_and_separators(pieces):
+    """Return the chunks of split_review_chunks pieces and the whitespace before each chunk"""
+    chunks = []
+    separators = []
+    space = ''
+    for is_chunk, piece in pieces:
+        if is_chunk:
+            chunks.append(piece)
+            separators.append(space)
+            space = ''
+        else:
+            space += piece
+    return chunks, separators
+
+def _review_chunk(text, openai_api_key, assistant_id, instructions=None, max_retries=3, timeout=300, on_token=None, rate_limiter=None, context=None, slots=None):
+    """Review a text with one chat completion; see review_text"""
+    messages = None
+    estimated_tokens = 0
+    if rate_limiter or context:
+        settings = get_review_assistant(openai_api_key, assistant_id)
+        messages = build_review_messages(text, settings, instructions, context=context)
+        # The prompt plus a reply about as long as the text
+        estimated_tokens = sum(estimate_tokens(message['content']) for message in messages) + estimate_tokens(text)
+
+    started = time.time()
+    attempt = 0
+    while True:
+        parts = []
+        usage = {}
+        reserved = 0
+        try:
+            # Slots are only held during a request, not while waiting to retry one
+            with slots or nullcontext():
+                reserved = rate_limiter.acquire(estimated_tokens) if rate_limiter else 0
+                for part in stream_review(text, openai_api_key, assistant_id, instructions, timeout=timeout, usage=usage, messages=messages):
+                    parts.append(part)
+                    if on_token:
+                        on_token(part)
+            break
+        except ReviewError:
+            with _lock:
+                _stats['failed'] += 1
+            raise
+        except openai.AuthenticationError as auth_err:
+            with _lock:
+                _stats['failed'] += 1
+            raise ReviewError(f"OpenAI API authentication error: {auth_err}")
+        except (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError) as transient_err:
+            attempt += 1
+            if parts or attempt >= max_retries or time.time() - started > timeout:
+                with _lock:
+                    _stats['failed'] += 1
+                raise ReviewError(f"Review failed after {attempt} attempt(s): {transient_err}")
+            if isinstance(transient_err, openai.RateLimitError):
+                wait_time = _retry_after_seconds(transient_err)
+                if wait_time is None:
+                    wait_time = min(REVIEW_RATE_LIMIT_BACKOFF * 2 ** (attempt - 1), 60)
+                with _lock:
+                    _stats['rate_limited'] += 1
+            elif isinstance(transient_err, openai.APITimeoutError):
+                wait_time = min(10 * attempt, 60)
+            else:
+                wait_time = min(5 * attempt, 30)
+            with _lock:
+                _stats['retries'] += 1
+            logger.warning(f"OpenAI review error (attempt {attempt}/{max_retries}): {transient_err}. Retrying in {wait_time:.1f}s...")
+            if rate_limiter and isinstance(transient_err, openai.RateLimitError):
+                rate_limiter.pause(wait_time)
+            else:
+                time.sleep(wait_time)
+        except Exception as e:
+            with _lock:
+                _stats['failed'] += 1
+            raise ReviewError(f"Unexpected review error: {str(e)}")
+        finally:
+            if rate_limiter and usage.get('total_tokens'):
+                rate_limiter.settle(reserved, usage['total_tokens'])
+
+    response = ''.join(parts).strip()
+    if not response:
+        raise ReviewError('Review returned empty text')
+    if response.startswith(TRANSLATION_ERROR_PREFIX):
+        raise ReviewError(f"Assistant reported translation error: {response}")
+
+    logger.info(f"Reviewed {len(text)} characters in {time.time() - started:.1f}s")
+    return response
+
+def review_pages(pages, openai_api_key, assistant_id, instructions=None, requests_per_minute=None, tokens_per_minute=None, max_workers=None, max_retries=6):
+    """Review many texts concurrently within an OpenAI rate limit budget.
+
+    pages is a list of (key, text) pairs. Yields (key, reviewed_text, error) as each review
+    finishes, in the calling thread; reviewed_text is None and error a message if a text
+    could not be reviewed. Reviews share the API key's RateLimiter, so the budget also
+    holds across documents reviewed at the same time in this process. Long texts are
+    reviewed in chunks (see review_text), and at most max_workers requests are in flight
+    at a time across all pages and their chunks.
+    """
+    if not pages:
+        return
+    limiter = get_rate_limiter(openai_api_key, requests_per_minute, tokens_per_minute)
+    max_workers = max(1, int(max_workers or REVIEW_MAX_CONCURRENCY))
+    slots = threading.BoundedSemaphore(max_workers)
+
+    def review(page):
+        key, text = page
+        try:
+            return key, review_text(text, openai_api_key, assistant_id, instructions=instructions,
+                                    max_retries=max_retries, rate_limiter=limiter, slots=slots), None
+        except ReviewError as e:
+            return key, None, str(e)
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(pages)), thread_name_prefix='review') as executor:
+        for future in as_completed([executor.submit(review, page) for page in pages]):
+            yield future.result()
+
+def build_batch_review_file(pages, settings, instructions=None):
+    """Build the JSONL input file of a Batch API review, one chat completion per page.
+
+    pages is a list of (key, text) pairs; keys become the requests' custom_id and must be
+    unique strings. Texts longer than REVIEW_CHUNK_CHARS are sent as one request per chunk
+    (see split_review_chunks), with custom_id '<key>#<index>/<count><join>'; their results
+    are joined again by iter_batch_review_results. Returns the file content as bytes.
+    """
+    lines = []
+    for custom_id, chunk, context in _batch_review_requests(pages):
+        lines.append(json.dumps({
+            'custom_id': custom_id,
+            'method': 'POST',
+            'url': '/v1/chat/completions',
+            'body': _completion_options(settings, build_review_messages(chunk, settings, instructions, context=context))
+        }, ensure_ascii=False))
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+def batch_review_contexts(pages):
+    """Return the context sent along with each chunk of the long texts in a Batch API review,
+    by custom_id, for iter_batch_review_results to strip from the replies"""
+    return {custom_id: context for custom_id, _, context in _batch_review_requests(pages) if context}
+
+def _batch_review_requests(pages):
+    """Yield (custom_id, text, context) for each request of a Batch API review of pages"""
+    for key, text in pages:
+        chunks, separators = _chunks_and_separators(split_review_chunks(text))
+        for index, (chunk, separator) in enumerate(zip(chunks, separators)):
+            if len(chunks) == 1:
+                yield str(key), chunk, None
+                continue
+            join = 'p' if '\n' in separator else 's' if separator else 'w'
+            yield f"{key}#{index}/{len(chunks)}{join}", chunk, _chunk_context(chunks[index - 1]) if index else None
+
+def submit_batch_review(openai_api_key, assistant_id, pages, instructions=None, metadata=None):
+    """Submit a review of many texts to the OpenAI Batch API and return the batch ID.
+
+    Batches cost less than live reviews and don't count against the live rate limits, but
+    finish within BATCH_REVIEW_COMPLETION_WINDOW instead of right away; poll them with
+    get_batch_review and read the results with iter_batch_review_results.
+    """
+    settings = get_review_assistant(openai_api_key, assistant_id)
+    client = get_openai_client(openai_api_key)
+    input_file = client.files.create(
+        file=('review.jsonl', build_batch_review_file(pages, settings, instructions)),
+        purpose='batch'
+    )
+    batch = client.batches.create(
+        input_file_id=input_file.id,
+        endpoint='/v1/chat/completions',
+        completion_window=BATCH_REVIEW_COMPLETION_WINDOW,
+        metadata=metadata
+    )
+    logger.info(f"Submitted batch review {batch.id} of {len(pages)} texts (model: {settings['model']})")
+    return batch.id
+
+def get_batch_review(openai_api_key, batch_id):
+    """Return the status, request counts and output file IDs of a batch review"""
+    batch = get_openai_client(openai_api_key).batches.retrieve(batch_id)
+    counts = batch.request_counts
+    return {
+        'id': batch.id,
+        'status': batch.status,
+        'total': counts.total if counts else 0,
+        'completed': counts.completed if counts else 0,
+        'failed': counts.failed if counts else 0,
+        'output_file_id': batch.output_file_id,
+        'error_file_id': batch.error_file_id
+    }
+
+def iter_batch_review_results(openai_api_key, output_file_id, contexts=None):
+    """Yield (key, reviewed_text, error) for each text in a batch review's output file.
+
+    reviewed_text is None and error a message for requests that failed, returned nothing,
+    or were reported as too confused to review. The chunks of a long text are joined once
+    all of them are in, with a blank line, a space or nothing between them depending on
+    where the text was split; a text with a failed or missing chunk is reported as failed.
+    contexts is the batch_review_contexts of the reviewed pages; context the model repeated
+    at the start of a chunk is dropped, as in review_text.
+    """
+    content = get_openai_client(openai_api_key).files.content(output_file_id)
+    chunked = {}  # key -> {chunk index: (reviewed_text, error)}
+    for line in content.text.splitlines():
+        if not line.strip():
+            continue
+        result = json.loads(line)
+        key = result.get('custom_id')
+        reviewed_text, error = _batch_review_result(result)
+        if reviewed_text and contexts:
+            reviewed_text = _strip_echoed_context(reviewed_text, contexts.get(key))
+        chunk_id = _BATCH_CHUNK_ID_RE.match(key or '')
+        if not chunk_id:
+            yield key, reviewed_text, error
+            continue
+        key, index, count, join = chunk_id.group(1), int(chunk_id.group(2)), int(chunk_id.group(3)), chunk_id.group(4)
+        chunks = chunked.setdefault(key, {})
+        chunks[index] = (reviewed_text, error, _BATCH_CHUNK_JOINS[join])
+        if len(chunks) == count:
+            del chunked[key]
+            errors = [error for _, error, _ in chunks.values() if error]
+            if errors:
+                yield key, None, errors[0]
+            else:
+                yield key, ''.join((join if index else '') + chunks[index][0]
+                                   for index, (_, _, join) in sorted(chunks.items())), None
+    for key, chunks in chunked.items():
+        yield key, None, f"Only {len(chunks)} chunks of the text were reviewed"
+
+def _batch_review_result(result):
+    """Return (reviewed_text, error) of one request in a batch review's output file"""
+    response = result.get('response') or {}
+    if result.get('error') or response.get('status_code') != 200:
+        return None, str(result.get('error') or response.get('body'))
+    try:
+        reviewed_text = (response['body']['choices'][0]['message']['content'] or '').strip()
+    except (KeyError, IndexError, TypeError):
+        return None, 'Unexpected response format'
+    if not reviewed_text:
+        return None, 'Review returned empty text'
+    if reviewed_text.startswith(TRANSLATION_ERROR_PREFIX):
+        return None, f"Assistant reported translation error: {reviewed_text}"
+    return reviewed_text, None
+
+def get_review_stats():
+    """Return counters for translation reviews"""
+    with _lock:
+        return dict(_stats, cached_assistants=len(_assistants), rate_limiters=len(_rate_limiters))
@@ -86,6 +86,8 @@ CREATE TABLE IF NOT EXISTS document_pages (
     status TEXT DEFAULT 'in_progress',
     completion_percentage INTEGER DEFAULT 0,
     reviewed_by_ai BOOLEAN DEFAULT FALSE,
+    complexity_score INTEGER,
+    review_skipped_reason TEXT,
     last_edited_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
@@ -102,11 +104,31 @@ BEGIN
     END IF;
 END$$;
 
+-- Smart review: the page's complexity score and why its AI review was skipped, if it was
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.columns 
+        WHERE table_name = 'document_pages' AND column_name = 'complexity_score'
+    ) THEN
+        ALTER TABLE document_pages ADD COLUMN complexity_score INTEGER;
+    END IF;
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.columns 
+        WHERE table_name = 'document_pages' AND column_name = 'review_skipped_reason'
+    ) THEN
+        ALTER TABLE document_pages ADD COLUMN review_skipped_reason TEXT;
+    END IF;
+END$$;
+
 -- Create storage buckets if they don't exist
 -- Note: This needs to be done through the Supabase interface or API
 -- Create a bucket called 'documents' for storing document content
 
 -- Translation Memory/Cache
+-- source_hash is a versioned key ('v2:<blake2b>') over the full normalized source text,
+-- source/target language, formality and glossary version (see generate_text_hash).
+-- Rows with older keys are rehashed by POST /admin/migrate-translation-cache.
 CREATE TABLE IF NOT EXISTS translation_cache (
     id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
     user_id UUID NOT NULL,
@@ -139,4 +161,8 @@ CREATE TABLE IF NOT EXISTS error_logs (
 -- Create indexes for efficient querying
 CREATE INDEX IF NOT EXISTS idx_error_logs_user_id ON error_logs(user_id);
 CREATE INDEX IF NOT EXISTS idx_error_logs_error_type ON error_logs(error_type);
-CREATE INDEX IF NOT EXISTS idx_error_logs_created_at ON error_logs(created_at);
\ No newline at end of file
+CREATE INDEX IF NOT EXISTS idx_error_logs_created_at ON error_logs(created_at);
+
+-- Keyset pagination of glossary entries (see fetch_glossary_entries_page)
+CREATE INDEX IF NOT EXISTS idx_glossary_entries_glossary_source_term
+    ON glossary_entries(glossary_id, source_term, id);
@@ -181,6 +181,12 @@ document.addEventListener('DOMContentLoaded', function() {
                 formData.append('useCache', useCache.checked);
             }
             
+            // Add the fuzzyMatches checkbox value if it exists
+            const fuzzyMatches = document.getElementById('fuzzyMatches');
+            if (fuzzyMatches) {
+                formData.append('fuzzyMatches', fuzzyMatches.checked);
+            }
+            
             // Add the smartReview checkbox value if it exists
             const smartReview = document.getElementById('smartReview');
             if (smartReview) {
@@ -205,6 +211,18 @@ document.addEventListener('DOMContentLoaded', function() {
                 formData.append('assistantId', assistantSelect.value);
             }
             
+            // Add the formality option if it exists
+            const formality = document.getElementById('formality');
+            if (formality && formality.value) {
+                formData.append('formality', formality.value);
+            }
+            
+            // Add the translation unit size if it exists
+            const segmentLevel = document.getElementById('segmentLevel');
+            if (segmentLevel && segmentLevel.value) {
+                formData.append('segmentLevel', segmentLevel.value);
+            }
+            
             try {
                 // Disable the button immediately to prevent double submission
                 if (uploadButton) {
@@ -222,59 +240,12 @@ document.addEventListener('DOMContentLoaded', function() {
                 if (progressContainer) progressContainer.classList.remove('d-none');
                 if (errorContainer) errorContainer.classList.add('d-none');
                 
-                // Simulate progress with more detailed messages for better UX
-                let progress = 0;
-                let progressSteps;
-                
-                // Create messages based on multiple files or single file
+                // Show what the server is doing while the upload is sent and queued
                 const fileCount = files.length;
-                let extractMessage = fileCount > 1 
-                    ? `Extraherar text från ${fileCount} dokument...` 
-                    : "Extraherar text från dokument...";
-                
-                // For single file, be more specific about file type
-                if (fileCount === 1) {
-                    const fileExtension = files[0].name.substring(files[0].name.lastIndexOf('.')).toLowerCase();
-                    const isWord = ['.docx', '.doc'].includes(fileExtension);
-                    const isText = ['.txt', '.rtf', '.odt'].includes(fileExtension);
-                    const isPdf = fileExtension === '.pdf';
-                    
-                    if (isPdf) extractMessage = "Extraherar text från PDF...";
-                    if (isWord) extractMessage = "Extraherar text från Word-dokument...";
-                    if (isText) extractMessage = "Bearbetar textfil...";
-                }
-                
-                if (skipOpenAI && skipOpenAI.checked) {
-                    // Shorter progress sequence when skipping OpenAI
-                    progressSteps = [
-                        {progress: 15, message: extractMessage},
-                        {progress: 35, message: fileCount > 1 ? "Förbereder batch för översättning..." : "Förbereder innehåll för översättning..."},
-                        {progress: 55, message: "Översätter med DeepL..."},
-                        {progress: 80, message: "Slutför översättning..."},
-                        {progress: 90, message: "Nästan klar..."}
-                    ];
-                } else {
-                    // Full progress sequence with OpenAI review
-                    progressSteps = [
-                        {progress: 10, message: extractMessage},
-                        {progress: 25, message: fileCount > 1 ? "Förbereder batch för översättning..." : "Förbereder innehåll för översättning..."},
-                        {progress: 40, message: "Översätter med DeepL..."},
-                        {progress: 60, message: "Granskar översättningar med OpenAI..."},
-                        {progress: 80, message: "Slutför batch-översättning..."},
-                        {progress: 90, message: "Nästan klar..."}
-                    ];
-                }
-                
-                let stepIndex = 0;
-                const progressInterval = setInterval(() => {
-                    if (stepIndex < progressSteps.length) {
-                        const step = progressSteps[stepIndex];
-                        progress = step.progress;
-                        progressBar.style.width = `${progress}%`;
-                        statusText.textContent = step.message;
-                        stepIndex++;
-                    }
-                }, 2000);
+                progressBar.style.width = '5%';
+                statusText.textContent = fileCount > 1
+                    ? `Laddar upp ${fileCount} dokument...`
+                    : "Laddar upp dokument...";
                 
                 const response = await fetch('/upload', {
                     method: 'POST',
@@ -285,8 +256,6 @@ document.addEventListener('DOMContentLoaded', function() {
                     }
                 });
                 
-                clearInterval(progressInterval);
-                
                 // Check if response is JSON
                 const contentType = response.headers.get('content-type');
                 if (!contentType || !contentType.includes('application/json')) {
@@ -298,13 +267,18 @@ document.addEventListener('DOMContentLoaded', function() {
                     throw new Error(data.error || 'Operation failed');
                 }
                 
+                // The translation runs as a background job; follow it until it finishes
+                const job = data.events_url && window.EventSource
+                    ? await followJobEvents(data.events_url, data.status_url)
+                    : await waitForJob(data.status_url);
+                
                 // Handle successful response
                 progressBar.style.width = '100%';
                 statusText.textContent = 'Translation complete! Redirecting to review...';
                 
                 // Redirect to review page
-                if (data.redirect) {
-                    window.location.href = data.redirect;
+                if (job.redirect) {
+                    window.location.href = job.redirect;
                 }
                 
             } catch (error) {
@@ -314,6 +288,108 @@ document.addEventListener('DOMContentLoaded', function() {
             }
         });
         
+        /**
+         * Poll a background job until it completes, updating the progress bar.
+         * Resolves with the final job status, rejects if the job failed.
+         */
+        async function waitForJob(statusUrl) {
+            while (true) {
+                const response = await fetch(statusUrl, {
+                    headers: {
+                        'X-Requested-With': 'XMLHttpRequest',
+                        'Accept': 'application/json'
+                    }
+                });
+                const job = await response.json();
+                if (!response.ok) {
+                    throw new Error(job.error || 'Could not get translation status');
+                }
+                
+                if (job.status === 'completed') {
+                    return job;
+                }
+                if (job.status === 'failed') {
+                    throw new Error(job.error || 'Translation failed');
+                }
+                
+                showJobProgress(job);
+                await new Promise(resolve => setTimeout(resolve, 2000));
+            }
+        }
+        
+        /**
+         * Follow a background job's server-sent progress events, falling back to polling
+         * if the stream can't be opened. Once the job has completed, its status is fetched
+         * once for the page to open. Resolves and rejects like waitForJob.
+         */
+        function followJobEvents(eventsUrl, statusUrl) {
+            return new Promise((resolve, reject) => {
+                const source = new EventSource(eventsUrl);
+                let received = false;
+                
+                source.addEventListener('progress', event => {
+                    received = true;
+                    showJobProgress(JSON.parse(event.data));
+                });
+                source.addEventListener('completed', () => {
+                    source.close();
+                    waitForJob(statusUrl).then(resolve, reject);
+                });
+                source.addEventListener('failed', event => {
+                    source.close();
+                    reject(new Error(JSON.parse(event.data).error || 'Translation failed'));
+                });
+                source.onerror = () => {
+                    // The browser reconnects by itself unless the stream was refused
+                    if (source.readyState === EventSource.CLOSED || !received) {
+                        source.close();
+                        waitForJob(statusUrl).then(resolve, reject);
+                    }
+                };
+            });
+        }
+        
+        function formatDuration(seconds) {
+            seconds = Math.round(seconds);
+            if (seconds < 60) return `${seconds} s`;
+            const minutes = Math.floor(seconds / 60);
+            return `${minutes} min ${seconds % 60} s`;
+        }
+        
+        function showJobProgress(job) {
+            const progress = job.progress || {};
+            if (job.status === 'queued') {
+                progressBar.style.width = '5%';
+                statusText.textContent = 'Väntar på att översättningen ska starta...';
+                return;
+            }
+            
+            const filesTotal = progress.files_total || 1;
+            const filesDone = progress.files_done || 0;
+            // Sections of the current file count as part of a file
+            const fileFraction = progress.sections_total ? progress.sections_done / progress.sections_total : 0;
+            progressBar.style.width = `${Math.max(10, Math.round(10 + 85 * (filesDone + fileFraction) / filesTotal))}%`;
+            
+            if (progress.stage === 'saving') {
+                statusText.textContent = 'Sparar dokument...';
+                return;
+            }
+            
+            let message = filesTotal > 1
+                ? `Översätter fil ${Math.min(filesDone + 1, filesTotal)} av ${filesTotal}: ${progress.current_file || ''}`
+                : 'Översätter med DeepL...';
+            if (progress.stage === 'extracting') {
+                message = filesTotal > 1 ? `Läser fil ${filesDone + 1} av ${filesTotal}: ${progress.current_file || ''}` : 'Läser dokumentet...';
+            } else if (progress.sections_total) {
+                const details = [`${progress.sections_done}/${progress.sections_total} avsnitt`];
+                if (progress.cache_hits) details.push(`${progress.cache_hits} från cache`);
+                if (progress.chars_per_second) details.push(`${progress.chars_per_second} tecken/s`);
+                if (progress.eta_seconds != null && progress.stage === 'translating') details.push(`ca ${formatDuration(progress.eta_seconds)} kvar`);
+                message += ` (${details.join(', ')})`;
+            }
+            statusText.textContent = message;
+        }
+        
         function showError(message) {
             if (errorContainer) {
                 errorContainer.textContent = message;
@@ -1856,6 +1932,7 @@ document.addEventListener('DOMContentLoaded', function() {
                     
                     const exportBtn = document.getElementById('exportBtn');
                     if (exportBtn) exportBtn.disabled = false;
+                    document.querySelectorAll('.export-format-toggle').forEach(toggle => toggle.disabled = false);
                     
                     // Show entries
                     loadGlossaryEntries(glossaryId);
@@ -1904,6 +1981,7 @@ document.addEventListener('DOMContentLoaded', function() {
                     
                     const exportBtn = document.getElementById('exportBtn');
                     if (exportBtn) exportBtn.disabled = true;
+                    document.querySelectorAll('.export-format-toggle').forEach(toggle => toggle.disabled = true);
                     
                     // Show alternate submit option
                     const alternateSubmitContainer = document.getElementById('alternateSubmitContainer');
@@ -2073,6 +2151,15 @@ document.addEventListener('DOMContentLoaded', function() {
                 });
             }
             
+            // Export format options
+            document.querySelectorAll('.export-format').forEach(option => {
+                option.addEventListener('click', function(e) {
+                    e.preventDefault();
+                    if (!currentGlossaryId) return;
+                    exportTerms(currentGlossaryId, this.dataset.format, this.dataset.gzip === 'true');
+                });
+            });
+            
             // Delete confirmation button
             const confirmDeleteBtn = document.getElementById('confirmDeleteBtn');
             if (confirmDeleteBtn) {
@@ -2230,8 +2317,16 @@ document.addEventListener('DOMContentLoaded', function() {
         /**
          * Load glossary entries
          */
-        function loadGlossaryEntries(glossaryId) {
-            fetch(`/glossary/${glossaryId}/entries`)
+        function loadGlossaryEntries(glossaryId, cursor) {
+            // Entries are fetched a page at a time; without a cursor the table is reloaded from the start
+            const url = cursor
+                ? `/glossary/${glossaryId}/entries?cursor=${encodeURIComponent(cursor)}`
+                : `/glossary/${glossaryId}/entries`;
+            
+            const loadMoreBtn = document.getElementById('loadMoreEntriesBtn');
+            if (loadMoreBtn) loadMoreBtn.disabled = true;
+            
+            fetch(url)
             .then(response => {
                 if (!response.ok) {
                     return response.text().then(text => {
@@ -2253,7 +2348,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 const tableBody = document.getElementById('entriesTableBody');
                 if (!tableBody) return;
                 
-                tableBody.innerHTML = '';
+                if (!cursor) tableBody.innerHTML = '';
                 
                 if (data.entries && data.entries.length > 0) {
                     const noEntriesMessage = document.getElementById('noEntriesMessage');
@@ -2301,12 +2396,29 @@ document.addEventListener('DOMContentLoaded', function() {
                         // Add row to table
                         tableBody.appendChild(row);
                     });
-                } else {
+                } else if (!cursor) {
                     const noEntriesMessage = document.getElementById('noEntriesMessage');
                     if (noEntriesMessage) noEntriesMessage.classList.remove('d-none');
                 }
+                
+                // Show the "load more" button while there are more pages
+                const loadMoreContainer = document.getElementById('loadMoreEntriesContainer');
+                if (loadMoreContainer) loadMoreContainer.classList.toggle('d-none', !data.has_more);
+                if (loadMoreBtn) {
+                    loadMoreBtn.disabled = false;
+                    loadMoreBtn.onclick = function() {
+                        loadGlossaryEntries(glossaryId, data.next_cursor);
+                    };
+                }
+                
+                const entriesCount = document.getElementById('entriesCount');
+                if (entriesCount && data.total !== undefined) {
+                    entriesCount.textContent = data.total;
+                    entriesCount.parentElement.classList.remove('d-none');
+                }
             })
             .catch(error => {
+                if (loadMoreBtn) loadMoreBtn.disabled = false;
                 console.error('Error loading glossary entries:', error);
                 showNotification('Failed to load glossary entries', 'danger');
             });
@@ -2606,8 +2718,8 @@ document.addEventListener('DOMContentLoaded', function() {
         /**
          * Export terms
          */
-        function exportTerms(glossaryId) {
-            window.location.href = `/glossary/${glossaryId}/export`;
+        function exportTerms(glossaryId, format = 'csv', gzip = false) {
+            window.location.href = `/glossary/${glossaryId}/export?format=${format}&gzip=${gzip}`;
         }
         
         /**
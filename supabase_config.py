@@ -1,10 +1,16 @@
 import os
+import json
+import time
 import uuid
+import base64
 import hashlib
+import threading
+import unicodedata
 from supabase import create_client, Client
 from dotenv import load_dotenv
 import logging
 from datetime import datetime
+from local_cache import get_cached_translations, store_translations, invalidate_translations
 
 # Load environment variables
 load_dotenv()
@@ -102,37 +108,65 @@ def get_user_translations(user_id, limit=20, offset=0):
         logger.error(f"Error fetching translations: {e}")
         return []
         
-def generate_text_hash(text, target_language=''):
-    """Generate a hash for text caching based on content and target language"""
+# Version prefix of translation_cache keys. Bump it whenever the key scheme changes;
+# rows with another prefix are rehashed by migrate_translation_cache_keys().
+CACHE_KEY_VERSION = 'v2'
+
+def normalize_cache_text(text):
+    """Normalize text for cache keys (Unicode NFC, unified line endings, outer whitespace)"""
+    text = unicodedata.normalize('NFC', text)
+    return text.replace('\r\n', '\n').replace('\r', '\n').strip()
+
+def generate_text_hash(text, target_language='', source_language='auto', formality=None, glossary_version=None):
+    """Generate a cache key for a translation.
+    
+    The key covers the full normalized text and every setting that changes DeepL's output:
+    source and target language, formality and the version of a glossary sent to DeepL.
+    Glossaries applied locally after translation should not be passed, since the cache
+    stores DeepL's output before they are applied.
+    
+    Returns a string of the form 'v2:<blake2b hex digest>', or None for empty text.
+    """
     if not text:
         return None
-        
-    # Create normalized text sample for hashing (first 1000 chars)
-    text_sample = text[:1000].strip().lower()
     
-    # Create hash of text + target language
-    hash_content = f"{text_sample}_{target_language}"
-    hash_obj = hashlib.md5(hash_content.encode('utf-8'))
-    return hash_obj.hexdigest()
+    key_parts = [
+        CACHE_KEY_VERSION,
+        (source_language or 'auto').upper(),
+        (target_language or '').upper(),
+        (formality or 'default').lower(),
+        str(glossary_version or ''),
+        normalize_cache_text(text)
+    ]
+    hash_obj = hashlib.blake2b('\x1f'.join(key_parts).encode('utf-8'), digest_size=20)
+    return f"{CACHE_KEY_VERSION}:{hash_obj.hexdigest()}"
     
-def check_translation_cache(text, target_language):
+def check_translation_cache(text, target_language, source_language='auto', formality=None, glossary_version=None):
     """Check if a translation exists in the cache"""
     try:
         if not text or not text.strip():
             return None
             
         # Generate hash for lookup
-        text_hash = generate_text_hash(text, target_language)
+        text_hash = generate_text_hash(text, target_language, source_language, formality, glossary_version)
         if not text_hash:
             return None
             
+        # Try the local memory/disk tiers before going over the network
+        local_hit = get_cached_translations([text_hash]).get(text_hash)
+        if local_hit is not None:
+            logger.debug(f"Local cache hit for text with hash: {text_hash[:10]}...")
+            return local_hit
+        
         # Look up in cache by hash
         logger.debug(f"Checking translation cache for hash: {text_hash[:10]}...")
         response = supabase.table('translation_cache').select('*').eq('source_hash', text_hash).eq('target_language', target_language).limit(1).execute()
         
         if hasattr(response, 'data') and response.data:
             logger.info(f"Cache hit for text with hash: {text_hash[:10]}...")
-            return response.data[0]['translated_text']
+            translated_text = response.data[0]['translated_text']
+            store_translations({text_hash: translated_text})
+            return translated_text
             
         logger.debug(f"Cache miss for text with hash: {text_hash[:10]}...")
         return None
@@ -140,6 +174,99 @@ def check_translation_cache(text, target_language):
         logger.error(f"Error checking translation cache: {str(e)}")
         return None
 
+# Number of hashes per translation_cache query; keeps the PostgREST URL well below its limits
+CACHE_LOOKUP_CHUNK_SIZE = 100
+
+def bulk_check_translation_cache(texts, target_language, source_language='auto', formality=None, glossary_version=None, chunk_size=CACHE_LOOKUP_CHUNK_SIZE):
+    """Look up many texts in the translation cache with a few chunked queries.
+    
+    Returns a dict mapping cache key (see generate_text_hash) to the cached translation
+    for every text that was found.
+    """
+    hashes = []
+    seen = set()
+    for text in texts:
+        if not text or not text.strip():
+            continue
+        text_hash = generate_text_hash(text, target_language, source_language, formality, glossary_version)
+        if text_hash and text_hash not in seen:
+            seen.add(text_hash)
+            hashes.append(text_hash)
+    
+    # Resolve what we can from the local memory/disk tiers first
+    cached = get_cached_translations(hashes)
+    local_hits = len(cached)
+    remote_hashes = [text_hash for text_hash in hashes if text_hash not in cached]
+    
+    remote = {}
+    for start in range(0, len(remote_hashes), chunk_size):
+        chunk = remote_hashes[start:start + chunk_size]
+        try:
+            response = supabase.table('translation_cache').select('source_hash, translated_text') \
+                .eq('target_language', target_language).in_('source_hash', chunk).execute()
+            if hasattr(response, 'data') and response.data:
+                for row in response.data:
+                    remote[row['source_hash']] = row['translated_text']
+        except Exception as e:
+            # A failed chunk only means more misses
+            logger.error(f"Error checking translation cache: {str(e)}")
+    
+    store_translations(remote)
+    cached.update(remote)
+    
+    logger.info(f"Translation cache lookup: {len(cached)}/{len(hashes)} texts found "
+                f"({local_hits} locally, {len(remote)} in {(len(remote_hashes) + chunk_size - 1) // chunk_size} queries)")
+    return cached
+
+def migrate_translation_cache_keys(batch_size=500):
+    """Rehash translation_cache rows created with an older key scheme.
+    
+    Legacy rows don't record the source language or formality, so they are rehashed as
+    auto-detected source with default formality from their stored source_text. Rows whose
+    new key already exists are deleted as duplicates.
+    
+    Returns a dict with the number of rows migrated, deleted and failed.
+    """
+    result = {'migrated': 0, 'deleted': 0, 'failed': 0}
+    last_id = None
+    
+    while True:
+        query = supabase.table('translation_cache').select('id, source_hash, source_text, target_language') \
+            .not_.like('source_hash', f"{CACHE_KEY_VERSION}:%").order('id').limit(batch_size)
+        if last_id:
+            query = query.gt('id', last_id)
+        response = query.execute()
+        rows = response.data if hasattr(response, 'data') and response.data else []
+        if not rows:
+            break
+        
+        for row in rows:
+            last_id = row['id']
+            new_hash = generate_text_hash(row.get('source_text'), row.get('target_language'))
+            if not new_hash:
+                result['failed'] += 1
+                continue
+            
+            try:
+                supabase.table('translation_cache').update({'source_hash': new_hash, 'updated_at': 'now()'}).eq('id', row['id']).execute()
+                result['migrated'] += 1
+            except Exception as update_error:
+                # Most likely the UNIQUE (source_hash, target_language) constraint - the
+                # translation is already cached under the new key
+                try:
+                    supabase.table('translation_cache').delete().eq('id', row['id']).execute()
+                    result['deleted'] += 1
+                except Exception as delete_error:
+                    logger.error(f"Error migrating cache row {row['id']}: {str(update_error)} / {str(delete_error)}")
+                    result['failed'] += 1
+        
+        logger.info(f"Translation cache key migration progress: {result}")
+        if len(rows) < batch_size:
+            break
+    
+    logger.info(f"Translation cache key migration complete: {result}")
+    return result
+
 def save_translation(user_id, original_filename, translated_text, settings=None, source_text=None, source_hash=None, target_language=None):
     """Save a translation to the user's history and translation cache"""
     try:
@@ -176,8 +303,9 @@ def save_translation(user_id, original_filename, translated_text, settings=None,
                     'updated_at': 'now()'
                 }
                 
-                # Add to translation cache
-                cache_response = supabase.table('translation_cache').insert(cache_data).execute()
+                # Add to translation cache, replacing an existing entry for the same key
+                cache_response = supabase.table('translation_cache').upsert(cache_data, on_conflict='source_hash,target_language').execute()
+                store_translations({source_hash: translated_text})
                 logger.info(f"Added translation to cache with hash: {source_hash[:10]}...")
             except Exception as cache_error:
                 # Don't fail the main operation if caching fails
@@ -188,6 +316,69 @@ def save_translation(user_id, original_filename, translated_text, settings=None,
         logger.error(f"Error saving translation: {str(e)}")
         return None
 
+# Rows per upsert request when writing the translation cache
+CACHE_UPSERT_BATCH_SIZE = 500
+
+def save_translations_to_cache(entries, user_id, batch_size=CACHE_UPSERT_BATCH_SIZE):
+    """Upsert translations into translation_cache in batches.
+    
+    Each entry is a dict with source_hash, source_text, target_language and translated_text.
+    Existing rows with the same (source_hash, target_language) are updated in place.
+    Returns the number of rows written.
+    """
+    if not user_id:
+        logger.warning("Not saving translations to cache without a user_id")
+        return 0
+    
+    # A document can repeat a section; one upsert can't touch the same row twice
+    rows = {}
+    for entry in entries:
+        if entry.get('source_hash') and entry.get('source_text') and entry.get('translated_text') and entry.get('target_language'):
+            rows[(entry['source_hash'], entry['target_language'])] = {
+                'source_hash': entry['source_hash'],
+                'source_text': entry['source_text'],
+                'target_language': entry['target_language'],
+                'translated_text': entry['translated_text'],
+                'user_id': user_id,
+                'updated_at': 'now()'
+            }
+    rows = list(rows.values())
+    
+    saved = 0
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        try:
+            supabase.table('translation_cache').upsert(batch, on_conflict='source_hash,target_language').execute()
+            store_translations({row['source_hash']: row['translated_text'] for row in batch})
+            saved += len(batch)
+            
+            # Keep loaded fuzzy-match indexes current
+            from translation_memory import add_translation_memory_entries
+            rows_by_language = {}
+            for row in batch:
+                rows_by_language.setdefault(row['target_language'], []).append(row)
+            for target_language, language_rows in rows_by_language.items():
+                add_translation_memory_entries(user_id, target_language, language_rows)
+        except Exception as e:
+            logger.error(f"Error saving {len(batch)} translations to cache: {str(e)}")
+    
+    logger.info(f"Saved {saved}/{len(rows)} translations to cache")
+    return saved
+
+def save_translations_to_cache_async(entries, user_id):
+    """Run save_translations_to_cache in a background thread so the caller doesn't wait"""
+    if not entries:
+        return None
+    
+    thread = threading.Thread(
+        target=save_translations_to_cache,
+        args=(list(entries), user_id),
+        name='translation-cache-writer',
+        daemon=True
+    )
+    thread.start()
+    return thread
+
 def get_full_translation(user_id, translation_id):
     """Get the full text of a translation from storage"""
     try:
@@ -440,6 +631,103 @@ def get_glossary_entries(glossary_id, limit=100, offset=0):
         logger.error(f"Error fetching glossary entries: {e}")
         return []
 
+# Rows fetched per request when loading a whole glossary
+GLOSSARY_ENTRIES_PAGE_SIZE = 1000
+
+def _postgrest_quote(value):
+    """Quote a value for use inside a PostgREST or=() filter"""
+    return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+def encode_glossary_cursor(entry):
+    """Encode the keyset position after an entry as an opaque cursor string"""
+    position = json.dumps([entry.get('source_term'), entry.get('id')])
+    return base64.urlsafe_b64encode(position.encode('utf-8')).decode('ascii')
+
+def decode_glossary_cursor(cursor):
+    """Decode a cursor from encode_glossary_cursor into (source_term, id), or None if invalid"""
+    try:
+        source_term, entry_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+        # Cursors come from the client, so the ID must be a real UUID before it goes in a filter
+        return str(source_term), str(uuid.UUID(str(entry_id)))
+    except Exception:
+        return None
+
+def fetch_glossary_entries_page(glossary_id, limit=GLOSSARY_ENTRIES_PAGE_SIZE, after=None):
+    """Fetch one page of glossary entries ordered by (source_term, id).
+    
+    Uses keyset pagination, so every page costs the same regardless of its position.
+    Raises on database errors.
+    
+    Args:
+        glossary_id: The glossary ID
+        limit: Maximum number of entries to return
+        after: Optional (source_term, id) of the last entry of the previous page
+    """
+    query = supabase.table('glossary_entries').select('*').eq('glossary_id', glossary_id)
+    if after:
+        source_term, entry_id = after
+        quoted = _postgrest_quote(source_term)
+        query = query.or_(f"source_term.gt.{quoted},and(source_term.eq.{quoted},id.gt.{_postgrest_quote(entry_id)})")
+    response = query.order('source_term').order('id').limit(limit).execute()
+    return response.data if hasattr(response, 'data') and response.data else []
+
+def iter_glossary_entries(glossary_id, page_size=GLOSSARY_ENTRIES_PAGE_SIZE):
+    """Yield all entries of a glossary, fetched in pages of page_size. Raises on database errors."""
+    after = None
+    while True:
+        rows = fetch_glossary_entries_page(glossary_id, limit=page_size, after=after)
+        yield from rows
+        if len(rows) < page_size:
+            return
+        after = (rows[-1]['source_term'], rows[-1]['id'])
+
+def get_all_glossary_entries(glossary_id):
+    """Fetch every entry of a glossary. Raises on database errors so that a partial
+    glossary is never compiled and cached."""
+    started = time.time()
+    entries = list(iter_glossary_entries(glossary_id))
+    logger.debug(f"Loaded {len(entries)} entries for glossary {glossary_id} in {time.time() - started:.2f}s")
+    return entries
+
+def get_glossary_entries_page(glossary_id, limit=100, cursor=None):
+    """Fetch a page of glossary entries for the glossary UI.
+    
+    Returns:
+        tuple: (entries, next_cursor) where next_cursor is None on the last page
+        
+    Raises:
+        ValueError: If the cursor is not one from encode_glossary_cursor
+    """
+    after = None
+    if cursor:
+        after = decode_glossary_cursor(cursor)
+        if after is None:
+            raise ValueError('Invalid cursor')
+    try:
+        # Fetch one extra row to know whether there is a next page
+        rows = fetch_glossary_entries_page(glossary_id, limit=limit + 1, after=after)
+    except Exception as e:
+        logger.error(f"Error fetching glossary entries page: {e}")
+        return [], None
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_glossary_cursor(rows[-1])
+    return rows, None
+
+def count_glossary_entries(glossary_id):
+    """Count the entries of a glossary without fetching them"""
+    try:
+        response = supabase.table('glossary_entries').select('id', count='exact') \
+            .eq('glossary_id', glossary_id).limit(1).execute()
+        count = getattr(response, 'count', None)
+        if count is not None:
+            return count
+        return len(response.data) if hasattr(response, 'data') and response.data else 0
+    except Exception as e:
+        logger.error(f"Error counting glossary entries: {e}")
+        return 0
+
 def create_glossary_entry(glossary_id, entry_data):
     """Create a new glossary entry"""
     try:
@@ -471,6 +759,93 @@ def create_glossary_entry(glossary_id, entry_data):
         logger.error(f"Error creating glossary entry: {e}")
         return None
 
+# Rows written per request when importing glossary entries
+GLOSSARY_IMPORT_BATCH_SIZE = 500
+
+def bulk_upsert_glossary_entries(glossary_id, entries, batch_size=GLOSSARY_IMPORT_BATCH_SIZE):
+    """Insert or update many glossary entries with batched requests.
+    
+    entries is any iterable of dicts with source_term, target_term and optionally context
+    and notes, so a file can be imported while it is being parsed. An entry whose source
+    term already exists in the glossary updates that entry unless nothing changed, and for
+    source terms repeated in the input the last entry wins.
+    
+    Args:
+        glossary_id: The glossary ID
+        entries: Iterable of entry dicts
+        batch_size: Number of rows written per request
+        
+    Returns:
+        dict: Counts of processed, inserted, updated, unchanged, duplicate and invalid entries
+        
+    Raises:
+        Exception: If a batch can't be written; earlier batches stay written
+    """
+    # Existing entries by source term, so they are updated instead of duplicated
+    current = {}
+    for row in iter_glossary_entries(glossary_id):
+        current.setdefault(row['source_term'], row)
+    
+    stats = {'processed': 0, 'inserted': 0, 'updated': 0, 'unchanged': 0, 'duplicates': 0, 'invalid': 0, 'written': 0}
+    seen = set()
+    # New and existing rows are written separately, since a bulk upsert needs identical columns
+    inserts = {}  # id -> row
+    updates = {}  # id -> row
+    
+    def flush(pending):
+        if not pending:
+            return
+        supabase.table('glossary_entries').upsert(list(pending.values())).execute()
+        stats['written'] += len(pending)
+        pending.clear()
+        logger.info(f"Glossary {glossary_id} import: {stats['processed']} entries processed, {stats['written']} written")
+    
+    for entry in entries:
+        stats['processed'] += 1
+        source_term = (entry.get('source_term') or '').strip()
+        target_term = (entry.get('target_term') or '').strip()
+        if not source_term or not target_term:
+            stats['invalid'] += 1
+            continue
+        
+        values = {
+            'target_term': target_term,
+            'context': (entry.get('context') or '').strip(),
+            'notes': (entry.get('notes') or '').strip()
+        }
+        existing = current.get(source_term)
+        unchanged = existing is not None and all((existing.get(key) or '') == value for key, value in values.items())
+        
+        if source_term in seen:
+            stats['duplicates'] += 1
+        elif existing is None:
+            stats['inserted'] += 1
+        elif unchanged:
+            stats['unchanged'] += 1
+        else:
+            stats['updated'] += 1
+        seen.add(source_term)
+        if unchanged:
+            continue
+        
+        row = dict(values, id=existing['id'] if existing else str(uuid.uuid4()), glossary_id=glossary_id,
+                   source_term=source_term, updated_at='now()')
+        if existing is None or row['id'] in inserts:
+            row['created_at'] = 'now()'
+            inserts[row['id']] = row
+        else:
+            updates[row['id']] = row
+        current[source_term] = row
+        
+        if len(inserts) >= batch_size:
+            flush(inserts)
+        if len(updates) >= batch_size:
+            flush(updates)
+    
+    flush(inserts)
+    flush(updates)
+    return stats
+
 def update_glossary_entry(entry_id, entry_data):
     """Update an existing glossary entry"""
     try:
@@ -512,12 +887,57 @@ def delete_glossary_entry(entry_id):
         logger.error(f"Error deleting glossary entry: {e}")
         return False
 
-def apply_glossary_to_text(text, glossary_id):
+def get_glossary_version(glossary_id):
+    """Get the version (updated_at) of a glossary, or None if it can't be read"""
+    try:
+        response = supabase.table('glossaries').select('updated_at').eq('id', glossary_id).limit(1).execute()
+        if hasattr(response, 'data') and response.data:
+            return response.data[0].get('updated_at')
+        return None
+    except Exception as e:
+        logger.error(f"Error fetching glossary version: {e}")
+        return None
+
+def get_glossary_metadata(glossary_id):
+    """Get a glossary's language pair and version (updated_at), or None if it can't be read"""
+    try:
+        response = supabase.table('glossaries').select('id, source_language, target_language, updated_at') \
+            .eq('id', glossary_id).limit(1).execute()
+        if hasattr(response, 'data') and response.data:
+            return response.data[0]
+        return None
+    except Exception as e:
+        logger.error(f"Error fetching glossary metadata: {e}")
+        return None
+
+def touch_glossary(glossary_id):
+    """Mark a glossary as changed after its entries were modified.
+    
+    Bumps the glossary's updated_at so other workers recompile it, and drops it from
+    this worker's compiled glossary cache.
+    """
+    from glossary_engine import glossary_cache
+    glossary_cache.invalidate(glossary_id)
+    try:
+        supabase.table('glossaries').update({'updated_at': 'now()'}).eq('id', glossary_id).execute()
+    except Exception as e:
+        logger.error(f"Error updating glossary version: {e}")
+
+def get_compiled_glossary(glossary_id):
+    """Get the compiled matcher for a glossary from the per-worker cache"""
+    from glossary_engine import glossary_cache
+    return glossary_cache.get(glossary_id, get_glossary_version, get_all_glossary_entries)
+
+def apply_glossary_to_text(text, glossary_id, entry_hits=None):
     """Apply glossary terms to a text string and track replacements.
     
+    Terms are replaced in a single pass with a compiled matcher (see glossary_engine),
+    longest term first and only at word boundaries.
+    
     Args:
         text: The text to process
         glossary_id: The ID of the glossary to apply
+        entry_hits: Optional dict that is updated with the number of replacements per entry ID
         
     Returns:
         tuple: (modified_text, replacements_count, entry_count)
@@ -529,68 +949,15 @@ def apply_glossary_to_text(text, glossary_id):
         return text, 0, 0
         
     try:
-        # Get all glossary entries
-        entries = get_glossary_entries(glossary_id)
-        if not entries:
-            return text, 0, 0
-            
-        # Sort entries by length of source term (longest first)
-        # This prevents shorter terms from replacing parts of longer terms
-        entries.sort(key=lambda x: len(x.get('source_term', '')), reverse=True)
-        
-        # Track replacements
-        replacements_count = 0
-        used_entries = set()
-        
-        # Apply replacements
-        for entry in entries:
-            source_term = entry.get('source_term', '')
-            target_term = entry.get('target_term', '')
-            entry_id = entry.get('id', '')
-            
-            if source_term and target_term:
-                replacement_made = False
-                
-                # Keep track of original text to detect if changes were made
-                text_before = text
-                
-                # Replace with word boundary check to avoid partial word replacements
-                if f" {source_term} " in text:
-                    text = text.replace(f" {source_term} ", f" {target_term} ")
-                    replacement_made = text != text_before
-                
-                # Handle beginning of text
-                if text.startswith(source_term + " "):
-                    text = target_term + " " + text[len(source_term)+1:]
-                    replacement_made = True
-                    
-                # Handle end of text
-                if text.endswith(" " + source_term):
-                    text = text[:-len(source_term)-1] + " " + target_term
-                    replacement_made = True
-                    
-                # Handle standalone term (the entire text)
-                if text == source_term:
-                    text = target_term
-                    replacement_made = True
-                
-                # If at least one replacement was made for this entry
-                if replacement_made:
-                    # Count replacements: check how many times the term was replaced
-                    # We need to count separately, as the text has already been modified
-                    instances_replaced = text_before.count(f" {source_term} ")
-                    if text_before.startswith(source_term + " "):
-                        instances_replaced += 1
-                    if text_before.endswith(" " + source_term):
-                        instances_replaced += 1
-                    if text_before == source_term:
-                        instances_replaced += 1
-                        
-                    replacements_count += instances_replaced
-                    used_entries.add(entry_id)
-                    logger.debug(f"Applied glossary term: '{source_term}' -> '{target_term}' ({instances_replaced} replacements)")
-        
-        entry_count = len(used_entries)        
+        # Compiled once per glossary version and reused across sections and documents
+        text, hits = get_compiled_glossary(glossary_id).apply(text)
+        
+        if entry_hits is not None:
+            for entry_id, count in hits.items():
+                entry_hits[entry_id] = entry_hits.get(entry_id, 0) + count
+        
+        replacements_count = sum(hits.values())
+        entry_count = len(hits)
         logger.info(f"Applied {replacements_count} glossary replacements using {entry_count} unique terms")
         return text, replacements_count, entry_count
     
@@ -1216,7 +1583,14 @@ def update_translation_memory_entry(user_id, entry_id, data):
         response = supabase.table('translation_cache').update(data).eq('id', entry_id).eq('user_id', user_id).execute()
         
         if hasattr(response, 'data') and response.data:
-            return response.data[0]
+            updated = response.data[0]
+            # Keep the local cache tiers from serving the old translation
+            invalidate_translations([entry.get('source_hash')])
+            if updated.get('translated_text'):
+                store_translations({updated.get('source_hash'): updated['translated_text']})
+            from translation_memory import add_translation_memory_entries
+            add_translation_memory_entries(user_id, updated.get('target_language'), [updated])
+            return updated
         return None
     except Exception as e:
         logger.error(f"Error updating translation memory entry: {e}")
@@ -1243,6 +1617,9 @@ def delete_translation_memory_entry(user_id, entry_id):
             
         response = supabase.table('translation_cache').delete().eq('id', entry_id).eq('user_id', user_id).execute()
         if hasattr(response, 'data'):
+            invalidate_translations([entry.get('source_hash')])
+            from translation_memory import remove_translation_memory_entry
+            remove_translation_memory_entry(user_id, entry.get('target_language'), entry.get('source_hash'))
             return True
         return False
     except Exception as e:
@@ -0,0 +1,314 @@
+# Fuzzy translation memory matching over the translation_cache table
+
+import os
+import re
+import time
+import threading
+import heapq
+import logging
+from collections import Counter, OrderedDict, defaultdict
+
+logger = logging.getLogger(__name__)
+
+# Default minimum similarity (in percent) for a fuzzy match
+TM_FUZZY_MIN_SCORE = int(os.environ.get('TM_FUZZY_MIN_SCORE', '75'))
+# Fuzzy matches at or above this score are used instead of translating with DeepL (0 disables)
+TM_FUZZY_AUTO_ACCEPT_SCORE = int(os.environ.get('TM_FUZZY_AUTO_ACCEPT_SCORE', '0'))
+# Longer texts are not fuzzy matched: the edit distance grows with the square of the length
+TM_FUZZY_MAX_CHARS = int(os.environ.get('TM_FUZZY_MAX_CHARS', '1000'))
+# Indexes are rebuilt from Supabase after this many seconds to pick up changes from other workers
+TM_INDEX_TTL = int(os.environ.get('TM_INDEX_TTL', '3600'))
+# Entries kept in the indexes of one worker over all users and languages; the least recently
+# used indexes are dropped beyond it
+TM_INDEX_MAX_ENTRIES = int(os.environ.get('TM_INDEX_MAX_ENTRIES', '200000'))
+# Rows fetched per Supabase request when building an index
+TM_INDEX_PAGE_SIZE = 1000
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+def normalize_tm_text(text):
+    """Normalize text for fuzzy comparison (case and whitespace insensitive)"""
+    return _WHITESPACE_RE.sub(' ', text or '').strip().lower()
+
+def _trigrams(normalized_text):
+    """Return the set of character trigrams of normalized text, padded at the ends"""
+    padded = f" {normalized_text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def bounded_levenshtein(a, b, max_distance):
+    """Levenshtein distance between a and b, or max_distance + 1 if it is larger.
+
+    Only the band of width 2 * max_distance around the diagonal is computed, and the
+    computation stops as soon as no cell in a row can still lead to a distance within
+    max_distance: a cell's value plus the length difference left after it is a lower bound.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    if len(a) > len(b):
+        a, b = b, a
+
+    too_far = max_distance + 1
+    # Cell (i, j) is on the diagonal that ends the computation where j - i == offset
+    offset = len(b) - len(a)
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [too_far] * (len(b) + 1)
+        current[0] = i if i <= max_distance else too_far
+        row_min = current[0] + abs(offset + i)
+        left = current[0]
+        for j in range(max(1, i - max_distance), min(len(b), i + max_distance) + 1):
+            value = previous[j - 1] + (char_a != b[j - 1])
+            if previous[j] < value:
+                value = previous[j] + 1
+            if left < value:
+                value = left + 1
+            current[j] = left = value
+            bound = value + abs(offset - j + i)
+            if bound < row_min:
+                row_min = bound
+        if row_min > max_distance:
+            return too_far
+        previous = current
+
+    return min(previous[len(b)], too_far)
+
+def similarity_score(a, b, min_score=0):
+    """Edit-distance similarity of two normalized strings in percent (0-100).
+
+    Returns 0 if the similarity is below min_score.
+    """
+    longest = max(len(a), len(b))
+    if not longest:
+        return 100
+    max_distance = int(longest * (100 - min_score) / 100)
+    distance = bounded_levenshtein(a, b, max_distance)
+    if distance > max_distance:
+        return 0
+    return round(100 * (1 - distance / longest), 1)
+
+class TranslationMemoryIndex:
+    """In-memory trigram index over translation memory entries.
+
+    Candidates for a query are the entries sharing the most trigrams with it, counted over
+    its rarest trigrams until POSTING_BUDGET postings have been read (common trigrams carry
+    little signal and have the longest posting lists). Candidates within the length bounds
+    for min_score are then scored with a banded Levenshtein distance, best first, unless
+    they share too few trigrams with the query to be within that distance: an edit changes
+    at most three trigrams, so a string within distance k shares at least len(grams) - 3k.
+    Queries longer than TM_FUZZY_MAX_CHARS are not matched.
+    """
+
+    # Maximum number of postings read per query when counting shared trigrams
+    POSTING_BUDGET = 20000
+
+    def __init__(self):
+        self._entries = {}  # key -> (normalized_source, source_text, translated_text)
+        self._postings = defaultdict(set)  # trigram -> set of keys
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, key, source_text, translated_text):
+        """Add or replace an entry"""
+        normalized = normalize_tm_text(source_text)
+        if not normalized or not translated_text:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self.remove(key)
+            self._entries[key] = (normalized, source_text, translated_text)
+            for gram in _trigrams(normalized):
+                self._postings[gram].add(key)
+
+    def remove(self, key):
+        """Remove an entry if present"""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if not entry:
+                return
+            for gram in _trigrams(entry[0]):
+                posting = self._postings.get(gram)
+                if posting:
+                    posting.discard(key)
+                    if not posting:
+                        del self._postings[gram]
+
+    def search(self, text, min_score=TM_FUZZY_MIN_SCORE, limit=5, max_candidates=20, exclude_exact=False):
+        """Find entries similar to text.
+
+        Returns up to limit dicts with key, source_text, translated_text and score (percent),
+        best match first. With exclude_exact, entries identical to text after normalization
+        are left out.
+        """
+        normalized = normalize_tm_text(text)
+        if not normalized or len(normalized) > TM_FUZZY_MAX_CHARS:
+            return []
+
+        grams = _trigrams(normalized)
+        min_ratio = min_score / 100
+        min_length = len(normalized) * min_ratio
+        max_length = len(normalized) / min_ratio if min_ratio else float('inf')
+
+        with self._lock:
+            if not self._entries:
+                return []
+
+            postings = sorted(
+                (self._postings[gram] for gram in grams if gram in self._postings),
+                key=len
+            )
+
+            counts = Counter()
+            budget = self.POSTING_BUDGET
+            for posting in postings:
+                if budget <= 0:
+                    break
+                counts.update(posting)
+                budget -= len(posting)
+
+            entries = self._entries
+            top = heapq.nlargest(
+                max_candidates,
+                ((shared, key) for key, shared in counts.items()
+                 if min_length <= len(entries[key][0]) <= max_length),
+                key=lambda item: item[0]
+            )
+            candidates = [(shared, key) + entries[key] for shared, key in top]
+
+        matches = []
+        for shared, key, normalized_source, source_text, translated_text in candidates:
+            # Entries sharing far fewer trigrams than the best candidate won't be close
+            if matches and len(matches) >= limit and shared < candidates[0][0] / 2:
+                break
+            if exclude_exact and normalized_source == normalized:
+                continue
+            max_distance = int(max(len(normalized), len(normalized_source)) * (100 - min_score) / 100)
+            if len(grams & _trigrams(normalized_source)) < len(grams) - 3 * max_distance:
+                continue
+            score = similarity_score(normalized, normalized_source, min_score)
+            if score >= min_score:
+                matches.append({
+                    'key': key,
+                    'source_text': source_text,
+                    'translated_text': translated_text,
+                    'score': score
+                })
+
+        matches.sort(key=lambda match: match['score'], reverse=True)
+        return matches[:limit]
+
+_indexes = OrderedDict()  # (user_id, target_language) -> {'index': TranslationMemoryIndex, 'loaded_at': float}, least recently used first
+_indexes_lock = threading.Lock()
+_build_locks = {}  # cache key -> [lock, number of threads using it]
+
+def _load_translation_memory_index(user_id, target_language):
+    """Build an index from the user's translation_cache rows for a target language"""
+    from supabase_config import supabase
+
+    index = TranslationMemoryIndex()
+    last_id = None
+    started = time.time()
+    while True:
+        query = supabase.table('translation_cache').select('id, source_hash, source_text, translated_text') \
+            .eq('user_id', user_id).eq('target_language', target_language).order('id').limit(TM_INDEX_PAGE_SIZE)
+        if last_id:
+            query = query.gt('id', last_id)
+        response = query.execute()
+        rows = response.data if hasattr(response, 'data') and response.data else []
+
+        for row in rows:
+            index.add(row['source_hash'], row.get('source_text'), row.get('translated_text'))
+        if len(rows) < TM_INDEX_PAGE_SIZE:
+            break
+        last_id = rows[-1]['id']
+
+    logger.info(f"Built translation memory index for user {user_id} ({target_language}): "
+                f"{len(index)} entries in {time.time() - started:.1f}s")
+    return index
+
+def get_translation_memory_index(user_id, target_language):
+    """Get the fuzzy-match index for a user and target language, building it if needed"""
+    cache_key = (user_id, (target_language or '').upper())
+    with _indexes_lock:
+        cached = _indexes.get(cache_key)
+        if cached and time.time() - cached['loaded_at'] < TM_INDEX_TTL:
+            _indexes.move_to_end(cache_key)
+            return cached['index']
+        build_lock = _build_locks.setdefault(cache_key, [threading.Lock(), 0])
+        build_lock[1] += 1
+
+    # Only one thread builds a given index; others wait for it and reuse the result
+    try:
+        with build_lock[0]:
+            with _indexes_lock:
+                cached = _indexes.get(cache_key)
+                if cached and time.time() - cached['loaded_at'] < TM_INDEX_TTL:
+                    return cached['index']
+
+            index = _load_translation_memory_index(user_id, cache_key[1])
+            with _indexes_lock:
+                _indexes.pop(cache_key, None)
+                _indexes[cache_key] = {'index': index, 'loaded_at': time.time()}
+                _evict_indexes()
+            return index
+    finally:
+        # Drop the lock once no thread uses it, so it doesn't outlive an evicted index
+        with _indexes_lock:
+            build_lock[1] -= 1
+            if not build_lock[1]:
+                del _build_locks[cache_key]
+
+def _evict_indexes():
+    """Drop expired indexes, then the least recently used ones while the indexes hold more
+    than TM_INDEX_MAX_ENTRIES entries. The most recently used index is always kept, since
+    dropping it would mean rebuilding it on every lookup. Call with _indexes_lock held."""
+    now = time.time()
+    for cache_key in [key for key, cached in _indexes.items() if now - cached['loaded_at'] >= TM_INDEX_TTL]:
+        del _indexes[cache_key]
+    total = sum(len(cached['index']) for cached in _indexes.values())
+    while total > TM_INDEX_MAX_ENTRIES and len(_indexes) > 1:
+        (user_id, target_language), evicted = _indexes.popitem(last=False)
+        total -= len(evicted['index'])
+        logger.info(f"Dropped translation memory index for user {user_id} ({target_language}) "
+                    f"with {len(evicted['index'])} entries to stay within {TM_INDEX_MAX_ENTRIES} entries")
+
+def add_translation_memory_entries(user_id, target_language, rows):
+    """Add translation_cache rows to an already built index (no-op if it isn't loaded)"""
+    with _indexes_lock:
+        cached = _indexes.get((user_id, (target_language or '').upper()))
+    if cached:
+        for row in rows:
+            cached['index'].add(row['source_hash'], row.get('source_text'), row.get('translated_text'))
+        with _indexes_lock:
+            _evict_indexes()
+
+def remove_translation_memory_entry(user_id, target_language, source_hash):
+    """Remove an entry from an already built index (no-op if it isn't loaded)"""
+    with _indexes_lock:
+        cached = _indexes.get((user_id, (target_language or '').upper()))
+    if cached:
+        cached['index'].remove(source_hash)
+
+def find_fuzzy_matches(user_id, text, target_language, min_score=TM_FUZZY_MIN_SCORE, limit=5, exclude_exact=False):
+    """Find translation memory entries similar to text for a user and target language"""
+    try:
+        index = get_translation_memory_index(user_id, target_language)
+        return index.search(text, min_score=min_score, limit=limit, exclude_exact=exclude_exact)
+    except Exception as e:
+        logger.error(f"Error finding fuzzy translation memory matches: {str(e)}")
+        return []
+
+def get_translation_memory_index_stats():
+    """Return the size and age of the loaded fuzzy-match indexes"""
+    now = time.time()
+    with _indexes_lock:
+        return [
+            {
+                'target_language': target_language,
+                'entries': len(cached['index']),
+                'age_seconds': round(now - cached['loaded_at'], 1)
+            }
+            for (_, target_language), cached in _indexes.items()
+        ]
@@ -12,6 +12,8 @@ from pathlib import Path
 import subprocess
 import shutil
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Try to import optional document processing libraries
 try:
@@ -58,6 +60,203 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+# Concurrency limits for DeepL translation
+# DEEPL_MAX_CONCURRENCY: worker threads used by process_document for one document
+# DEEPL_MAX_CONCURRENCY_PER_KEY: in-flight DeepL requests per API key across the whole process
+DEEPL_MAX_CONCURRENCY = int(os.environ.get('DEEPL_MAX_CONCURRENCY', '4'))
+DEEPL_MAX_CONCURRENCY_PER_KEY = int(os.environ.get('DEEPL_MAX_CONCURRENCY_PER_KEY', '4'))
+
+_deepl_key_semaphores = {}
+_deepl_key_semaphores_lock = threading.Lock()
+
+def get_deepl_semaphore(deepl_api_key):
+    """Get the semaphore limiting concurrent DeepL requests for an API key"""
+    with _deepl_key_semaphores_lock:
+        semaphore = _deepl_key_semaphores.get(deepl_api_key)
+        if semaphore is None:
+            semaphore = threading.BoundedSemaphore(max(1, DEEPL_MAX_CONCURRENCY_PER_KEY))
+            _deepl_key_semaphores[deepl_api_key] = semaphore
+        return semaphore
+
+# Process-wide pool of DeepL translators, one per API key, so HTTP connections are
+# kept alive and reused across sections, requests and users within a worker.
+# Translators that have not been used for DEEPL_TRANSLATOR_IDLE_TIMEOUT seconds are closed.
+DEEPL_TRANSLATOR_IDLE_TIMEOUT = int(os.environ.get('DEEPL_TRANSLATOR_IDLE_TIMEOUT', '600'))
+
+_deepl_translators = {}
+_deepl_translators_lock = threading.Lock()
+_deepl_translator_stats = {'created': 0, 'reused': 0, 'evicted': 0, 'discarded': 0}
+
+def _close_deepl_translator(translator):
+    """Close a translator's HTTP session, ignoring errors"""
+    try:
+        close = getattr(translator, 'close', None)
+        if close:
+            close()
+    except Exception as e:
+        logger.debug(f"Error closing DeepL translator: {str(e)}")
+
+def _evict_idle_deepl_translators(now):
+    """Remove idle translators from the pool. Must be called with the pool lock held.
+    
+    Returns the list of evicted translators so they can be closed outside the lock.
+    """
+    evicted = []
+    for api_key, entry in list(_deepl_translators.items()):
+        if now - entry['last_used'] > DEEPL_TRANSLATOR_IDLE_TIMEOUT:
+            evicted.append(_deepl_translators.pop(api_key)['translator'])
+    _deepl_translator_stats['evicted'] += len(evicted)
+    return evicted
+
+def get_deepl_translator(deepl_api_key):
+    """Get a pooled deepl.Translator for an API key, creating it if needed"""
+    now = time.time()
+    with _deepl_translators_lock:
+        evicted = _evict_idle_deepl_translators(now)
+        entry = _deepl_translators.get(deepl_api_key)
+        if entry:
+            entry['last_used'] = now
+            entry['uses'] += 1
+            _deepl_translator_stats['reused'] += 1
+            translator = entry['translator']
+        else:
+            translator = deepl.Translator(deepl_api_key)
+            _deepl_translators[deepl_api_key] = {
+                'translator': translator,
+                'created_at': now,
+                'last_used': now,
+                'uses': 1
+            }
+            _deepl_translator_stats['created'] += 1
+            logger.debug(f"Created pooled DeepL translator for key starting with: {deepl_api_key[:5]}...")
+    
+    for idle_translator in evicted:
+        _close_deepl_translator(idle_translator)
+    
+    return translator
+
+def discard_deepl_translator(deepl_api_key):
+    """Drop the pooled translator for an API key, e.g. after a connection error"""
+    with _deepl_translators_lock:
+        entry = _deepl_translators.pop(deepl_api_key, None)
+        if entry:
+            _deepl_translator_stats['discarded'] += 1
+    
+    if entry:
+        _close_deepl_translator(entry['translator'])
+
+def get_deepl_translator_pool_stats():
+    """Return statistics about the DeepL translator pool for monitoring"""
+    now = time.time()
+    with _deepl_translators_lock:
+        translators = [
+            {
+                'key_prefix': f"{api_key[:5]}...",
+                'uses': entry['uses'],
+                'age_seconds': round(now - entry['created_at'], 1),
+                'idle_seconds': round(now - entry['last_used'], 1)
+            }
+            for api_key, entry in _deepl_translators.items()
+        ]
+        stats = dict(_deepl_translator_stats)
+    
+    stats['size'] = len(translators)
+    stats['idle_timeout'] = DEEPL_TRANSLATOR_IDLE_TIMEOUT
+    stats['translators'] = translators
+    return stats
+
+# DeepL usage is sampled at most once per DEEPL_USAGE_CACHE_SECONDS per API key and
+# kept up to date in between by counting the characters we send ourselves.
+DEEPL_USAGE_CACHE_SECONDS = int(os.environ.get('DEEPL_USAGE_CACHE_SECONDS', '300'))
+# Characters to keep in reserve; work that would eat into this is refused up front
+DEEPL_QUOTA_RESERVE_CHARS = int(os.environ.get('DEEPL_QUOTA_RESERVE_CHARS', '0'))
+
+_deepl_usage = {}
+_deepl_usage_lock = threading.Lock()
+
+class DeepLQuotaError(ValueError):
+    """Raised when a job would exceed the remaining DeepL character quota"""
+    pass
+
+def _usage_snapshot(entry):
+    """Build the public usage dict from a cached usage entry"""
+    count, limit = entry['count'], entry['limit']
+    return {
+        'count': count,
+        'limit': limit,
+        'remaining': max(0, limit - count) if limit else None,
+        'ratio': count / limit if limit else 0.0,
+        'sampled_at': entry['sampled_at'],
+        'local_characters': entry['local_characters']
+    }
+
+def get_deepl_usage(deepl_api_key, force_refresh=False):
+    """Get the character usage for a DeepL API key.
+    
+    Calls DeepL at most once per DEEPL_USAGE_CACHE_SECONDS per key; in between the last
+    sample is returned with the characters translated since then added to the count.
+    
+    Returns a dict with count, limit, remaining, ratio, sampled_at and local_characters,
+    or None if usage could not be retrieved.
+    """
+    if not deepl_api_key:
+        return None
+    
+    now = time.time()
+    with _deepl_usage_lock:
+        entry = _deepl_usage.get(deepl_api_key)
+        if entry and not force_refresh and now - entry['sampled_at'] < DEEPL_USAGE_CACHE_SECONDS:
+            return _usage_snapshot(entry)
+    
+    try:
+        usage = get_deepl_translator(deepl_api_key).get_usage()
+        count = usage.character.count or 0
+        limit = usage.character.limit or 0
+    except Exception as usage_error:
+        logger.warning(f"Could not check DeepL API usage: {str(usage_error)}")
+        # Fall back to the last known (possibly stale) sample
+        with _deepl_usage_lock:
+            entry = _deepl_usage.get(deepl_api_key)
+            return _usage_snapshot(entry) if entry else None
+    
+    logger.debug(f"DeepL API usage: {count}/{limit} characters")
+    if limit > 0 and count / limit > 0.95:
+        logger.warning(f"DeepL API usage is at {count}/{limit} characters (95%+ of limit)")
+    
+    entry = {'count': count, 'limit': limit, 'sampled_at': now, 'local_characters': 0}
+    with _deepl_usage_lock:
+        _deepl_usage[deepl_api_key] = entry
+        return _usage_snapshot(entry)
+
+def record_deepl_usage(deepl_api_key, characters):
+    """Add characters sent to DeepL to the cached usage for an API key"""
+    with _deepl_usage_lock:
+        entry = _deepl_usage.get(deepl_api_key)
+        if entry:
+            entry['count'] += characters
+            entry['local_characters'] += characters
+
+def check_deepl_quota(deepl_api_key, characters):
+    """Check that translating the given number of characters fits in the remaining quota.
+    
+    Raises:
+        DeepLQuotaError: If the characters would exceed the quota (minus DEEPL_QUOTA_RESERVE_CHARS)
+    """
+    usage = get_deepl_usage(deepl_api_key)
+    if not usage or not usage['limit']:
+        # Unknown usage or unlimited plan - let DeepL decide
+        return usage
+    
+    available = usage['remaining'] - DEEPL_QUOTA_RESERVE_CHARS
+    if characters > available:
+        logger.warning(f"Refusing DeepL job of {characters} characters, only {max(0, available)} available "
+                       f"({usage['count']}/{usage['limit']} used)")
+        raise DeepLQuotaError(
+            f"DeepL API quota is nearly exhausted: {characters} characters needed, "
+            f"{max(0, available)} of {usage['limit']} remaining"
+        )
+    return usage
+
 def is_allowed_file(filename):
     """Check if the file type is supported for processing"""
     if not filename:
@@ -447,46 +646,97 @@ def extract_text_from_page(pdf_reader, page_num):
         logger.error(f"Error extracting text from page {page_num + 1}: {str(e)}")
         raise Exception(f"Failed to extract text from page {page_num + 1}: {str(e)}")
 
-def translate_text(text, deepl_api_key, target_language='SV', source_language='auto', use_cache=True, glossary_id=None, max_retries=3, timeout=30, user_id=None):
-    """First step: Translate text using DeepL with caching and glossary support.
+# Granularity at which text is translated and cached. 'section' sends whole extracted
+# sections (a PDF page or a chunk of DOCX paragraphs); 'paragraph' and 'sentence' let a
+# revised edition reuse every unchanged paragraph or sentence from the cache.
+SEGMENT_LEVELS = ('section', 'paragraph', 'sentence')
+DEFAULT_SEGMENT_LEVEL = os.environ.get('TRANSLATION_SEGMENT_LEVEL', 'section')
+
+_PARAGRAPH_BREAK_RE = re.compile(r'(\n\s*\n)')
+_SENTENCE_END_RE = re.compile(r'[.!?\u2026]+["\'\u201d\u2019\u00bb)\]]*(\s+)')
+_SENTENCE_ABBREVIATIONS = {
+    'mr', 'mrs', 'ms', 'dr', 'prof', 'st', 'jr', 'sr', 'vs', 'etc', 'eg', 'ie', 'no', 'vol', 'ch', 'p', 'pp',
+    'fig', 'ca', 'bl', 'dvs', 'osv', 'mfl', 'tex', 'ex', 'nr', 'kap', 's', 'jfr', 'resp'
+}
+
+def _split_sentences(paragraph):
+    """Split a paragraph into (True, sentence) and (False, whitespace) pieces"""
+    pieces = []
+    start = 0
+    for match in _SENTENCE_END_RE.finditer(paragraph):
+        space_start, space_end = match.span(1)
+        if space_end >= len(paragraph):
+            break
+        
+        # The next sentence has to start with an uppercase letter or digit, possibly quoted
+        next_text = paragraph[space_end:space_end + 3].lstrip('"\'\u201c\u2018\u00ab([')
+        if not next_text or not (next_text[0].isupper() or next_text[0].isdigit()):
+            continue
+        
+        # Don't split after abbreviations and initials ("Dr. Watson", "J. R. R. Tolkien")
+        previous_word = re.search(r'(\w+)\W*$', paragraph[start:match.start() + 1])
+        if previous_word:
+            word = previous_word.group(1)
+            if word.lower().replace('.', '') in _SENTENCE_ABBREVIATIONS or (len(word) == 1 and word.isupper()):
+                continue
+        
+        pieces.append((True, paragraph[start:space_start]))
+        pieces.append((False, paragraph[space_start:space_end]))
+        start = space_end
     
-    Returns a tuple containing (translated_text, text_hash, source_text, glossary_hits, glossary_terms_used).
+    pieces.append((True, paragraph[start:]))
+    return pieces
+
+def segment_text(text, level='sentence'):
+    """Split text into translatable units and the whitespace between them.
     
-    Args:
-        text: The text to translate
-        deepl_api_key: DeepL API key
-        target_language: Target language code (default: 'SV' for Swedish)
-        source_language: Source language code or 'auto' for auto-detection
-        use_cache: Whether to use translation memory cache
-        glossary_id: ID of glossary to apply (optional)
-        max_retries: Maximum number of retries for API failures
-        timeout: Timeout in seconds for API calls
-        user_id: User ID for error logging (optional)
-        
-    Returns:
-        Tuple containing (translated_text, text_hash, source_text, glossary_hits, glossary_terms_used)
-        
-    Raises:
-        ValueError: If input is empty or API key is invalid
-        Exception: For other translation errors
+    Returns a list of (is_unit, text) pieces whose concatenation is exactly the input, so
+    translated units can be joined with the original whitespace. Pieces without any
+    letters (page numbers, separators like '***') are not marked as units.
     """
-    # Validate input
-    if not text or text.isspace():
-        logger.warning("Received empty text for translation")
-        raise ValueError("Cannot translate empty text")
-    
-    # Validate API key format (basic check)
-    if not deepl_api_key or len(deepl_api_key) < 20:
-        logger.error("Invalid DeepL API key format")
-        raise ValueError("DeepL API key appears to be invalid (too short)")
+    if level == 'section' or not text:
+        return [(True, text)]
     
-    # Validate language codes
-    VALID_TARGET_LANGUAGES = ['BG', 'CS', 'DA', 'DE', 'EL', 'EN', 'ES', 'ET', 'FI', 'FR', 'HU', 'ID', 'IT', 'JA', 'KO', 'LT', 'LV', 'NB', 'NL', 'PL', 'PT', 'RO', 'RU', 'SK', 'SL', 'SV', 'TR', 'UK', 'ZH']
-    VALID_SOURCE_LANGUAGES = ['AUTO', 'BG', 'CS', 'DA', 'DE', 'EL', 'EN', 'ES', 'ET', 'FI', 'FR', 'HU', 'ID', 'IT', 'JA', 'KO', 'LT', 'LV', 'NB', 'NL', 'PL', 'PT', 'RO', 'RU', 'SK', 'SL', 'SV', 'TR', 'UK', 'ZH']
+    pieces = []
+    for part_index, part in enumerate(_PARAGRAPH_BREAK_RE.split(text)):
+        if part_index % 2 or not part.strip():
+            # Paragraph break, or whitespace-only text
+            if part:
+                pieces.append((False, part))
+            continue
+        
+        stripped = part.strip()
+        leading = part[:len(part) - len(part.lstrip())]
+        trailing = part[len(part.rstrip()):]
+        
+        if leading:
+            pieces.append((False, leading))
+        if level == 'sentence':
+            pieces.extend(_split_sentences(stripped))
+        else:
+            pieces.append((True, stripped))
+        if trailing:
+            pieces.append((False, trailing))
     
+    return [(is_unit and any(char.isalpha() for char in piece), piece) for is_unit, piece in pieces]
+
+# Valid DeepL language codes
+VALID_TARGET_LANGUAGES = ['BG', 'CS', 'DA', 'DE', 'EL', 'EN', 'ES', 'ET', 'FI', 'FR', 'HU', 'ID', 'IT', 'JA', 'KO', 'LT', 'LV', 'NB', 'NL', 'PL', 'PT', 'RO', 'RU', 'SK', 'SL', 'SV', 'TR', 'UK', 'ZH']
+VALID_SOURCE_LANGUAGES = ['AUTO', 'BG', 'CS', 'DA', 'DE', 'EL', 'EN', 'ES', 'ET', 'FI', 'FR', 'HU', 'ID', 'IT', 'JA', 'KO', 'LT', 'LV', 'NB', 'NL', 'PL', 'PT', 'RO', 'RU', 'SK', 'SL', 'SV', 'TR', 'UK', 'ZH']
+
+# DeepL request limits: at most 50 texts and 128 KiB of request body per call
+DEEPL_MAX_TEXTS_PER_REQUEST = 50
+DEEPL_MAX_REQUEST_BYTES = 120 * 1024  # Leave headroom for the other request parameters
+
+# Formality settings DeepL accepts; the prefer_ ones are ignored for target languages
+# without formal and informal forms, where the others fail
+DEEPL_FORMALITY_OPTIONS = ('more', 'less', 'prefer_more', 'prefer_less')
+
+def _normalize_language_codes(source_language, target_language):
+    """Validate and normalize DeepL language codes, returning (source_language, target_language)"""
     # Normalize language codes to uppercase
-    target_language = target_language.upper()
-    source_language = source_language.upper()
+    target_language = (target_language or 'SV').upper()
+    source_language = (source_language or 'auto').upper()
     
     if target_language not in VALID_TARGET_LANGUAGES:
         logger.warning(f"Invalid target language code: {target_language}, using EN")
@@ -501,59 +751,90 @@ def translate_text(text, deepl_api_key, target_language='SV', source_language='a
     if source_language == target_language:
         logger.warning(f"Source and target languages are the same ({source_language}). Forcing source to AUTO")
         source_language = 'AUTO'
-        
-    # Log the language settings we're using
-    logger.info(f"Using source language: {source_language}")
-    logger.info(f"Using target language: {target_language}")
+    
+    return source_language, target_language
+
+def _apply_glossary(translation_text, glossary_id):
+    """Apply a glossary to a translation, returning (text, glossary_hits, glossary_terms_used)"""
+    from supabase_config import apply_glossary_to_text
+    glossary_result = apply_glossary_to_text(translation_text, glossary_id)
+    
+    # Unpack the result tuple (modified_text, replacements_count, entry_count)
+    if isinstance(glossary_result, tuple) and len(glossary_result) == 3:
+        return glossary_result
+    
+    # Fallback for older version of apply_glossary_to_text
+    return glossary_result, 0, 0
 
-    # Default values for glossary stats
+def _resolve_glossary(deepl_api_key, glossary_id, source_language, target_language):
+    """Decide how a glossary is applied to translations.
+    
+    Glossaries are mirrored to DeepL (see deepl_glossary) and passed with the translation
+    request where possible; otherwise they are applied locally after translation.
+    Language codes must already be normalized.
+    
+    Returns None without a glossary, else a dict with glossary_id, deepl_glossary_id (None
+    when applied locally), source_language (to send to DeepL) and cache_version (the
+    glossary version for cache keys, None when applied locally).
+    """
+    if not glossary_id:
+        return None
+    
+    settings = {
+        'glossary_id': glossary_id,
+        'deepl_glossary_id': None,
+        'source_language': source_language,
+        'cache_version': None
+    }
+    try:
+        from deepl_glossary import get_deepl_glossary
+        synced = get_deepl_glossary(deepl_api_key, glossary_id, source_language, target_language)
+        if synced:
+            settings.update(synced)
+    except Exception as e:
+        logger.error(f"Error syncing glossary to DeepL: {str(e)}")
+    return settings
+
+def _finish_translation(text, translation_text, target_language, use_cache=True, glossary_id=None, source_language='auto', formality=None, glossary_version=None):
+    """Apply a local glossary and cache hash to a translation, returning the translate_text tuple.
+    
+    glossary_id is only given for glossaries applied locally; glossary_version is the cache
+    version of a glossary DeepL applied.
+    """
     glossary_hits = 0
     glossary_terms_used = 0
-
-    # Check cache first if enabled
+    
+    if glossary_id:
+        try:
+            translation_text, glossary_hits, glossary_terms_used = _apply_glossary(translation_text, glossary_id)
+            logger.debug(f"Applied glossary to translation ({glossary_hits} replacements from {glossary_terms_used} terms)")
+        except Exception as glossary_error:
+            logger.error(f"Error applying glossary to translation: {str(glossary_error)}")
+            # Continue with the original translation
+    
+    text_hash = None
     if use_cache:
         try:
-            from supabase_config import check_translation_cache, generate_text_hash
-            
-            # Look for an existing translation in cache
-            cached_translation = check_translation_cache(text, target_language)
-            if cached_translation:
-                logger.info("Translation found in cache, skipping DeepL API call")
-                
-                # Apply glossary to cached translation if needed
-                if glossary_id:
-                    try:
-                        from supabase_config import apply_glossary_to_text
-                        glossary_result = apply_glossary_to_text(cached_translation, glossary_id)
-                        
-                        # Unpack the result tuple (modified_text, replacements_count, entry_count)
-                        if isinstance(glossary_result, tuple) and len(glossary_result) == 3:
-                            glossary_applied_text, glossary_hits, glossary_terms_used = glossary_result
-                            logger.info(f"Applied glossary to cached translation ({glossary_hits} replacements from {glossary_terms_used} terms)")
-                        else:
-                            # Fallback for older version of apply_glossary_to_text
-                            glossary_applied_text = glossary_result
-                            logger.info(f"Applied glossary to cached translation with older function version")
-                        
-                        return (
-                            glossary_applied_text, 
-                            generate_text_hash(text, target_language), 
-                            text, 
-                            glossary_hits, 
-                            glossary_terms_used
-                        )
-                    except Exception as glossary_error:
-                        logger.error(f"Error applying glossary to cached translation: {str(glossary_error)}")
-                        # Fall back to cached translation without glossary
-                
-                return cached_translation, generate_text_hash(text, target_language), text, 0, 0
-        except Exception as cache_error:
-            # If cache check fails, log but continue with normal translation
-            logger.error(f"Error checking translation cache: {str(cache_error)}")
+            from supabase_config import generate_text_hash
+            text_hash = generate_text_hash(text, target_language, source_language, formality, glossary_version)
+        except Exception as hash_error:
+            logger.error(f"Error generating hash for caching: {str(hash_error)}")
+    
+    return translation_text, text_hash, text, glossary_hits, glossary_terms_used
 
-    # No cache hit, use DeepL with retry mechanism
-    logger.info(f"DeepL API Key starting with: {deepl_api_key[:5]}...")
-    logger.info(f"Source language: {source_language}, Target language: {target_language}")
+def _deepl_translate(texts, deepl_api_key, source_language, target_language, max_retries=3, user_id=None, formality=None, glossary=None):
+    """Send one DeepL request for a list of texts, retrying transient errors.
+    
+    Language codes must already be normalized. Returns a list of translated strings
+    aligned with texts; an entry is None if DeepL returned an empty translation for it.
+    glossary is the ID of a DeepL glossary to apply, which requires a source language.
+    
+    Raises:
+        ValueError: If the API key is invalid or the quota has been exceeded
+        deepl.exceptions.GlossaryNotFoundException: If DeepL no longer has the glossary
+        Exception: For other translation errors, after retries are exhausted
+    """
+    total_chars = sum(len(text) for text in texts)
     
     # Define retry mechanism with exponential backoff
     retry_count = 0
@@ -561,79 +842,57 @@ def translate_text(text, deepl_api_key, target_language='SV', source_language='a
     
     while retry_count < max_retries:
         try:
-            # Create translator
-            translator = deepl.Translator(deepl_api_key)
-            
-            # Validate API key by checking usage
-            try:
-                usage = translator.get_usage()
-                logger.debug(f"DeepL API usage: {usage.character.count}/{usage.character.limit} characters")
-                
-                # Check if we're near the limit
-                if usage.character.limit > 0 and usage.character.count / usage.character.limit > 0.95:
-                    logger.warning(f"DeepL API usage is at {usage.character.count}/{usage.character.limit} characters (95%+ of limit)")
-            except Exception as usage_error:
-                logger.warning(f"Could not check DeepL API usage: {str(usage_error)}")
+            # Reuse the pooled translator (and its open connections) for this key
+            translator = get_deepl_translator(deepl_api_key)
             
-            logger.info(f"Sending {len(text)} characters to DeepL for translation")
-            logger.info(f"Text sample: {text[:100]}...")
+            logger.info(f"Sending {len(texts)} text(s) with {total_chars} characters to DeepL for translation")
+            logger.info(f"Text sample: {texts[0][:100]}...")
             
             # Enhanced debugging
             logger.info(f"Translation parameters - Source: {source_language}, Target: {target_language}")
             
-            # Use source_language only if it's not auto-detect
-            if source_language == 'AUTO':
-                logger.info("Using auto-detect for source language")
-                result = translator.translate_text(text, target_lang=target_language)
-                # Log what language was detected
-                if hasattr(result, 'detected_source_lang'):
-                    logger.info(f"DeepL detected source language: {result.detected_source_lang}")
-            else:
-                logger.info(f"Using specified source language: {source_language}")
-                result = translator.translate_text(text, source_lang=source_language, target_lang=target_language)
+            options = {'target_lang': target_language}
+            if formality and formality != 'default':
+                options['formality'] = formality
+            if glossary:
+                options['glossary'] = glossary
+            
+            # Limit the number of concurrent requests made with this API key
+            with get_deepl_semaphore(deepl_api_key):
+                # Use source_language only if it's not auto-detect
+                if source_language == 'AUTO':
+                    logger.info("Using auto-detect for source language")
+                    results = translator.translate_text(texts, **options)
+                else:
+                    logger.info(f"Using specified source language: {source_language}")
+                    results = translator.translate_text(texts, source_lang=source_language, **options)
 
             # Validate response
-            if not result:
+            if results is None:
                 raise ValueError("DeepL returned None result")
+            if not isinstance(results, list):
+                results = [results]
+            if len(results) != len(texts):
+                raise ValueError(f"DeepL returned {len(results)} translations for {len(texts)} texts")
+            
+            translated_texts = []
+            for result in results:
+                if not hasattr(result, 'text'):
+                    raise ValueError("DeepL returned malformed result without text attribute")
                 
-            if not hasattr(result, 'text'):
-                raise ValueError("DeepL returned malformed result without text attribute")
+                if not result.text or result.text.isspace():
+                    logger.warning("DeepL returned empty translation")
+                    translated_texts.append(None)
+                    continue
                 
-            if not result.text or result.text.isspace():
-                raise ValueError("DeepL returned empty translation")
+                # Log what language was detected
+                if source_language == 'AUTO' and hasattr(result, 'detected_source_lang'):
+                    logger.debug(f"DeepL detected source language: {result.detected_source_lang}")
+                translated_texts.append(result.text)
 
-            logger.info("Text successfully translated with DeepL")
-            logger.info(f"Translation sample: {result.text[:100]}...")
-            
-            # Apply glossary to translation if specified
-            translation_text = result.text
-            if glossary_id:
-                try:
-                    from supabase_config import apply_glossary_to_text
-                    glossary_result = apply_glossary_to_text(translation_text, glossary_id)
-                    
-                    # Unpack the result tuple (modified_text, replacements_count, entry_count)
-                    if isinstance(glossary_result, tuple) and len(glossary_result) == 3:
-                        translation_text, glossary_hits, glossary_terms_used = glossary_result
-                        logger.info(f"Applied glossary to DeepL translation ({glossary_hits} replacements from {glossary_terms_used} terms)")
-                    else:
-                        # Fallback for older version of apply_glossary_to_text
-                        translation_text = glossary_result
-                        logger.info(f"Applied glossary to DeepL translation with older function version")
-                except Exception as glossary_error:
-                    logger.error(f"Error applying glossary to translation: {str(glossary_error)}")
-                    # Continue with the original translation
-            
-            # Generate hash for caching if needed
-            text_hash = None
-            if use_cache:
-                try:
-                    from supabase_config import generate_text_hash
-                    text_hash = generate_text_hash(text, target_language)
-                except Exception as hash_error:
-                    logger.error(f"Error generating hash for caching: {str(hash_error)}")
-            
-            return translation_text, text_hash, text, glossary_hits, glossary_terms_used
+            record_deepl_usage(deepl_api_key, total_chars)
+            logger.info(f"{len(texts)} text(s) successfully translated with DeepL")
+            return translated_texts
 
         except deepl.exceptions.AuthorizationException as auth_err:
             # Authentication errors won't be fixed by retrying
@@ -675,6 +934,10 @@ def translate_text(text, deepl_api_key, target_language='SV', source_language='a
                     
             raise ValueError(f"DeepL API quota has been exceeded: {str(quota_err)}")
             
+        except deepl.exceptions.GlossaryNotFoundException:
+            # Retrying won't bring the glossary back; callers fall back to the local glossary
+            raise
+            
         except (deepl.exceptions.ConnectionException, deepl.exceptions.DeepLException) as network_err:
             # Network/transient errors are worth retrying with backoff
             retry_count += 1
@@ -683,6 +946,10 @@ def translate_text(text, deepl_api_key, target_language='SV', source_language='a
             logger.warning(f"DeepL API error (attempt {retry_count}/{max_retries}): {str(network_err)}. Retrying in {wait_time} seconds...")
             last_error = network_err
             
+            # Start the next attempt with a fresh connection
+            if isinstance(network_err, deepl.exceptions.ConnectionException):
+                discard_deepl_translator(deepl_api_key)
+            
             # Wait before retrying
             time.sleep(wait_time)
             
@@ -699,6 +966,295 @@ def translate_text(text, deepl_api_key, target_language='SV', source_language='a
     # Fallback - we should never reach here, but just in case
     raise Exception("Translation failed: Unknown error")
 
+def translate_text(text, deepl_api_key, target_language='SV', source_language='auto', use_cache=True, glossary_id=None, max_retries=3, timeout=30, user_id=None, formality=None):
+    """First step: Translate text using DeepL with caching and glossary support.
+    
+    Returns a tuple containing (translated_text, text_hash, source_text, glossary_hits, glossary_terms_used).
+    
+    Args:
+        text: The text to translate
+        deepl_api_key: DeepL API key
+        target_language: Target language code (default: 'SV' for Swedish)
+        source_language: Source language code or 'auto' for auto-detection
+        use_cache: Whether to use translation memory cache
+        glossary_id: ID of glossary to apply (optional)
+        max_retries: Maximum number of retries for API failures
+        timeout: Timeout in seconds for API calls
+        user_id: User ID for error logging (optional)
+        formality: DeepL formality setting ('more', 'less', 'prefer_more', 'prefer_less'), or None for default
+        
+    Returns:
+        Tuple containing (translated_text, text_hash, source_text, glossary_hits, glossary_terms_used)
+        
+    Raises:
+        ValueError: If input is empty or API key is invalid
+        Exception: For other translation errors
+    """
+    # Validate input
+    if not text or text.isspace():
+        logger.warning("Received empty text for translation")
+        raise ValueError("Cannot translate empty text")
+    
+    # Validate API key format (basic check)
+    if not deepl_api_key or len(deepl_api_key) < 20:
+        logger.error("Invalid DeepL API key format")
+        raise ValueError("DeepL API key appears to be invalid (too short)")
+    
+    # Validate language codes
+    source_language, target_language = _normalize_language_codes(source_language, target_language)
+        
+    # Let DeepL apply the glossary if it's mirrored there, otherwise apply it locally afterwards
+    deepl_glossary_id = None
+    glossary_version = None
+    glossary_settings = _resolve_glossary(deepl_api_key, glossary_id, source_language, target_language)
+    if glossary_settings and glossary_settings['deepl_glossary_id']:
+        deepl_glossary_id = glossary_settings['deepl_glossary_id']
+        glossary_version = glossary_settings['cache_version']
+        source_language = glossary_settings['source_language']
+        glossary_id = None
+        
+    # Log the language settings we're using
+    logger.info(f"Using source language: {source_language}")
+    logger.info(f"Using target language: {target_language}")
+
+    # Check cache first if enabled
+    if use_cache:
+        try:
+            from supabase_config import check_translation_cache
+            
+            # Look for an existing translation in cache
+            cached_translation = check_translation_cache(text, target_language, source_language, formality, glossary_version)
+            if cached_translation:
+                logger.info("Translation found in cache, skipping DeepL API call")
+                return _finish_translation(text, cached_translation, target_language, use_cache, glossary_id, source_language, formality, glossary_version)
+        except Exception as cache_error:
+            # If cache check fails, log but continue with normal translation
+            logger.error(f"Error checking translation cache: {str(cache_error)}")
+
+    # No cache hit, use DeepL with retry mechanism
+    logger.info(f"DeepL API Key starting with: {deepl_api_key[:5]}...")
+    logger.info(f"Source language: {source_language}, Target language: {target_language}")
+    
+    try:
+        translation_text = _deepl_translate([text], deepl_api_key, source_language, target_language, max_retries=max_retries, user_id=user_id, formality=formality, glossary=deepl_glossary_id)[0]
+    except deepl.exceptions.GlossaryNotFoundException:
+        logger.warning(f"DeepL glossary {deepl_glossary_id} not found, applying glossary locally")
+        from deepl_glossary import forget_deepl_glossary
+        forget_deepl_glossary(deepl_glossary_id)
+        glossary_id = glossary_settings['glossary_id']
+        glossary_version = None
+        translation_text = _deepl_translate([text], deepl_api_key, source_language, target_language, max_retries=max_retries, user_id=user_id, formality=formality)[0]
+    if not translation_text:
+        raise Exception("Translation failed: DeepL returned empty translation")
+    
+    logger.info(f"Translation sample: {translation_text[:100]}...")
+    
+    # Apply glossary to translation if specified and generate hash for caching
+    return _finish_translation(text, translation_text, target_language, use_cache, glossary_id, source_language, formality, glossary_version)
+
+def _build_deepl_batches(indexed_texts, max_texts=DEEPL_MAX_TEXTS_PER_REQUEST, max_bytes=DEEPL_MAX_REQUEST_BYTES):
+    """Group (index, text) pairs into batches that respect DeepL's request limits"""
+    batches = []
+    current_batch = []
+    current_bytes = 0
+    
+    for index, text in indexed_texts:
+        text_bytes = len(text.encode('utf-8'))
+        if current_batch and (len(current_batch) >= max_texts or current_bytes + text_bytes > max_bytes):
+            batches.append(current_batch)
+            current_batch = []
+            current_bytes = 0
+        # A single text larger than max_bytes still gets its own batch
+        current_batch.append((index, text))
+        current_bytes += text_bytes
+    
+    if current_batch:
+        batches.append(current_batch)
+    
+    return batches
+
+def translate_texts(texts, deepl_api_key, target_language='SV', source_language='auto', use_cache=True, glossary_id=None, max_retries=3, user_id=None, max_workers=None, formality=None, cached_translations=None, new_cache_entries=None, glossary=None, progress_callback=None, checkpoint_callback=None):
+    """Translate many texts using as few DeepL requests as possible.
+    
+    Cache hits are resolved first with a bulk lookup (or from cached_translations, a
+    cache key -> translation map the caller already fetched with bulk_check_translation_cache);
+    the remaining texts are packed into batches bounded
+    by DeepL's per-request limits (DEEPL_MAX_TEXTS_PER_REQUEST texts, DEEPL_MAX_REQUEST_BYTES
+    of text), and batches are sent concurrently by up to max_workers threads.
+    If a multi-text batch fails with a transient error, its texts are retried one by one
+    so that a single problematic text does not fail its neighbours.
+    
+    Args:
+        texts: List of texts to translate
+        deepl_api_key: DeepL API key
+        target_language: Target language code (default: 'SV' for Swedish)
+        source_language: Source language code or 'auto' for auto-detection
+        use_cache: Whether to use translation memory cache
+        glossary_id: ID of glossary to apply (optional)
+        max_retries: Maximum number of retries for API failures
+        user_id: User ID for error logging (optional)
+        max_workers: Maximum number of concurrent DeepL requests (default: DEEPL_MAX_CONCURRENCY)
+        formality: DeepL formality setting, or None for default
+        cached_translations: Pre-fetched cache key -> translation map, used even when
+            use_cache is off (optional)
+        new_cache_entries: List to which a translation_cache row is appended for every
+            text translated by DeepL, for the caller to save (optional)
+        glossary: How to apply glossary_id, as returned by _resolve_glossary (optional;
+            resolved here if not given). Callers that compute cache keys themselves must
+            use its source_language and cache_version.
+        progress_callback: Called as progress_callback(indexes, characters) in the calling
+            thread, first with the indexes resolved without DeepL (characters=0), then after
+            each DeepL batch with its indexes and the number of characters sent (optional)
+        checkpoint_callback: Called in the calling thread after each DeepL batch with a
+            cache key -> DeepL translation dict of the batch's translated texts, for callers
+            that persist partial results; passing them back in cached_translations skips
+            those texts (optional)
+        
+    Returns:
+        List aligned with texts. Each item is the tuple returned by translate_text
+        (translated_text, text_hash, source_text, glossary_hits, glossary_terms_used),
+        or None if that text could not be translated.
+        
+    Raises:
+        ValueError: If the API key is invalid
+        DeepLQuotaError: If the uncached texts would exceed the remaining DeepL quota
+    """
+    # Validate API key format (basic check)
+    if not deepl_api_key or len(deepl_api_key) < 20:
+        logger.error("Invalid DeepL API key format")
+        raise ValueError("DeepL API key appears to be invalid (too short)")
+    
+    source_language, target_language = _normalize_language_codes(source_language, target_language)
+    results = [None] * len(texts)
+    
+    # Let DeepL apply the glossary if it's mirrored there, otherwise apply it locally afterwards
+    if glossary is None:
+        glossary = _resolve_glossary(deepl_api_key, glossary_id, source_language, target_language)
+    deepl_glossary_id = glossary['deepl_glossary_id'] if glossary else None
+    glossary_version = None
+    if deepl_glossary_id:
+        source_language = glossary['source_language']
+        glossary_version = glossary['cache_version']
+    
+    # Resolve cache hits first, collecting the texts that still need DeepL
+    if use_cache and cached_translations is None:
+        try:
+            from supabase_config import bulk_check_translation_cache
+            cached_translations = bulk_check_translation_cache(texts, target_language, source_language, formality, glossary_version)
+        except Exception as cache_error:
+            logger.error(f"Error checking translation cache: {str(cache_error)}")
+    
+    pending = []
+    for index, text in enumerate(texts):
+        if not text or text.isspace():
+            continue
+        
+        if cached_translations:
+            from supabase_config import generate_text_hash
+            cached_translation = cached_translations.get(generate_text_hash(text, target_language, source_language, formality, glossary_version))
+            if cached_translation:
+                results[index] = _finish_translation(
+                    text, cached_translation, target_language, use_cache,
+                    None if deepl_glossary_id else glossary_id, source_language, formality, glossary_version
+                )
+                continue
+        
+        pending.append((index, text))
+    
+    if progress_callback:
+        pending_indexes = {index for index, _ in pending}
+        progress_callback([index for index in range(len(texts)) if index not in pending_indexes], 0)
+    
+    if not pending:
+        return results
+    
+    # Refuse the whole job up front rather than running out of quota halfway through it
+    check_deepl_quota(deepl_api_key, sum(len(text) for _, text in pending))
+    
+    batches = _build_deepl_batches(pending)
+    logger.info(f"Translating {len(pending)} texts in {len(batches)} DeepL request(s) ({len(texts) - len(pending)} resolved without DeepL)")
+    
+    def translate_batch(batch, deepl_glossary):
+        batch_texts = [text for _, text in batch]
+        try:
+            return _deepl_translate(batch_texts, deepl_api_key, source_language, target_language, max_retries=max_retries, user_id=user_id, formality=formality, glossary=deepl_glossary)
+        except deepl.exceptions.GlossaryNotFoundException:
+            raise
+        except ValueError as fatal_error:
+            # Invalid key or exhausted quota - retrying individual texts won't help
+            logger.error(f"DeepL batch translation failed: {str(fatal_error)}")
+            return [None] * len(batch)
+        except Exception as batch_error:
+            if len(batch) == 1:
+                logger.error(f"DeepL translation failed: {str(batch_error)}")
+                return [None]
+            
+            logger.warning(f"DeepL batch of {len(batch)} texts failed ({str(batch_error)}), retrying texts individually")
+            translated = []
+            for text in batch_texts:
+                try:
+                    translated.append(_deepl_translate([text], deepl_api_key, source_language, target_language, max_retries=max_retries, user_id=user_id, formality=formality, glossary=deepl_glossary)[0])
+                except Exception as text_error:
+                    logger.error(f"DeepL translation failed: {str(text_error)}")
+                    translated.append(None)
+            return translated
+    
+    def run_batch(batch):
+        """Translate a batch, returning (batch, translations, whether DeepL applied the glossary)"""
+        if deepl_glossary_id:
+            try:
+                return batch, translate_batch(batch, deepl_glossary_id), True
+            except deepl.exceptions.GlossaryNotFoundException:
+                logger.warning(f"DeepL glossary {deepl_glossary_id} not found, applying glossary locally")
+                from deepl_glossary import forget_deepl_glossary
+                forget_deepl_glossary(deepl_glossary_id)
+        return batch, translate_batch(batch, None), False
+    
+    if max_workers is None:
+        max_workers = DEEPL_MAX_CONCURRENCY
+    max_workers = max(1, min(int(max_workers), len(batches)))
+    
+    def completed_batches():
+        # Batches are yielded as they finish, so progress is reported in the calling thread
+        if max_workers > 1:
+            with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='deepl') as executor:
+                for future in as_completed([executor.submit(run_batch, batch) for batch in batches]):
+                    yield future.result()
+        else:
+            for batch in batches:
+                yield run_batch(batch)
+    
+    # Map translations back to their original positions
+    for batch, translated_texts, glossary_applied in completed_batches():
+        for (index, text), translated_text in zip(batch, translated_texts):
+            if translated_text:
+                if glossary_applied:
+                    results[index] = _finish_translation(text, translated_text, target_language, use_cache, None, source_language, formality, glossary_version)
+                else:
+                    results[index] = _finish_translation(text, translated_text, target_language, use_cache, glossary_id, source_language, formality)
+                
+                # Cache DeepL's output, before any local glossary is applied
+                if new_cache_entries is not None and results[index][1]:
+                    new_cache_entries.append({
+                        'source_hash': results[index][1],
+                        'source_text': text,
+                        'target_language': target_language,
+                        'translated_text': translated_text
+                    })
+        
+        if checkpoint_callback:
+            from supabase_config import generate_text_hash
+            batch_version = glossary_version if glossary_applied else None
+            checkpoint_callback({
+                generate_text_hash(text, target_language, source_language, formality, batch_version): translated_text
+                for (index, text), translated_text in zip(batch, translated_texts) if translated_text
+            })
+        
+        if progress_callback:
+            progress_callback([index for index, _ in batch], sum(len(text) for _, text in batch))
+    
+    return results
+
 def create_openai_assistant(openai_api_key, name, instructions, model="gpt-4o"):
     """Create a new OpenAI assistant with the given name and instructions"""
     try:
@@ -750,6 +1306,8 @@ def update_openai_assistant(openai_api_key, assistant_id, name=None, instruction
             )
             
             logger.info(f"Successfully updated assistant: {assistant.id}")
+            from review_engine import forget_review_assistant
+            forget_review_assistant(assistant_id)
             return {
                 "id": assistant.id,
                 "name": assistant.name,
@@ -776,30 +1334,39 @@ def delete_openai_assistant(openai_api_key, assistant_id):
         
         deletion = client.beta.assistants.delete(assistant_id)
         logger.info(f"Assistant deletion response: {deletion}")
+        from review_engine import forget_review_assistant
+        forget_review_assistant(assistant_id)
         
         return deletion.deleted
     except Exception as e:
         logger.error(f"Error deleting OpenAI assistant: {str(e)}")
         raise Exception(f"Failed to delete OpenAI assistant: {str(e)}")
 
-def review_translation(text, openai_api_key, assistant_id, instructions=None, max_retries=3, timeout=300):
-    """Second step: Review the translation using OpenAI Assistant with robust error handling.
+def review_translation(text, openai_api_key, assistant_id, instructions=None, max_retries=3, timeout=300, on_token=None):
+    """Second step: Review the translation using the settings of an OpenAI Assistant.
+    
+    The review is a single streaming chat completion with the assistant's instructions
+    and model, which are cached (see review_engine), instead of an Assistants thread and
+    run that has to be polled. Texts longer than REVIEW_CHUNK_CHARS are reviewed in full
+    as chunks in parallel and joined back together.
     
     Args:
         text: The text to review
         openai_api_key: OpenAI API key
         assistant_id: ID of the assistant to use
         instructions: Custom instructions for the review (optional)
-        max_retries: Maximum number of retry attempts for transient errors
+        max_retries: Maximum number of attempts for transient errors
         timeout: Maximum time to wait for completion in seconds
+        on_token: Called with each piece of the review as it is generated (optional)
         
     Returns:
         The reviewed translation text, or the original text if review fails
         
     Raises:
         ValueError: For validation errors
-        Exception: For critical errors (optional, can be caught internally)
     """
+    from review_engine import review_text, ReviewError
+    
     # Validate inputs
     if not text or text.isspace():
         logger.warning("Cannot review empty translation")
@@ -814,284 +1381,13 @@ def review_translation(text, openai_api_key, assistant_id, instructions=None, ma
     if not assistant_id or not isinstance(assistant_id, str) or len(assistant_id) < 10:
         logger.error(f"Invalid assistant ID format: {assistant_id}")
         raise ValueError("Assistant ID appears to be invalid")
-        
-    # Limit text length to avoid excessive costs
-    MAX_CHARS = 100000  # 100k character limit
-    if len(text) > MAX_CHARS:
-        logger.warning(f"Text too long for review ({len(text)} chars). Truncating to {MAX_CHARS} chars.")
-        text = text[:MAX_CHARS]
-
-    logger.info(f"OpenAI API Key starting with: {openai_api_key[:5]}...")
-    logger.info(f"Assistant ID: {assistant_id}")
-    
-    # Use the specified OpenAI API key
-    client = OpenAI(api_key=openai_api_key)
-    
-    # Track start time for timeout
-    start_time = time.time()
     
-    # Create a thread ID outside the try block for potential cleanup
-    thread_id = None
-
-    # Define retry mechanism with backoff
-    retry_count = 0
-    last_error = None
-    
-    while retry_count < max_retries:
-        try:
-            # Check if we've exceeded the timeout
-            elapsed_time = time.time() - start_time
-            if elapsed_time > timeout:
-                logger.error(f"Review timed out after {elapsed_time:.1f} seconds")
-                return text
-            
-            # First validate the assistant exists
-            try:
-                # No need to check the prefix format - some systems may use different formats
-                if not assistant_id:
-                    logger.error("Missing assistant ID")
-                    return text  # Return original text without review
-
-                # Retrieve the assistant
-                assistant = client.beta.assistants.retrieve(assistant_id)
-                logger.info(f"Using assistant: {assistant.name} (model: {assistant.model})")
-            except Exception as assistant_error:
-                logger.error(f"Could not retrieve assistant with ID {assistant_id}: {assistant_error}")
-                # Return original text instead of raising error
-                return text
-            
-            # Create a new thread
-            logger.info(f"Creating new thread for reviewing {len(text)} characters")
-            thread = client.beta.threads.create()
-            thread_id = thread.id
-            logger.info(f"Created thread with ID: {thread_id}")
-
-            # Use custom instructions if provided, otherwise use default
-            if not instructions:
-                instructions = """Granska och förbättra denna svenska översättning. 
-                Texten ska vara tydlig, naturlig och bevara den ursprungliga betydelsen.
-                Om du inte kan förbättra texten, returnera den som den är."""
-                
-            # Sanitize the instructions and text
-            if instructions and len(instructions) > 5000:
-                logger.warning(f"Instructions too long ({len(instructions)} chars). Truncating.")
-                instructions = instructions[:5000]
-                
-            # Construct message with clear instructions
-            logger.info("Adding message to thread")
-            message_content = f"""{instructions}
-
-                ---
-
-                {text}
-
-                ---
-
-                If the text seems confused or unclear, return an error message starting with 'TRANSLATION_ERROR:'.
-                """
-            logger.info(f"Message sample (first 100 chars): {message_content[:100]}...")
-            
-            # Create the message in the thread
-            message = client.beta.threads.messages.create(
-                thread_id=thread_id,
-                role="user",
-                content=message_content
-            )
-            
-            if not message or not message.id:
-                raise ValueError("Failed to create message in thread")
-
-            # Start the assistant run
-            logger.info("Starting assistant run")
-            run = client.beta.threads.runs.create(
-                thread_id=thread_id,
-                assistant_id=assistant_id
-            )
-            
-            if not run or not run.id:
-                raise ValueError("Failed to start assistant run")
-                
-            run_id = run.id
-            logger.info(f"Started run with ID: {run_id}")
-
-            # Poll for completion with improved exponential backoff
-            poll_count = 0
-            max_polls = 30  # Safety limit to avoid infinite loops
-            current_delay = 5  # Start with a 5 second delay
-            max_poll_delay = 30  # Maximum delay between polls
-            
-            while poll_count < max_polls:
-                # Check if we've exceeded the timeout
-                elapsed_time = time.time() - start_time
-                if elapsed_time > timeout:
-                    logger.error(f"Review timed out after {elapsed_time:.1f} seconds")
-                    return text
-                
-                # Wait before polling
-                if poll_count > 0:
-                    logger.info(f"Waiting {current_delay} seconds before next check")
-                    time.sleep(current_delay)
-                    # Increase delay for next poll with cap
-                    current_delay = min(current_delay * 1.5, max_poll_delay)
-                
-                # Poll for status
-                logger.info(f"Checking run status (poll {poll_count + 1}/{max_polls}, elapsed: {elapsed_time:.1f}s)")
-                try:
-                    run_status = client.beta.threads.runs.retrieve(
-                        thread_id=thread_id,
-                        run_id=run_id
-                    )
-                    
-                    if not run_status:
-                        logger.warning("Empty run status response")
-                        poll_count += 1
-                        continue
-                except Exception as poll_error:
-                    logger.warning(f"Error polling run status: {poll_error}")
-                    poll_count += 1
-                    continue
-                
-                # Check status
-                status = run_status.status
-                logger.info(f"Run status: {status}")
-                
-                if status == 'completed':
-                    logger.info(f"Run completed successfully after {elapsed_time:.1f} seconds")
-                    break
-                elif status in ['failed', 'cancelled', 'expired']:
-                    logger.error(f"Run failed with status: {status}")
-                    # Check for failure details
-                    try:
-                        if hasattr(run_status, 'last_error') and run_status.last_error:
-                            logger.error(f"Error details: {run_status.last_error}")
-                    except:
-                        pass
-                    return text
-                elif status in ['queued', 'in_progress', 'requires_action']:
-                    # Continue polling
-                    poll_count += 1
-                    continue
-                else:
-                    # Unknown status
-                    logger.warning(f"Unknown run status: {status}")
-                    poll_count += 1
-            
-            # If we exited the loop without completing, return original text
-            if status != 'completed':
-                logger.warning(f"Run did not complete after {max_polls} polls. Status: {status}")
-                return text
-
-            # Successfully completed, retrieve messages
-            logger.info("Retrieving assistant's response")
-            try:
-                messages = client.beta.threads.messages.list(thread_id=thread_id)
-            except Exception as msg_error:
-                logger.error(f"Error retrieving messages: {msg_error}")
-                return text
-
-            if not messages or not hasattr(messages, 'data') or not messages.data:
-                logger.warning("No messages received from assistant")
-                return text
-
-            # Find the assistant's response (should be the newest message from assistant)
-            assistant_messages = [msg for msg in messages.data 
-                                 if msg.role == 'assistant' and msg.content]
-            
-            if not assistant_messages:
-                logger.warning("No assistant messages found in response")
-                return text
-                
-            # Get the newest message
-            assistant_message = assistant_messages[0]
-            
-            try:
-                # Extract text content from the message
-                text_contents = [content.text.value 
-                               for content in assistant_message.content 
-                               if hasattr(content, 'text') and hasattr(content.text, 'value')]
-                
-                if not text_contents:
-                    logger.warning("No text content found in assistant message")
-                    return text
-                
-                # Join all text content fragments
-                response = '\n'.join(text_contents)
-                
-                # Check for error message pattern
-                if response.startswith('TRANSLATION_ERROR:'):
-                    logger.warning(f"Assistant reported translation error: {response}")
-                    return text  # Return original on error
-
-                logger.info("Translation review completed successfully")
-                logger.info(f"Response sample (first 100 chars): {response[:100]}...")
-                
-                # Clean up the thread to avoid cluttering OpenAI storage
-                try:
-                    client.beta.threads.delete(thread_id)
-                    logger.debug(f"Deleted thread {thread_id}")
-                except Exception as cleanup_error:
-                    logger.warning(f"Error cleaning up thread: {cleanup_error}")
-                
-                return response  # Success!
-
-            except Exception as content_error:
-                logger.error(f"Error extracting message content: {content_error}")
-                return text
-
-        except openai.AuthenticationError as auth_err:
-            logger.error(f"OpenAI API authentication error: {auth_err}")
-            # Don't retry auth errors
-            return text
-            
-        except openai.RateLimitError as rate_err:
-            # Rate limiting errors might be retryable with longer delays
-            retry_count += 1
-            last_error = rate_err
-            wait_time = min(30 * retry_count, 120)  # 30s, 60s, 90s, capped at 120s
-            logger.warning(f"OpenAI API rate limited (attempt {retry_count}/{max_retries}). Retrying in {wait_time}s...")
-            time.sleep(wait_time)
-            
-        except openai.APITimeoutError as timeout_err:
-            # Timeouts are retryable
-            retry_count += 1
-            last_error = timeout_err
-            wait_time = min(10 * retry_count, 60)
-            logger.warning(f"OpenAI API timeout (attempt {retry_count}/{max_retries}). Retrying in {wait_time}s...")
-            time.sleep(wait_time)
-            
-        except (openai.APIConnectionError, openai.BadRequestError) as conn_err:
-            # Connection errors can be retried
-            retry_count += 1
-            last_error = conn_err
-            wait_time = min(5 * retry_count, 30)
-            logger.warning(f"OpenAI API connection error (attempt {retry_count}/{max_retries}): {conn_err}. Retrying in {wait_time}s...")
-            time.sleep(wait_time)
-            
-        except Exception as e:
-            # For other errors, log and return original text
-            logger.error(f"Unexpected error in review_translation: {e}")
-            # Clean up thread if it was created
-            if thread_id:
-                try:
-                    client.beta.threads.delete(thread_id)
-                    logger.debug(f"Deleted thread {thread_id} after error")
-                except:
-                    pass
-            return text
-            
-    # If we've exhausted retries
-    if last_error:
-        logger.error(f"Review failed after {max_retries} attempts: {last_error}")
-        
-    # Clean up thread if it was created
-    if thread_id:
-        try:
-            client.beta.threads.delete(thread_id)
-            logger.debug(f"Deleted thread {thread_id} after exhausting retries")
-        except:
-            pass
-            
-    return text  # Return original text if all retries failed
+    try:
+        return review_text(text, openai_api_key, assistant_id, instructions=instructions,
+                           max_retries=max_retries, timeout=timeout, on_token=on_token)
+    except ReviewError as e:
+        logger.error(f"Review failed, keeping original text: {str(e)}")
+        return text
 
 def create_pdf_with_text(text_content):
     """Legacy function - kept for backward compatibility"""
@@ -1405,50 +1701,71 @@ def create_html_with_text(text_content, font_family='helvetica', font_size=12,
         logger.error(f"Error creating HTML: {str(e)}")
         raise Exception(f"Failed to create HTML document: {str(e)}")
 
+# Pages scoring below an assistant's threshold are left out of smart reviews
+DEFAULT_COMPLEXITY_THRESHOLD = int(os.environ.get('COMPLEXITY_THRESHOLD', '40'))
+
+# Characters counted by analyze_complexity
+_COMPLEXITY_PUNCTUATION = '.,:;?!-—()[]{}"\''
+_COMPLEXITY_SPECIAL_CHARS = '@#$%^&*+=<>|~`§±'
+
 def analyze_complexity(text):
     """Analyze text complexity to determine if it needs AI review.
     
     Returns a complexity score and features dict with analysis details.
     Higher scores indicate more complex text that would benefit from review.
+    
+    Characters are counted with str.count and words with one split per sentence, so the
+    text is gone through in C rather than character by character.
     """
     if not text or not isinstance(text, str):
         return 0, {}
-        
-    # Initialize complexity metrics
+    
     features = {
         'length': len(text),
         'avg_sentence_length': 0,
         'long_sentences': 0,  # Sentences > 30 words
         'complex_words': 0,   # Words > 6 chars
-        'punctuation_count': 0,
-        'special_chars': 0
+        'punctuation_count': sum(map(text.count, _COMPLEXITY_PUNCTUATION)),
+        'special_chars': sum(map(text.count, _COMPLEXITY_SPECIAL_CHARS))
     }
     
-    # Count punctuation and special characters
-    punctuation_chars = '.,:;?!-—()[]{}"\''
-    special_chars = '@#$%^&*+=<>|~`§±'
-    
-    for char in text:
-        if char in punctuation_chars:
-            features['punctuation_count'] += 1
-        if char in special_chars:
-            features['special_chars'] += 1
-    
-    # Split into sentences and words
-    sentences = [s.strip() for s in text.replace('!', '.').replace('?', '.').split('.') if s.strip()]
-    if sentences:
-        features['avg_sentence_length'] = len(text) / len(sentences)
-        
-    # Count long sentences and complex words
-    for sentence in sentences:
+    # Sentences end at . ! and ?; pieces without any word aren't sentences
+    sentence_count = 0
+    for sentence in text.replace('!', '.').replace('?', '.').split('.'):
         words = sentence.split()
+        if not words:
+            continue
+        sentence_count += 1
         if len(words) > 30:
             features['long_sentences'] += 1
-        
-        for word in words:
-            if len(word) > 6:
-                features['complex_words'] += 1
+        features['complex_words'] += len([word for word in words if len(word) > 6])
     
+    if sentence_count:
+        features['avg_sentence_length'] = features['length'] / sentence_count
+    
+    return _complexity_score(features), features
+
+def analyze_complexity_batch(texts):
+    """Analyze the complexity of many texts, such as the pages of a document, at once.
+    
+    Returns a list of (complexity_score, features) in the order of texts. Texts that occur
+    more than once are only analyzed once.
+    """
+    analyzed = {}
+    results = []
+    for text in texts:
+        if isinstance(text, str) and text in analyzed:
+            complexity_score, features = analyzed[text]
+            results.append((complexity_score, dict(features)))
+            continue
+        result = analyze_complexity(text)
+        if isinstance(text, str):
+            analyzed[text] = result
+        results.append(result)
+    return results
+
+def _complexity_score(features):
+    """Weigh the features found by analyze_complexity into a score from 0 to 100"""
     # Calculate complexity score (weighted sum of features)
     complexity_score = 0
     
@@ -1487,26 +1804,292 @@ def analyze_complexity(text):
     complexity_score += min(20, features['long_sentences'] * 5)
     
     # Cap at 100
-    complexity_score = min(100, complexity_score)
+    return min(100, complexity_score)
+
+def review_gate(text, complexity_threshold=None):
+    """Decide whether a text is worth an AI review.
+    
+    Returns (complexity_score, review_skipped_reason), where the reason is 'low_complexity'
+    when the score is below complexity_threshold and None when the text should be reviewed.
+    """
+    if complexity_threshold is None:
+        complexity_threshold = DEFAULT_COMPLEXITY_THRESHOLD
+    complexity_score, _ = analyze_complexity(text)
+    return complexity_score, ('low_complexity' if complexity_score < complexity_threshold else None)
+
+def _build_section_record(index, section, total_sections, translation_result, openai_api_key=None, assistant_id=None, source_language='auto', target_language='SV', use_cache=True, glossary_id=None, from_cache=False, smart_review=False, complexity_threshold=None):
+    """Build the translation record for an extracted section from its translate_texts result.
+    
+    A missing translation result falls back to the original text; any other error produces
+    a record with status 'error' so that the rest of the document can still be processed.
+    With smart_review, sections scoring below complexity_threshold are marked with
+    review_skipped_reason 'low_complexity' so that they are left out of the AI review.
+    """
+    try:
+        section_id = section['id']
+        original_text = section['text']
+        source_info = section.get('source', 'unknown')
+        
+        text_hash = None
+        source_text_for_cache = None
+        section_glossary_hits = 0
+        section_glossary_terms = 0
+        
+        if translation_result:
+            translated_text, text_hash, source_text_for_cache, section_glossary_hits, section_glossary_terms = translation_result[:5]
+        else:
+            logger.error(f"DeepL translation error for section {index+1}: no translation returned")
+            translated_text = original_text  # Fallback to original text
+        
+        # Prepare metadata for saving to cache (if this wasn't from cache already)
+        cache_metadata = {}
+        if use_cache and text_hash and source_text_for_cache:
+            cache_metadata = {
+                'source_text': source_text_for_cache,
+                'source_hash': text_hash,
+                'target_language': target_language
+            }
+        
+        # Score the section for the AI review; with smart review, simple sections skip it
+        complexity_score = 0
+        review_skipped_reason = None
+        if openai_api_key and assistant_id:
+            complexity_score, review_skipped_reason = review_gate(original_text, complexity_threshold)
+            if not smart_review:
+                review_skipped_reason = None
+            logger.info(f"Section {index+1} complexity score: {complexity_score}"
+                        f"{' (review skipped)' if review_skipped_reason else ''}")
+        
+        # Extra check to log if translated_text is identical to original_text
+        # Just for information - don't modify the text
+        if translated_text and translated_text == original_text and source_language != target_language:
+            logger.warning(f"Translation for section {section_id} is identical to original. This may be correct or indicate an issue.")
+            logger.warning(f"Source language: {source_language}, Target language: {target_language}")
+            # Do NOT modify the text - DeepL may have returned valid identical text (e.g. proper names, etc.)
+        
+        logger.info(f"Successfully completed processing section {index+1}/{total_sections}")
+        return {
+            'id': section_id,
+            'original_text': original_text,
+            'translated_text': translated_text,
+            'status': 'success',
+            'source': source_info,
+            'cache_metadata': cache_metadata,
+            'complexity_score': complexity_score,
+            'review_skipped_reason': review_skipped_reason,
+            'reviewed_by_ai': False,  # AI review is now a separate step
+            'glossary_applied': glossary_id is not None,
+            'glossary_hits': section_glossary_hits,
+            'glossary_terms': section_glossary_terms,
+            'from_cache': from_cache
+        }
+        
+    except Exception as e:
+        logger.error(f"Error processing section {index+1}: {str(e)}")
+        original_text = section.get('text', '') if isinstance(section, dict) else ''
+        return {
+            'id': section.get('id', index) if isinstance(section, dict) else index,
+            'original_text': original_text,
+            'translated_text': original_text,
+            'status': 'error',
+            'error': str(e),
+            'source': section.get('source', 'unknown') if isinstance(section, dict) else 'unknown'
+        }
+
+def _assemble_section_translation(section_text, pieces, unit_texts, unit_results, unit_from_cache, target_language, source_language='auto', use_cache=True, formality=None, glossary_version=None):
+    """Join translated units of a section back together with the original whitespace.
+    
+    Returns (translation_result, from_cache), where translation_result is the tuple returned
+    by translate_text for the whole section, or None if none of its units were translated,
+    and from_cache tells whether every unit came from the translation cache.
+    """
+    unit_pieces = [unit_index for is_unit, unit_index in pieces if is_unit]
+    
+    # Unsegmented section: the unit result already describes the section
+    if len(pieces) == 1 and unit_pieces:
+        return unit_results[unit_pieces[0]], unit_from_cache[unit_pieces[0]]
+    
+    if unit_pieces and not any(unit_results[unit_index] for unit_index in unit_pieces):
+        return None, False
+    
+    parts = []
+    glossary_hits = 0
+    glossary_terms_used = 0
+    untranslated = 0
+    for is_unit, value in pieces:
+        if not is_unit:
+            parts.append(value)
+            continue
+        
+        result = unit_results[value]
+        if result:
+            parts.append(result[0])
+            glossary_hits += result[3]
+            glossary_terms_used = max(glossary_terms_used, result[4])
+        else:
+            # Keep the source text for units that couldn't be translated
+            parts.append(unit_texts[value])
+            untranslated += 1
+    
+    if untranslated:
+        logger.warning(f"{untranslated} of {len(unit_pieces)} units in a section could not be translated, keeping original text for them")
+    
+    text_hash = None
+    if use_cache:
+        try:
+            from supabase_config import generate_text_hash
+            text_hash = generate_text_hash(section_text, target_language, source_language, formality, glossary_version)
+        except Exception as hash_error:
+            logger.error(f"Error generating hash for caching: {str(hash_error)}")
+    
+    from_cache = bool(unit_pieces) and all(unit_from_cache[unit_index] for unit_index in unit_pieces)
+    return (''.join(parts), text_hash, section_text, glossary_hits, glossary_terms_used), from_cache
+
+# Minimum seconds between progress reports within a stage
+PROGRESS_REPORT_INTERVAL = float(os.environ.get('PROGRESS_REPORT_INTERVAL', '0.5'))
+
+class TranslationProgress:
+    """Tracks how far process_document has come and reports it to a callback.
+    
+    Reports are dicts with stage ('extracting', 'translating' or 'finishing'),
+    sections_total, sections_done, cache_hits (sections resolved without DeepL),
+    characters_total and characters_sent (characters that need DeepL), chars_per_second,
+    eta_seconds and elapsed. They are throttled to one per PROGRESS_REPORT_INTERVAL,
+    except when the stage changes. Errors raised by the callback are logged and ignored
+    so that reporting can never fail a translation.
+    """
     
-    return complexity_score, features
+    def __init__(self, callback, interval=PROGRESS_REPORT_INTERVAL):
+        self.callback = callback
+        self.interval = interval
+        self.started = time.time()
+        self.translating_started = None
+        self.last_report = 0
+        self.stage = None
+        self.sections_total = 0
+        self.sections_done = 0
+        self.cache_hits = 0
+        self.characters_total = 0
+        self.characters_sent = 0
+        self._unit_lengths = []
+        self._unit_sections = []
+        self._section_remaining = []
+    
+    def start_translating(self, section_pieces, unit_texts):
+        """Begin the translating stage for sections split into units, as in process_document"""
+        self._unit_lengths = [len(text) for text in unit_texts]
+        self._unit_sections = [[] for _ in unit_texts]
+        self._section_remaining = []
+        for section_index, pieces in enumerate(section_pieces):
+            section_units = {unit_index for is_unit, unit_index in pieces if is_unit}
+            for unit_index in section_units:
+                self._unit_sections[unit_index].append(section_index)
+            self._section_remaining.append(len(section_units))
+        self.sections_total = len(section_pieces)
+        self.sections_done = sum(1 for remaining in self._section_remaining if not remaining)
+        self.characters_total = sum(self._unit_lengths)
+        self.translating_started = time.time()
+        self.report('translating')
+    
+    def units_done(self, unit_indexes, characters):
+        """Record translated units; used as translate_texts' progress_callback"""
+        if characters == 0 and self.characters_sent == 0:
+            # First call: units resolved without DeepL don't count towards the DeepL work
+            self.characters_total -= sum(self._unit_lengths[unit_index] for unit_index in unit_indexes)
+        self.characters_sent += characters
+        
+        finished = 0
+        for unit_index in unit_indexes:
+            for section_index in self._unit_sections[unit_index]:
+                self._section_remaining[section_index] -= 1
+                if self._section_remaining[section_index] == 0:
+                    finished += 1
+        self.sections_done += finished
+        if characters == 0:
+            self.cache_hits += finished
+        self.report('translating')
+    
+    def snapshot(self):
+        now = time.time()
+        chars_per_second = None
+        eta_seconds = None
+        if self.translating_started and self.characters_sent:
+            chars_per_second = self.characters_sent / max(now - self.translating_started, 0.001)
+            eta_seconds = max(self.characters_total - self.characters_sent, 0) / chars_per_second
+        return {
+            'stage': self.stage,
+            'sections_total': self.sections_total,
+            'sections_done': self.sections_done,
+            'cache_hits': self.cache_hits,
+            'characters_total': self.characters_total,
+            'characters_sent': self.characters_sent,
+            'chars_per_second': round(chars_per_second) if chars_per_second is not None else None,
+            'eta_seconds': round(eta_seconds, 1) if eta_seconds is not None else None,
+            'elapsed': round(now - self.started, 1)
+        }
+    
+    def report(self, stage):
+        now = time.time()
+        if stage == self.stage and now - self.last_report < self.interval and self.sections_done < self.sections_total:
+            return
+        self.stage = stage
+        self.last_report = now
+        try:
+            self.callback(self.snapshot())
+        except Exception as e:
+            logger.warning(f"Progress callback failed: {str(e)}")
 
-def process_document(filepath, deepl_api_key, openai_api_key=None, assistant_id=None, source_language='auto', target_language='SV', custom_instructions=None, return_segments=False, use_cache=True, smart_review=False, complexity_threshold=40, glossary_id=None, user_id=None):
+def process_document(filepath, deepl_api_key, openai_api_key=None, assistant_id=None, source_language='auto', target_language='SV', custom_instructions=None, return_segments=False, use_cache=True, smart_review=False, complexity_threshold=None, glossary_id=None, user_id=None, max_workers=None, formality=None, segment_level=None, fuzzy_matches=False, progress_callback=None, checkpoint=None):
     """Process a document by extracting text, translating with DeepL.
     
     Works with various file formats including PDF, DOCX, DOC, TXT, RTF, and ODT.
     Uses translation caching to improve performance and reduce API calls.
-    With glossary_id, applies custom glossary terms to translations.
+    With glossary_id, applies custom glossary terms to translations: through a glossary
+    mirrored to DeepL where possible (see deepl_glossary), else by local replacement.
+    
+    Sections are translated through translate_texts, which packs them into batched
+    DeepL requests sent by up to max_workers threads (default: DEEPL_MAX_CONCURRENCY).
+    The number of in-flight DeepL requests per API key is additionally capped by
+    DEEPL_MAX_CONCURRENCY_PER_KEY across all documents in this process.
+    Section order is preserved in the returned translations.
+    
+    With segment_level 'paragraph' or 'sentence' (default: DEFAULT_SEGMENT_LEVEL), sections
+    are split with segment_text and translated, cached and looked up per unit, then joined
+    back together with their original whitespace. Repeated units are only translated once.
+    
+    With fuzzy_matches and segment_level 'paragraph' or 'sentence', units missing from the cache
+    are looked up in the user's translation memory and the best near match is attached to their
+    section as tm_matches; whole sections are too long to match. Matches scoring
+    at least TM_FUZZY_AUTO_ACCEPT_SCORE (if set) are used instead of a DeepL translation.
+    
+    With progress_callback, progress dicts (see TranslationProgress) are passed to it as
+    sections are translated.
+    
+    With checkpoint (an object with load() and save(dict), such as jobs.JobCheckpoint), DeepL
+    translations are saved as each batch completes, and units saved by an earlier,
+    interrupted run are reused instead of being sent to DeepL again.
     
     The OpenAI review step has been separated into an optional post-processing step.
+    With smart_review, sections whose analyze_complexity score is below complexity_threshold
+    (default: DEFAULT_COMPLEXITY_THRESHOLD) get review_skipped_reason 'low_complexity'.
     
     Returns a tuple containing:
     1. Either the processed pdf bytes, or the list of translation segments
-    2. Stats dictionary with cache_hits, cache_ratio, glossary_hits, glossary_ratio, and unique_terms_used
+    2. Stats dictionary with cache_hits, cache_ratio, glossary_hits, glossary_ratio, and unique_terms_used,
+       plus segment_level, segments, segment_cache_hits, segment_cache_ratio and characters_saved,
+       and with smart review, review_skipped and review_characters_saved
+    
+    Raises DeepLQuotaError before any section is sent to DeepL if the document would
+    exceed the remaining DeepL character quota.
     """
+    progress = TranslationProgress(progress_callback) if progress_callback else None
+    if complexity_threshold is None:
+        complexity_threshold = DEFAULT_COMPLEXITY_THRESHOLD
     try:
+        if progress:
+            progress.report('extracting')
+        
         # Extract text from the file using the appropriate method
-        file_ext = os.path.splitext(filepath)[1].lower()
         try:
             text_sections = extract_text_from_file(filepath)
             total_sections = len(text_sections)
@@ -1518,131 +2101,200 @@ def process_document(filepath, deepl_api_key, openai_api_key=None, assistant_id=
         logger.info(f"Translation settings - Source: {source_language}, Target: {target_language}")
         if glossary_id:
             logger.info(f"Using glossary ID: {glossary_id}")
-            
-        # Process each section
-        translations = []
+        
+        # Skip sections without enough text to be worth translating
+        sections_to_translate = []
+        for index, section in enumerate(text_sections):
+            original_text = section.get('text') if isinstance(section, dict) else None
+            if not original_text or len(original_text.strip()) < 10:
+                logger.warning(f"Section {index+1} contains insufficient text, skipping")
+                continue
+            sections_to_translate.append((index, section))
+        
+        segment_level = segment_level or DEFAULT_SEGMENT_LEVEL
+        if segment_level not in SEGMENT_LEVELS:
+            logger.warning(f"Invalid segment level: {segment_level}, using section")
+            segment_level = 'section'
+        
+        # Split sections into translation units, translating each distinct unit only once
+        unit_texts = []
+        unit_indexes = {}
+        section_pieces = []
+        for _, section in sections_to_translate:
+            pieces = []
+            for is_unit, piece in segment_text(section['text'], segment_level):
+                if is_unit:
+                    if piece not in unit_indexes:
+                        unit_indexes[piece] = len(unit_texts)
+                        unit_texts.append(piece)
+                    pieces.append((True, unit_indexes[piece]))
+                else:
+                    pieces.append((False, piece))
+            section_pieces.append(pieces)
+        
+        if segment_level != 'section':
+            logger.info(f"Split {len(sections_to_translate)} sections into {len(unit_texts)} distinct {segment_level} units")
+        
+        # Resolve cached units for the whole document with a few bulk queries
+        cached_translations = {}
+        new_cache_entries = []
+        cache_source_language, cache_target_language = _normalize_language_codes(source_language, target_language)
+        
+        # Resolve the glossary once for the document; a glossary applied by DeepL is part of the cache key
+        glossary_settings = _resolve_glossary(deepl_api_key, glossary_id, cache_source_language, cache_target_language)
+        glossary_version = None
+        if glossary_settings and glossary_settings['deepl_glossary_id']:
+            cache_source_language = glossary_settings['source_language']
+            glossary_version = glossary_settings['cache_version']
+            logger.info(f"Glossary {glossary_id} is applied by DeepL ({glossary_settings['deepl_glossary_id']})")
+        
+        if use_cache:
+            try:
+                from supabase_config import bulk_check_translation_cache
+                cached_translations = bulk_check_translation_cache(unit_texts, cache_target_language, cache_source_language, formality, glossary_version)
+            except Exception as cache_error:
+                logger.error(f"Error checking translation cache: {str(cache_error)}")
+        
+        # Reuse what an interrupted earlier run of this document already got from DeepL
+        known_translations = cached_translations
+        resumed_units = 0
+        if checkpoint:
+            saved_translations = checkpoint.load()
+            if saved_translations:
+                known_translations = dict(saved_translations, **cached_translations)
+                from supabase_config import generate_text_hash
+                resumed_units = sum(
+                    1 for unit_text in unit_texts
+                    if generate_text_hash(unit_text, cache_target_language, cache_source_language, formality, glossary_version) in saved_translations
+                )
+                logger.info(f"Resuming from checkpoint: {resumed_units} of {len(unit_texts)} units already translated")
+        
+        # Look up near matches in the user's translation memory for units that missed the cache
+        unit_fuzzy_matches = {}
+        fuzzy_auto_accepted = 0
+        if fuzzy_matches and user_id and segment_level == 'section':
+            logger.info("Skipping translation memory matches, sections are too long to match")
+        elif fuzzy_matches and user_id:
+            try:
+                from supabase_config import generate_text_hash
+                from translation_memory import find_fuzzy_matches, TM_FUZZY_AUTO_ACCEPT_SCORE
+                for unit_index, unit_text in enumerate(unit_texts):
+                    unit_hash = generate_text_hash(unit_text, cache_target_language, cache_source_language, formality, glossary_version)
+                    if unit_hash in known_translations:
+                        continue
+                    matches = find_fuzzy_matches(user_id, unit_text, cache_target_language, limit=1)
+                    if not matches:
+                        continue
+                    unit_fuzzy_matches[unit_index] = matches[0]
+                    if use_cache and TM_FUZZY_AUTO_ACCEPT_SCORE and matches[0]['score'] >= TM_FUZZY_AUTO_ACCEPT_SCORE:
+                        cached_translations[unit_hash] = known_translations[unit_hash] = matches[0]['translated_text']
+                        fuzzy_auto_accepted += 1
+                logger.info(f"Found translation memory matches for {len(unit_fuzzy_matches)} units ({fuzzy_auto_accepted} used instead of DeepL)")
+            except Exception as tm_error:
+                logger.error(f"Error looking up translation memory matches: {str(tm_error)}")
+        
+        # Step 1: Translate the remaining units with DeepL in as few batched requests as possible
+        if progress:
+            progress.start_translating(section_pieces, unit_texts)
+        try:
+            unit_results = translate_texts(
+                unit_texts,
+                deepl_api_key,
+                target_language,
+                source_language,
+                use_cache=use_cache,
+                glossary_id=glossary_id,
+                user_id=user_id,
+                max_workers=max_workers,
+                formality=formality,
+                cached_translations=known_translations,
+                new_cache_entries=new_cache_entries,
+                glossary=glossary_settings,
+                progress_callback=progress.units_done if progress else None,
+                checkpoint_callback=checkpoint.save if checkpoint else None
+            )
+        except DeepLQuotaError:
+            # Don't hand back a document of untranslated sections when the quota is gone
+            raise
+        except Exception as e:
+            logger.error(f"DeepL translation error: {str(e)}")
+            unit_results = [None] * len(unit_texts)
+        
+        if progress:
+            progress.report('finishing')
+        
+        unit_from_cache = [bool(result and result[1] in cached_translations) for result in unit_results]
+        translation_results = []
+        sections_from_cache = []
+        for (_, section), pieces in zip(sections_to_translate, section_pieces):
+            translation_result, from_cache = _assemble_section_translation(
+                section['text'], pieces, unit_texts, unit_results, unit_from_cache,
+                cache_target_language, cache_source_language, use_cache, formality, glossary_version
+            )
+            translation_results.append(translation_result)
+            sections_from_cache.append(from_cache)
+        
+        # Populate the translation cache with the new translations without holding up the response
+        if use_cache and new_cache_entries:
+            try:
+                from supabase_config import save_translations_to_cache_async
+                save_translations_to_cache_async(new_cache_entries, user_id)
+            except Exception as cache_error:
+                logger.error(f"Error saving translations to cache: {str(cache_error)}")
+        
+        translations = [
+            _build_section_record(
+                index, section, total_sections, translation_result,
+                openai_api_key=openai_api_key,
+                assistant_id=assistant_id,
+                source_language=source_language,
+                target_language=target_language,
+                use_cache=use_cache,
+                glossary_id=glossary_id,
+                from_cache=from_cache,
+                smart_review=smart_review,
+                complexity_threshold=complexity_threshold
+            )
+            for (index, section), translation_result, from_cache in zip(sections_to_translate, translation_results, sections_from_cache)
+        ]
+        
+        # Offer translation memory near matches to the reviewer
+        if unit_fuzzy_matches:
+            for record, pieces in zip(translations, section_pieces):
+                section_matches = [unit_fuzzy_matches[unit_index] for is_unit, unit_index in pieces
+                                   if is_unit and unit_index in unit_fuzzy_matches]
+                if section_matches:
+                    record['tm_matches'] = section_matches
+        
+        # Aggregate cache and glossary statistics
         cache_hits = 0
         glossary_applied_count = 0
         total_glossary_hits = 0
         unique_glossary_terms = set()
         
-        for i, section in enumerate(text_sections):
-            try:
-                section_id = section['id']
-                original_text = section['text']
-                source_info = section.get('source', 'unknown')
-                
-                logger.info(f"Processing section {i+1}/{total_sections} (id: {section_id}, source: {source_info})")
-                
-                if not original_text or len(original_text.strip()) < 10:
-                    logger.warning(f"Section {i+1} contains insufficient text, skipping")
-                    continue
-                
-                # Step 1: Translate text using DeepL (with caching and glossary)
-                logger.info(f"Translating section {i+1} with DeepL")
-                text_hash = None
-                source_text_for_cache = None
-                section_glossary_hits = 0
-                section_glossary_terms = 0
-                
-                try:
-                    # The updated translate_text function returns an extended tuple
-                    translation_result = translate_text(
-                        original_text, 
-                        deepl_api_key, 
-                        target_language, 
-                        source_language, 
-                        use_cache=use_cache,
-                        glossary_id=glossary_id,
-                        user_id=user_id
-                    )
-                    
-                    # Handle tuple return
-                    if isinstance(translation_result, tuple):
-                        if len(translation_result) >= 5:  # New version with glossary stats
-                            translated_text, text_hash, source_text_for_cache, section_glossary_hits, section_glossary_terms = translation_result
-                        elif len(translation_result) == 3:  # Old version
-                            translated_text, text_hash, source_text_for_cache = translation_result
-                        else:
-                            translated_text = translation_result[0]
-                            
-                        # If we got translation from cache, increment counter
-                        if text_hash and source_text_for_cache == original_text:
-                            cache_hits += 1
-                    else:
-                        translated_text = translation_result
-                        
-                    if not translated_text:
-                        logger.error("Translation returned empty result")
-                        translated_text = original_text
-                        raise ValueError("Translation returned empty result")
-                        
-                    # Track glossary stats
-                    if glossary_id:
-                        glossary_applied_count += 1
-                        total_glossary_hits += section_glossary_hits
-                        # The unique terms set will accumulate across all sections
-                        if section_glossary_terms > 0:
-                            # Since we don't have the actual term IDs from this level, 
-                            # we'll use a placeholder to track this section's unique terms count
-                            for i in range(section_glossary_terms):
-                                unique_glossary_terms.add(f"section_{section_id}_term_{i}")
-                except Exception as e:
-                    logger.error(f"DeepL translation error for section {i+1}: {str(e)}")
-                    translated_text = original_text  # Fallback to original text
-                
-                # Prepare metadata for saving to cache (if this wasn't from cache already)
-                cache_metadata = {}
-                if use_cache and text_hash and source_text_for_cache:
-                    cache_metadata = {
-                        'source_text': source_text_for_cache,
-                        'source_hash': text_hash,
-                        'target_language': target_language
-                    }
-                
-                # Calculate complexity score for information purposes
-                complexity_score = 0
-                complexity_features = {}
-                if openai_api_key and assistant_id:
-                    complexity_score, complexity_features = analyze_complexity(original_text)
-                    logger.info(f"Section {i+1} complexity score: {complexity_score}")
-                
-                # Extra check to log if translated_text is identical to original_text
-                # Just for information - don't modify the text
-                if translated_text and translated_text == original_text and source_language != target_language:
-                    logger.warning(f"Translation for section {section_id} is identical to original. This may be correct or indicate an issue.")
-                    logger.warning(f"Source language: {source_language}, Target language: {target_language}")
-                    # Do NOT modify the text - DeepL may have returned valid identical text (e.g. proper names, etc.)
-                
-                translations.append({
-                    'id': section_id,
-                    'original_text': original_text,
-                    'translated_text': translated_text,
-                    'status': 'success',
-                    'source': source_info,
-                    'cache_metadata': cache_metadata,
-                    'complexity_score': complexity_score,
-                    'reviewed_by_ai': False,  # AI review is now a separate step
-                    'glossary_applied': glossary_id is not None,
-                    'glossary_hits': section_glossary_hits,
-                    'glossary_terms': section_glossary_terms
-                })
-                logger.info(f"Successfully completed processing section {i+1}")
-                
-            except Exception as e:
-                logger.error(f"Error processing section {i+1}: {str(e)}")
-                translations.append({
-                    'id': section['id'] if 'section' in locals() else i,
-                    'original_text': original_text if 'original_text' in locals() else '',
-                    'translated_text': translated_text if 'translated_text' in locals() else original_text if 'original_text' in locals() else '',
-                    'status': 'error',
-                    'error': str(e),
-                    'source': section.get('source', 'unknown') if 'section' in locals() else 'unknown'
-                })
-                continue
+        for t in translations:
+            if t.get('from_cache'):
+                cache_hits += 1
+            if glossary_id and t['status'] == 'success':
+                glossary_applied_count += 1
+                total_glossary_hits += t.get('glossary_hits', 0)
+                # Since we don't have the actual term IDs from this level, 
+                # we use a placeholder to track each section's unique terms count
+                for term_index in range(t.get('glossary_terms', 0)):
+                    unique_glossary_terms.add(f"section_{t['id']}_term_{term_index}")
         
         # Calculate statistics
-        stats = {}
+        stats = {'segment_level': segment_level}
+        if checkpoint:
+            stats['resumed_units'] = resumed_units
+        if fuzzy_matches:
+            stats['tm_fuzzy_matches'] = len(unit_fuzzy_matches)
+            stats['tm_fuzzy_auto_accepted'] = fuzzy_auto_accepted
+        if smart_review and openai_api_key and assistant_id:
+            skipped = [t for t in translations if t.get('review_skipped_reason') == 'low_complexity']
+            stats['review_skipped'] = len(skipped)
+            stats['review_characters_saved'] = sum(len(t['translated_text']) for t in skipped)
+            logger.info(f"Smart review skips {len(skipped)}/{total_sections} sections below complexity {complexity_threshold}")
         if total_sections > 0:
             # Cache statistics
             if use_cache:
@@ -1650,13 +2302,32 @@ def process_document(filepath, deepl_api_key, openai_api_key=None, assistant_id=
                 stats['cache_hits'] = cache_hits
                 stats['cache_ratio'] = cache_rate
                 logger.info(f"Translation cache performance: {cache_hits}/{total_sections} sections from cache ({cache_rate:.1f}%)")
+                
+                # Unit-level statistics: every occurrence of a unit counts, like DeepL billing would
+                segment_count = 0
+                segment_cache_hits = 0
+                characters_saved = 0
+                for pieces in section_pieces:
+                    for is_unit, unit_index in pieces:
+                        if is_unit:
+                            segment_count += 1
+                            if unit_from_cache[unit_index]:
+                                segment_cache_hits += 1
+                                characters_saved += len(unit_texts[unit_index])
+                stats['segments'] = segment_count
+                stats['segment_cache_hits'] = segment_cache_hits
+                stats['segment_cache_ratio'] = (segment_cache_hits / segment_count) * 100 if segment_count else 0
+                stats['characters_saved'] = characters_saved
+                logger.info(f"Translation cache saved {characters_saved} characters ({segment_cache_hits}/{segment_count} {segment_level} units from cache)")
             
             # Glossary statistics
             if glossary_id:
                 glossary_rate = (glossary_applied_count / total_sections) * 100
                 stats['glossary_hits'] = total_glossary_hits
-                stats['glossary_ratio'] = (total_glossary_hits / len(''.join([t.get('original_text', '') for t in translations]))) * 1000  # Per 1000 characters
+                stats['glossary_ratio'] = (total_glossary_hits / max(1, len(''.join([t.get('original_text', '') for t in translations])))) * 1000  # Per 1000 characters
                 stats['unique_terms_used'] = len(unique_glossary_terms)
+                # Terms DeepL applies during translation aren't counted in glossary_hits
+                stats['glossary_mode'] = 'deepl' if glossary_version else 'local'
                 
                 logger.info(f"Glossary applied to {glossary_applied_count}/{total_sections} sections ({glossary_rate:.1f}%)")
                 logger.info(f"Total glossary hits: {total_glossary_hits} terms replaced")
@@ -1680,6 +2351,8 @@ def process_document(filepath, deepl_api_key, openai_api_key=None, assistant_id=
             combined_text = '\n\n'.join(successful_translations)
             return create_pdf_with_text(combined_text), stats
     
+    except DeepLQuotaError:
+        raise
     except Exception as e:
         logger.error(f"Document processing error: {str(e)}")
         raise Exception(f"Document processing failed: {str(e)}")